@@ -0,0 +1,341 @@
+import asyncio
+import collections
+import itertools
+import math
+import os
+import threading
+import time
+
+import metrics
+from deadlines import remaining
+
+# --- Admission control for incoming requests ---
+# When Groq slows down, requests used to pile up in the server until every one
+# of them timed out. Now each request takes one of ADMISSION_MAX_CONCURRENCY
+# slots before doing any work, and waits for it in its endpoint's lane:
+#   - lanes have a priority, a freed slot goes to the oldest waiter of the most
+#     important non-empty lane (editor overlay first, then agent, then batch)
+#   - each lane's queue is bounded, a full queue is rejected with 503
+#   - a request whose expected queueing delay (requests ahead of it times the
+#     average service time, spread over the slots) is already longer than its
+#     deadline is rejected with 503 right away instead of timing out later
+#   - each client (its remote address) has a token bucket of
+#     ADMISSION_CLIENT_RATE requests/minute, going over is a 429. The
+#     X-Client-Id header is only believed from ADMISSION_TRUSTED_PROXIES, any
+#     other caller could rotate it to get a fresh bucket per request
+# Rejections carry Retry-After so well-behaved clients back off.
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", 16))
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", 32))
+CLIENT_RATE = float(os.environ.get("ADMISSION_CLIENT_RATE", 120))
+CLIENT_BURST = float(os.environ.get("ADMISSION_CLIENT_BURST", 20))
+# Comma-separated addresses (e.g. the load balancer) whose X-Client-Id is used as the client
+TRUSTED_PROXIES = {a.strip() for a in os.environ.get("ADMISSION_TRUSTED_PROXIES", "").split(",") if a.strip()}
+# Clients remembered for rate limiting, least recently seen are dropped first
+MAX_CLIENTS = 10000
+
+# lane -> priority, lower is served first
+LANES = {
+    "edit": 0,
+    "suggestions": 0,
+    "process_query": 0,
+    "news_agent": 1,
+    "batch": 2,
+}
+
+# ADMISSION_QUEUES="news_agent=8,batch=4" overrides single lanes' queue size
+def _queue_sizes_from_env():
+    sizes = {lane: ADMISSION_QUEUE_SIZE for lane in LANES}
+    for item in filter(None, os.environ.get("ADMISSION_QUEUES", "").split(",")):
+        lane, _, size = item.partition("=")
+        if lane.strip() not in LANES:
+            raise ValueError(f"Unknown admission lane {lane.strip()!r}, expected one of {sorted(LANES)}")
+        sizes[lane.strip()] = int(size)
+    return sizes
+
+
+class Rejected(Exception):
+    """The request was not admitted. status is 429 or 503, retry_after in seconds."""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class ClientBuckets:
+    """A token bucket per client, refilled at rate_per_minute up to burst."""
+
+    def __init__(self, rate_per_minute: float = CLIENT_RATE, burst: float = CLIENT_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._buckets = collections.OrderedDict()  # client -> (level, updated)
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        """Take a token for client. Returns 0 on success, else seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            level, updated = self._buckets.pop(client, (self.burst, now))
+            level = min(self.burst, level + (now - updated) * self.rate)
+            wait = 0.0
+            if level >= 1:
+                level -= 1
+            else:
+                wait = (1 - level) / self.rate
+            self._buckets[client] = (level, now)
+            if len(self._buckets) > MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def refund(self, client: str):
+        """Give back the token take() spent, for a request that was turned away without running."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            if client in self._buckets:
+                level, updated = self._buckets[client]
+                self._buckets[client] = (min(self.burst, level + 1), updated)
+
+
+class _Waiter:
+    __slots__ = ("lane", "seq", "event", "loop", "future")
+
+    def __init__(self, lane, seq, loop=None):
+        self.lane = lane
+        self.seq = seq
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+
+class Ticket:
+    """One admitted request's slot. release() is safe to call more than once."""
+
+    def __init__(self, controller, lane):
+        self._controller = controller
+        self.lane = lane
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        with self._controller._lock:
+            if self._released:
+                return
+            self._released = True
+            self._controller._finish(self)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency=ADMISSION_MAX_CONCURRENCY, queue_sizes=None, client_buckets=None):
+        self.max_concurrency = max_concurrency
+        self.queue_sizes = queue_sizes or _queue_sizes_from_env()
+        self.clients = client_buckets or ClientBuckets()
+        self.in_flight = collections.Counter()
+        self.service_time = {lane: None for lane in LANES}  # moving average per lane
+        self._queues = {lane: collections.deque() for lane in LANES}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # --- slots ---
+    def _total_in_flight(self):
+        return sum(self.in_flight.values())
+
+    def _grant(self, lane):
+        # Called with the lock held
+        self.in_flight[lane] += 1
+        metrics.admission_in_flight.set(self.in_flight[lane], lane=lane)
+        return Ticket(self, lane)
+
+    def _finish(self, ticket):
+        # Called with the lock held
+        lane = ticket.lane
+        elapsed = time.monotonic() - ticket.started
+        average = self.service_time[lane]
+        self.service_time[lane] = elapsed if average is None else average + (elapsed - average) * 0.1
+        self.in_flight[lane] -= 1
+        metrics.admission_in_flight.set(self.in_flight[lane], lane=lane)
+        self._wake_next()
+
+    def _next_waiter(self):
+        # Oldest waiter of the highest priority lane that has any
+        best = None
+        for lane, queue in self._queues.items():
+            if queue and (best is None or (LANES[lane], queue[0].seq) < (LANES[best.lane], best.seq)):
+                best = queue[0]
+        return best
+
+    def _wake_next(self):
+        # Called with the lock held: hand free slots to waiters in priority order
+        while self._total_in_flight() < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self._queues[waiter.lane].popleft()
+            metrics.admission_queued.set(len(self._queues[waiter.lane]), lane=waiter.lane)
+            if waiter.event is not None:
+                waiter.event.ticket = self._grant(waiter.lane)
+                waiter.event.set()
+            elif not waiter.future.done():
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future, self._grant(waiter.lane))
+
+    # --- admission ---
+    def expected_wait(self, lane: str) -> float:
+        """Seconds a new request in lane would queue for, from the waiters served before it."""
+        with self._lock:
+            return self._expected_wait(lane)
+
+    def _expected_wait(self, lane):
+        if self._total_in_flight() < self.max_concurrency:
+            return 0.0
+        default = _average([t for t in self.service_time.values() if t is not None]) or 1.0
+        ahead = sum(
+            len(queue) * (self.service_time[other] or default)
+            for other, queue in self._queues.items() if LANES[other] <= LANES[lane]
+        )
+        # Plus the time until the first in-flight request finishes, on average half its service time
+        return ahead / self.max_concurrency + default / 2
+
+    def _reject(self, lane, status, reason, retry_after):
+        metrics.admission_rejected.inc(lane=lane, reason=reason)
+        return Rejected(status, reason, retry_after)
+
+    def _enter(self, lane, client, loop=None):
+        """Admit right away (Ticket), queue (_Waiter) or raise Rejected."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown admission lane {lane!r}, expected one of {sorted(LANES)}")
+        wait = self.clients.take(client)
+        if wait > 0:
+            raise self._reject(lane, 429, "client_rate", wait)
+        with self._lock:
+            if self._total_in_flight() < self.max_concurrency and self._next_waiter() is None:
+                return self._grant(lane)
+            expected = self._expected_wait(lane)
+            # A 503 here is the server's doing, it doesn't count against the client's rate
+            if len(self._queues[lane]) >= self.queue_sizes[lane]:
+                self.clients.refund(client)
+                raise self._reject(lane, 503, "queue_full", expected)
+            left = remaining()
+            if left is not None and expected >= left:
+                self.clients.refund(client)
+                raise self._reject(lane, 503, "deadline", expected)
+            waiter = _Waiter(lane, next(self._seq), loop)
+            self._queues[lane].append(waiter)
+            metrics.admission_queued.set(len(self._queues[lane]), lane=lane)
+            return waiter
+
+    def _give_up(self, waiter):
+        # Called with the lock held, for a waiter that timed out still queued
+        self._queues[waiter.lane].remove(waiter)
+        metrics.admission_queued.set(len(self._queues[waiter.lane]), lane=waiter.lane)
+        return self._reject(waiter.lane, 503, "deadline", self._expected_wait(waiter.lane))
+
+    def admit(self, lane: str, client: str) -> Ticket:
+        """Wait for a slot in lane. The caller must release() the ticket when done."""
+        if not ADMISSION_ENABLED:
+            return _NoTicket(lane)
+        start = time.monotonic()
+        entry = self._enter(lane, client)
+        if isinstance(entry, Ticket):
+            return entry
+        left = remaining()
+        if not entry.event.wait(timeout=None if left is None else max(left, 0)):
+            with self._lock:
+                if not entry.event.is_set():
+                    raise self._give_up(entry)
+        metrics.admission_wait.observe(time.monotonic() - start, lane=lane)
+        return entry.event.ticket
+
+    async def aadmit(self, lane: str, client: str) -> Ticket:
+        """Async version of admit."""
+        if not ADMISSION_ENABLED:
+            return _NoTicket(lane)
+        start = time.monotonic()
+        entry = self._enter(lane, client, asyncio.get_running_loop())
+        if isinstance(entry, Ticket):
+            return entry
+        left = remaining()
+        try:
+            ticket = await asyncio.wait_for(asyncio.shield(entry.future), None if left is None else max(left, 0))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._lock:
+                if entry in self._queues[lane]:
+                    error = self._give_up(entry)
+                    entry.future.cancel()
+                else:
+                    error = None
+            if error is None:
+                # The slot was handed to us as we gave up, pass it on once it arrives
+                entry.future.add_done_callback(_release_result)
+            if isinstance(e, asyncio.TimeoutError):
+                raise error or self._reject(lane, 503, "deadline", 0) from None
+            raise
+        metrics.admission_wait.observe(time.monotonic() - start, lane=lane)
+        return ticket
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "lanes": [
+                    {
+                        "lane": lane,
+                        "priority": LANES[lane],
+                        "in_flight": self.in_flight[lane],
+                        "queued": len(self._queues[lane]),
+                        "queue_size": self.queue_sizes[lane],
+                        "service_time": self.service_time[lane],
+                        "expected_wait": round(self._expected_wait(lane), 3),
+                    }
+                    for lane in LANES
+                ],
+            }
+
+
+class _NoTicket:
+    """Ticket used when admission control is disabled."""
+
+    def __init__(self, lane):
+        self.lane = lane
+
+    def release(self):
+        pass
+
+
+def _average(values):
+    return sum(values) / len(values) if values else None
+
+def _resolve(future, ticket):
+    if future.done():
+        # Waiter gave up after the slot was counted for it
+        ticket.release()
+    else:
+        future.set_result(ticket)
+
+def _release_result(future):
+    if not future.cancelled():
+        future.result().release()
+
+
+def client_id(headers, remote_addr) -> str:
+    """Who a request counts against for rate limiting."""
+    if remote_addr in TRUSTED_PROXIES and headers.get("x-client-id"):
+        return headers.get("x-client-id")
+    return remote_addr or "unknown"
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def admission_controller() -> AdmissionController:
+    """The process-wide controller, shared by every route."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
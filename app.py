@@ -1,15 +1,61 @@
-from typing import Union
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Literal, Optional, Union
 
-from fastapi import FastAPI
-
-from mainV3 import run_agent
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic import BaseModel  # Import for request validation
 
+import metrics
+from metrics import stage
+from deadlines import DeadlineExceeded, caused_by_deadline, expired, request_timeout, start_deadline, within_deadline
+from admission import Rejected, admission_controller, client_id
+from cancellation import RequestCancelled, new_request_id, run_cancellable
+
+
+# --- News agent, loaded on first use ---
+# mainV3 builds the Groq client, DuckDuckGo tool and the ReAct agent at import,
+# which pulls in all of LangChain. It is imported on first use (or by the
+# background warm-up) so importing this module, and service.py with it, stays
+# cheap and /health answers at once.
+_news_agent = None
+_news_agent_lock = threading.Lock()
+
+def news_agent_module():
+    """mainV3, imported on first call."""
+    global _news_agent
+    if _news_agent is None:
+        with _news_agent_lock:
+            if _news_agent is None:
+                import mainV3
+                _news_agent = mainV3
+    return _news_agent
+
+async def anews_agent_module():
+    """news_agent_module without blocking the event loop on the first import."""
+    return _news_agent or await asyncio.to_thread(news_agent_module)
+
+def news_agent_ready() -> bool:
+    return _news_agent is not None
 
-app = FastAPI()
+def warm_up_news_agent():
+    threading.Thread(target=news_agent_module, name="news-agent-warmup", daemon=True).start()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.environ.get("LLM_WARMUP", "true").lower() == "true":
+        warm_up_news_agent()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:8080",  # React frontend
@@ -24,9 +70,108 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Time budget per request, clients may ask for another one with X-Request-Timeout
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 60))
+
+# Per-request trace and deadline: stage spans go back in a Server-Timing header
+# and the total request latency goes to /metrics. Also used by service.py,
+# timeout_for(path) gives the default time budget of a request and lane_for(path)
+# its admission lane (admission.py), None for routes that skip admission control.
+def add_request_tracing(app: FastAPI, label: str, timeout_for, lane_for=lambda path: None):
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        start = time.perf_counter()
+        spans = metrics.start_trace()
+        request.state.request_id = new_request_id(request.headers.get("x-request-id"))
+        start_deadline(request_timeout(request.headers.get("x-request-timeout"), timeout_for(request.url.path)))
+        lane = lane_for(request.url.path) if request.method == "POST" else None
+        ticket = None
+        try:
+            if lane is not None:
+                client = client_id(request.headers, request.client.host if request.client else None)
+                ticket = await admission_controller().aadmit(lane, client)
+            response = await call_next(request)
+        except Rejected as e:
+            response = JSONResponse({"error": f"Server busy ({e.reason}), retry later"}, status_code=e.status,
+                                    headers={"Retry-After": str(e.retry_after)})
+        except BaseException:
+            if ticket is not None:
+                ticket.release()
+            raise
+        if ticket is not None:
+            response.body_iterator = _release_after(response.body_iterator, ticket)
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            app=label, route=route.path if route else "unmatched",
+            method=request.method, status=response.status_code,
+        )
+        if spans:
+            response.headers["Server-Timing"] = metrics.server_timing(spans)
+        response.headers["X-Request-Id"] = request.state.request_id
+        return response
+
+    @app.exception_handler(DeadlineExceeded)
+    async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+        metrics.deadline_exceeded.inc(where="http")
+        return JSONResponse({"error": "Request deadline exceeded"}, status_code=504)
+
+    # 499: the client closed the request (nginx's convention)
+    @app.exception_handler(RequestCancelled)
+    async def request_cancelled(request: Request, exc: RequestCancelled):
+        return JSONResponse({"error": "Request cancelled"}, status_code=499)
+
+async def _release_after(body_iterator, ticket):
+    # The admission slot is held until the body is sent, streamed responses included
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        ticket.release()
+
+add_request_tracing(
+    app, "news_agent", lambda path: REQUEST_TIMEOUT,
+    lambda path: "news_agent" if path == "/news-agent" else None,
+)
+
+# Routes live on a router so service.py can mount them next to the editor API
+router = APIRouter()
+
+@router.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@router.get("/search-cache-stats")
+def search_cache_stats():
+    if _news_agent is None:
+        return {"loaded": False}
+    return _news_agent.search_cache.stats()
+
+@router.get("/admission-stats")
+def admission_stats():
+    return admission_controller().stats()
+
+# "agent" runs the ReAct agent, "pipeline" the fixed classify -> search -> summarize path
+NEWS_AGENT_MODE = os.environ.get("NEWS_AGENT_MODE", "agent")
+
 class QueryRequest(BaseModel):
     query: str
+    mode: Optional[Literal["agent", "pipeline"]] = None
+
+# async so the request waits on the event loop instead of a threadpool thread
+# Cancelled when superseded by the session's next query or when the client disconnects
+@router.post("/news-agent")
+async def news_agent(request: QueryRequest, http_request: Request):
+    news = await anews_agent_module()
+    run = news.arun_pipeline if (request.mode or NEWS_AGENT_MODE) == "pipeline" else news.arun_agent
+    try:
+        result = await run_cancellable(http_request, "/news-agent", within_deadline(run(request.query)))
+    except Exception as e:
+        # Upstream errors caused by running out of time are reported as timeouts
+        if (expired() or caused_by_deadline(e)) and not isinstance(e, DeadlineExceeded):
+            raise DeadlineExceeded("request deadline exceeded") from e
+        raise
+    with stage("serialization"):
+        return JSONResponse(result)
 
-@app.post("/news-agent")
-def news_agent(request: QueryRequest):
-    return run_agent(request.query)
\ No newline at end of file
+app.include_router(router)
@@ -0,0 +1,66 @@
+"""
+Micro-benchmark: per-request chain construction vs the chain registry.
+
+Measures only the local overhead that used to be paid on every call
+(PromptTemplate + pipeline construction, and a new ChatGroq client for
+summarize) against a registry lookup. No requests are sent.
+
+Usage:
+    python benchmarks/bench_chain_registry.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_groq import ChatGroq
+
+import chain_registry
+
+TEMPLATE = """Given the input query: "{text}"
+Is it conceptually simple (one clear question)? Reply only 'yes' or 'no'."""
+
+
+def per_call_prompt(llm):
+    prompt = PromptTemplate(input_variables=["text"], template=TEMPLATE)
+    return prompt | llm | StrOutputParser()
+
+
+def per_call_client():
+    return ChatGroq(model="llama-3.1-8b-instant", temperature=0, max_tokens=None, timeout=None, max_retries=2)
+
+
+def timeit(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    shared = chain_registry.get_client("llama-3.1-8b-instant")
+    chain_registry.register_chain("bench.simple", PromptTemplate(input_variables=["text"], template=TEMPLATE))
+    chain_registry.get_chain("bench.simple")
+
+    rows = [
+        ("prompt + pipeline per call", timeit(lambda: per_call_prompt(shared), args.iterations)),
+        ("new ChatGroq + pipeline per call", timeit(lambda: per_call_prompt(per_call_client()), args.iterations)),
+        ("registry get_chain", timeit(lambda: chain_registry.get_chain("bench.simple"), args.iterations)),
+    ]
+    print(f"{'setup per request':<34} {'us/call':>10}")
+    for name, us in rows:
+        print(f"{name:<34} {us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
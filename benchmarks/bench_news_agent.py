@@ -0,0 +1,97 @@
+"""
+Benchmark: sync vs async /news-agent under concurrency.
+
+The Groq and DuckDuckGo calls are replaced with a stub agent that sleeps for
+a fixed upstream latency per step, so this runs without an API key.
+The sync endpoint (old behaviour) holds a threadpool thread per request, the
+async endpoint waits on the event loop.
+
+Usage:
+    python benchmarks/bench_news_agent.py --levels 10 50 200 1000 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+# These measure the endpoints, not admission control: every request comes from one
+# address and would be rate limited past ADMISSION_CLIENT_BURST
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+import httpx
+from fastapi import FastAPI
+
+import mainV3
+from app import app as async_app, QueryRequest
+
+
+class StubAgent:
+    """Pretends to be the ReAct agent: a few upstream calls of fixed latency."""
+
+    def __init__(self, steps, latency):
+        self.steps = steps
+        self.latency = latency
+
+    def run(self, user_input):
+        for _ in range(self.steps):
+            time.sleep(self.latency)
+        return f"summary of {user_input}"
+
+    async def ainvoke(self, inputs):
+        for _ in range(self.steps):
+            await asyncio.sleep(self.latency)
+        return {"input": inputs["input"], "output": f"summary of {inputs['input']}"}
+
+
+# Old behaviour: plain def endpoint, FastAPI runs it on the threadpool
+sync_app = FastAPI()
+
+@sync_app.post("/news-agent")
+def news_agent_sync(request: QueryRequest):
+    return mainV3.run_agent(request.query)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_level(app, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            start = time.perf_counter()
+            response = await client.post("/news-agent", json={"query": f"query {i}"})
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        wall = time.perf_counter() - start
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per simulated upstream call")
+    parser.add_argument("--steps", type=int, default=3, help="upstream calls per request")
+    args = parser.parse_args()
+
+    mainV3.agent = StubAgent(args.steps, args.latency)
+
+    print(f"{'mode':<6} {'conc':>6} {'p50 (s)':>9} {'p99 (s)':>9} {'req/s':>9}")
+    for concurrency in args.levels:
+        for mode, app in (("sync", sync_app), ("async", async_app)):
+            latencies, wall = asyncio.run(run_level(app, concurrency))
+            print(f"{mode:<6} {concurrency:>6} {percentile(latencies, 50):>9.3f} "
+                  f"{percentile(latencies, 99):>9.3f} {concurrency / wall:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
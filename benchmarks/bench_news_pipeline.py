@@ -0,0 +1,89 @@
+"""
+Benchmark: ReAct agent vs fixed pipeline for /news-agent.
+
+Runs the query corpus through mainV3.run_agent and mainV3.run_pipeline and
+reports LLM calls, searches and wall time per query. Uses the local stand-in
+LLM (LLM_BACKEND=fake by default, its agent answers follow the usual
+Process Query -> Search -> Summarize trajectory) and a stub search tool, so
+no Groq key or network is needed.
+
+Usage:
+    python benchmarks/bench_news_pipeline.py
+    FAKE_LLM_LATENCY=lognormal:0.3:0.5 python benchmarks/bench_news_pipeline.py --search-latency 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+
+import metrics
+from bench_utils import stub_search
+
+CORPUS_PATH = os.path.join(ROOT_DIR, "benchmarks", "data", "queries.json")
+
+
+def llm_call_total():
+    return sum(metrics.llm_calls._values.values())
+
+
+def run_mode(name, fn, queries, search):
+    search.calls = 0
+    calls_before = llm_call_total()
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "mode": name,
+        "queries": len(queries),
+        "llm_calls_per_query": (llm_call_total() - calls_before) / len(queries),
+        "searches_per_query": search.calls / len(queries),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000,
+        "total_s": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--search-latency", type=float, default=0.3, help="seconds per stub search")
+    parser.add_argument("--limit", type=int, help="only run the first N corpus queries")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    import mainV3
+    mainV3.agent.verbose = False
+    search = stub_search(args.search_latency)
+
+    with open(CORPUS_PATH) as f:
+        queries = [item["query"] for item in json.load(f)][:args.limit]
+
+    rows = []
+    for name, fn in (("agent", mainV3.run_agent), ("pipeline", mainV3.run_pipeline)):
+        mainV3.search_cache.clear()
+        rows.append(run_mode(name, fn, queries, search))
+
+    print(f"backend={os.environ['LLM_BACKEND']} latency={os.environ.get('FAKE_LLM_LATENCY', 'fixed:0.2')} "
+          f"search_latency={args.search_latency} queries={len(queries)}")
+    print(f"{'mode':<10} {'llm calls/q':>12} {'searches/q':>11} {'mean ms':>9} {'p95 ms':>9} {'total s':>9}")
+    for r in rows:
+        print(f"{r['mode']:<10} {r['llm_calls_per_query']:>12.2f} {r['searches_per_query']:>11.2f} "
+              f"{r['mean_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['total_s']:>9.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
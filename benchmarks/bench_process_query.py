@@ -0,0 +1,85 @@
+"""
+Benchmark: fused vs two-step process_query.
+
+Runs a fixed query corpus through process_query in both modes and reports
+wall time per query and the number of LLM calls made.
+
+Usage:
+    python benchmarks/bench_process_query.py --target main
+    python benchmarks/bench_process_query.py --target main2 --repeat 3
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "workday_hackathon"))
+
+import metrics
+
+CORPUS_PATH = os.path.join(ROOT_DIR, "benchmarks", "data", "queries.json")
+
+
+def llm_call_total():
+    """LLM calls on every model tier so far, as counted by the chain registry's metrics callback."""
+    return sum(metrics.llm_calls._values.values())
+
+
+def load_corpus():
+    with open(CORPUS_PATH) as f:
+        return [item["query"] for item in json.load(f)]
+
+
+def run_mode(module, process, mode, queries, repeat):
+    module.PROCESS_QUERY_MODE = mode
+    calls_before = llm_call_total()
+    latencies = []
+    for _ in range(repeat):
+        # Measure the LLM path, not paraphrase hits from the previous run
+        module.decision_cache.clear()
+        for query in queries:
+            start = time.perf_counter()
+            process(query)
+            latencies.append(time.perf_counter() - start)
+    calls = llm_call_total() - calls_before
+    runs = len(queries) * repeat
+    return {
+        "mode": mode,
+        "queries": runs,
+        "llm_calls": calls,
+        "calls_per_query": calls / runs,
+        "mean_s": statistics.mean(latencies),
+        "p50_s": statistics.median(latencies),
+        "max_s": max(latencies),
+        "total_s": sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["main", "main2"], default="main")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.target)
+    if args.target == "main":
+        # main.process_query is a LangChain tool
+        process = lambda q: module.process_query.invoke({"input_text": q})
+    else:
+        process = module.process_query
+
+    queries = load_corpus()
+    print(f"{'mode':<9} {'queries':>7} {'calls':>6} {'calls/q':>8} {'mean (s)':>9} {'p50 (s)':>8} {'total (s)':>9}")
+    for mode in ("two_step", "fused"):
+        r = run_mode(module, process, mode, queries, args.repeat)
+        print(f"{r['mode']:<9} {r['queries']:>7} {r['llm_calls']:>6} {r['calls_per_query']:>8.2f} "
+              f"{r['mean_s']:>9.3f} {r['p50_s']:>8.3f} {r['total_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
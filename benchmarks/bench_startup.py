@@ -0,0 +1,89 @@
+"""
+Benchmark: app2 import time and time until /health answers.
+
+1. Runs `python -X importtime -c "import app2"` and reports the total import
+   time plus the slowest modules (cumulative).
+2. Starts app2.py as a server and polls /health, reporting how long a fresh
+   worker takes to come online, and how long until /ready reports the LLM
+   stack as loaded.
+
+Usage:
+    python benchmarks/bench_startup.py --top 15 --port 5055
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT_DIR, "workday_hackathon")
+
+
+def import_times(env):
+    """(cumulative_us, self_us, module) for every module imported by `import app2`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app2"],
+        cwd=APP_DIR, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    return rows
+
+
+def wait_for(url, start, timeout):
+    """Seconds from `start` until url answers 200, or None on timeout."""
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    env = dict(os.environ, FLASK_DEBUG="false", PORT=str(args.port))
+    env.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+
+    rows = import_times(dict(env, LLM_WARMUP="false"))
+    app2_rows = [r for r in rows if r[2] == "app2"]
+    total_us = app2_rows[0][0] if app2_rows else sum(r[1] for r in rows)
+    print(f"import app2: {total_us / 1000:.1f} ms total, {len(rows)} modules")
+    print(f"{'cumulative (ms)':>16} {'self (ms)':>10}  module")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>16.1f} {self_us / 1000:>10.1f}  {name}")
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "app2.py"], cwd=APP_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        health = wait_for(f"http://127.0.0.1:{args.port}/health", start, args.timeout)
+        ready = wait_for(f"http://127.0.0.1:{args.port}/ready", start, args.timeout)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print()
+    print(f"process start -> /health 200: {health * 1000:.0f} ms" if health is not None else "/health never answered")
+    print(f"process start -> /ready 200:  {ready * 1000:.0f} ms" if ready is not None else "/ready never answered (LLM stack failed to load?)")
+
+
+if __name__ == "__main__":
+    main()
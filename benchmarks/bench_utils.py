@@ -0,0 +1,63 @@
+"""Shared helpers for the benchmark scripts: percentiles, result tables and a search stub."""
+import asyncio
+import time
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def latency_summary(name, latencies, wall, errors=0, **extra):
+    """Throughput and p50/p95/p99 (milliseconds) for one benchmark target."""
+    total = len(latencies) + errors
+    return {
+        "target": name,
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput_rps": total / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        **extra,
+    }
+
+
+def print_table(rows):
+    print(f"{'target':<34} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in rows:
+        print(f"{r['target']:<34} {r['requests']:>6} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+class StubSearch:
+    """Stands in for mainV3's DuckDuckGoSearchRun: fixed latency, canned results, no network."""
+
+    def __init__(self, latency=0.3):
+        self.latency = latency
+        self.calls = 0
+
+    def _result(self, query):
+        self.calls += 1
+        return f"Top stories for {query}: headline one. Headline two. Headline three."
+
+    def run(self, query):
+        time.sleep(self.latency)
+        return self._result(query)
+
+    async def ainvoke(self, query):
+        await asyncio.sleep(self.latency)
+        return self._result(query)
+
+
+def stub_search(latency=0.3):
+    """Replace mainV3's search tool with a StubSearch and return it."""
+    import mainV3
+    mainV3.ddg = StubSearch(latency)
+    mainV3.search_cache.clear()
+    return mainV3.ddg
@@ -0,0 +1,102 @@
+"""
+Evaluate the local fast-path classifier against LLM (or hand) labels.
+
+For each task and confidence threshold it reports how many queries the local
+classifier answers itself (LLM calls saved) and how often those answers agree
+with the reference labels. The model is trained on benchmarks/data/queries.json,
+so agreement there is in-sample; the held-out queries in
+benchmarks/data/classifier_holdout.json are never trained on (and include
+look-alikes such as "the last Roman emperor") and are the number to trust.
+
+Usage:
+    python benchmarks/eval_classifier.py                     # corpus labels, offline
+    python benchmarks/eval_classifier.py --labels llm        # label with the live LLM
+    python benchmarks/eval_classifier.py --labels llm --train  # refit and save weights
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from query_classifier import WEIGHTS_PATH, LogisticModel, QueryClassifier, extract_features
+
+CORPUS_PATH = os.path.join(ROOT_DIR, "benchmarks", "data", "queries.json")
+HOLDOUT_PATH = os.path.join(ROOT_DIR, "benchmarks", "data", "classifier_holdout.json")
+TASKS = ("simple", "searchable")
+
+
+def corpus_labels(path):
+    with open(path) as f:
+        corpus = json.load(f)
+    queries = [item["query"] for item in corpus]
+    return queries, {task: [item[task] for item in corpus] for task in TASKS}
+
+
+def llm_labels(queries):
+    """Ask the real LLM checks, with the local fast path switched off."""
+    import main
+    import mainV3
+    main.simple_classifier.threshold = 2.0
+    mainV3.searchable_classifier.threshold = 2.0
+    return {
+        "simple": [main.is_simple(q) for q in queries],
+        "searchable": [mainV3.is_searchable(q) for q in queries],
+    }
+
+
+def evaluate(task, queries, labels, threshold, model):
+    classifier = QueryClassifier(task, threshold=threshold, model=model)
+    local = agree = 0
+    start = time.perf_counter()
+    for query, label in zip(queries, labels):
+        decision = classifier.classify(query)
+        if decision is not None:
+            local += 1
+            agree += decision == label
+    elapsed_us = (time.perf_counter() - start) / len(queries) * 1e6
+    return local, agree, elapsed_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", choices=["corpus", "llm"], default="corpus")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--train", action="store_true", help=f"refit the models and write {WEIGHTS_PATH}")
+    args = parser.parse_args()
+
+    queries, labels = corpus_labels(CORPUS_PATH)
+    holdout, holdout_labels = corpus_labels(HOLDOUT_PATH)
+    if args.labels == "llm":
+        labels = llm_labels(queries)
+        holdout_labels = llm_labels(holdout)
+
+    X = [extract_features(q) for q in queries]
+    models = {}
+    for task in TASKS:
+        if args.train:
+            models[task] = LogisticModel.fit(X, labels[task])
+        else:
+            models[task] = None  # use the shipped weights
+
+    if args.train:
+        with open(WEIGHTS_PATH, "w") as f:
+            json.dump({task: models[task].to_dict() for task in TASKS}, f, indent=2)
+        print(f"Saved weights to {WEIGHTS_PATH}")
+
+    print(f"{len(queries)} training and {len(holdout)} held-out queries, labels from {args.labels}")
+    print(f"{'task':<11} {'set':<9} {'thresh':>6} {'local':>6} {'saved':>7} {'agree':>7} {'us/q':>7}")
+    for task in TASKS:
+        for name, set_queries, set_labels in (("train", queries, labels), ("held-out", holdout, holdout_labels)):
+            for threshold in args.thresholds:
+                local, agree, us = evaluate(task, set_queries, set_labels[task], threshold, models[task])
+                saved = local / len(set_queries)
+                agreement = agree / local if local else 0.0
+                print(f"{task:<11} {name:<9} {threshold:>6.2f} {local:>6} {saved:>6.0%} {agreement:>6.0%} {us:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Evaluate the near-duplicate decision cache (semantic_cache.py) offline.
+
+The cache is filled with the labelled corpus queries, then probed with:
+  - paraphrases of corpus queries (case, punctuation, filler words, word order,
+    a typo): a hit is right when it returns the source query's labels
+  - the other corpus queries, each against a cache holding every query but
+    itself: any hit is a different question answered from the cache
+  - edited queries with another number, a replaced content word or two
+    content words swapping places: should miss
+For each similarity threshold it reports the paraphrase hit rate, how many of
+all hits carried the right simple/searchable labels, the false hit rates, how
+many above-threshold matches the LSH lookup finds compared to a full scan, and
+the lookup time.
+
+Usage:
+    python benchmarks/eval_semantic_cache.py
+    python benchmarks/eval_semantic_cache.py --thresholds 0.8 0.9
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from semantic_cache import SemanticCache, content_words, cosine, same_order, same_words, vectorize, word_pairs
+
+CORPUS_PATH = os.path.join(ROOT_DIR, "benchmarks", "data", "queries.json")
+FILLERS = ["please", "can you tell me", "i want to know", "quick question:"]
+
+
+def paraphrases(query: str, rng: random.Random) -> list[str]:
+    """Rewrites that keep the meaning of the query."""
+    bare = query.rstrip("?.!")
+    words = bare.split()
+    variants = [
+        query.lower(),
+        query.upper(),
+        re.sub(r"[^\w\s]", "", query),
+        f"{rng.choice(FILLERS)} {bare.lower()}?",
+        f"  {query}  ",
+    ]
+    if " and " in bare:
+        left, right = bare.split(" and ", 1)
+        variants.append(f"{right} and {left}?")
+    long_words = [i for i, w in enumerate(words) if len(w) > 5]
+    if long_words:
+        i = rng.choice(long_words)
+        typo = words[i][:3] + words[i][4:]
+        variants.append(" ".join(words[:i] + [typo] + words[i + 1:]) + "?")
+    return variants
+
+def edits(query: str, vocabulary: list[str], rng: random.Random) -> list[str]:
+    """Small edits that change what is being asked."""
+    variants = []
+    numbers = re.findall(r"\d+", query)
+    if numbers:
+        variants.append(query.replace(numbers[0], str(int(numbers[0]) + 1), 1))
+    words = query.rstrip("?.!").split()
+    content = [i for i, w in enumerate(words) if len(w) > 4]
+    if content:
+        i = rng.choice(content)
+        variants.append(" ".join(words[:i] + [rng.choice(vocabulary)] + words[i + 1:]) + "?")
+    if len(content) >= 2 and words[content[0]].lower() != words[content[-1]].lower():
+        # Same words, roles swapped
+        i, j = content[0], content[-1]
+        swapped = list(words)
+        swapped[i], swapped[j] = words[j], words[i]
+        variants.append(" ".join(swapped) + "?")
+    return variants
+
+
+def labels_of(item):
+    return item["simple"], item["searchable"]
+
+def brute_force(cache_items, query, threshold):
+    """Best match over every stored query, for measuring LSH recall."""
+    vector, words, pairs = vectorize(query), content_words(query), word_pairs(query)
+    matches = [(cosine(vector, v), labels) for v, stored_words, stored_pairs, labels in cache_items
+               if same_words(words, stored_words) and same_order(pairs, stored_pairs)]
+    best = max(matches) if matches else (0, None)
+    return best[1] if best[0] >= threshold else None
+
+
+def evaluate(corpus, threshold, rng):
+    cache = SemanticCache("eval", threshold=threshold)
+    for item in corpus:
+        cache.set(item["query"], labels_of(item))
+    stored = [(vectorize(item["query"]), content_words(item["query"]), word_pairs(item["query"]), labels_of(item))
+              for item in corpus]
+    vocabulary = sorted({w.strip("?,.").lower() for item in corpus for w in item["query"].split() if len(w) > 4})
+
+    probes = 0
+    paraphrase_hits = correct = total_hits = 0
+    lsh_found = exhaustive_found = 0
+    lookup_time = 0.0
+    for item in corpus:
+        for variant in paraphrases(item["query"], rng):
+            start = time.perf_counter()
+            found = cache.lookup(variant)
+            lookup_time += time.perf_counter() - start
+            probes += 1
+            exhaustive_found += brute_force(stored, variant, threshold) is not None
+            if found is not None:
+                lsh_found += 1
+                paraphrase_hits += 1
+                total_hits += 1
+                correct += found[0] == labels_of(item)
+
+    # Each corpus query against all the others
+    distinct_hits = 0
+    for i, item in enumerate(corpus):
+        others = SemanticCache("eval", threshold=threshold)
+        for j, other in enumerate(corpus):
+            if j != i:
+                others.set(other["query"], labels_of(other))
+        found = others.lookup(item["query"])
+        if found is not None:
+            distinct_hits += 1
+            total_hits += 1
+            correct += found[0] == labels_of(item)
+
+    edited = [v for item in corpus for v in edits(item["query"], vocabulary, rng)]
+    edit_hits = sum(cache.lookup(v) is not None for v in edited)
+
+    paraphrases_total = probes
+    return {
+        "hit_rate": paraphrase_hits / paraphrases_total,
+        "accuracy": correct / total_hits if total_hits else 1.0,
+        "distinct_false": distinct_hits / len(corpus),
+        "edit_false": edit_hits / len(edited) if edited else 0.0,
+        "recall": lsh_found / exhaustive_found if exhaustive_found else 1.0,
+        "us": lookup_time / probes * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.85, 0.9, 0.95])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        corpus = json.load(f)
+
+    print(f"{len(corpus)} corpus queries")
+    print(f"{'thresh':>6} {'hits':>6} {'accuracy':>9} {'distinct':>9} {'edited':>7} {'lsh':>6} {'us/q':>7}")
+    for threshold in args.thresholds:
+        r = evaluate(corpus, threshold, random.Random(args.seed))
+        print(f"{threshold:>6.2f} {r['hit_rate']:>6.0%} {r['accuracy']:>9.0%} {r['distinct_false']:>9.0%} "
+              f"{r['edit_false']:>7.0%} {r['recall']:>6.0%} {r['us']:>7.1f}")
+    print("hits: paraphrases answered from the cache; accuracy: hits with the right labels;")
+    print("distinct / edited: other questions answered from the cache (false hits); lsh: LSH recall vs full scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+"""
+Load generator for app2.py, app.py and service.py: finds where a server saturates.
+
+Starts the server in a subprocess with the local stand-in LLM (LLM_BACKEND=fake,
+latency from FAKE_LLM_LATENCY) and DuckDuckGo stubbed out, or targets one that
+is already running (--url, e.g. under gunicorn). It replays a mix of editor and
+agent requests with realistic text lengths:
+  - open loop at a fixed rate (--rate) or ramping between two rates (--ramp),
+    with Poisson arrivals, so a slow server builds a queue like real traffic does
+  - or closed loop (--users): each virtual user sends its next request when the
+    previous one finishes, after a think time
+and reports throughput, error rate, status codes and p50/p95/p99 latency per
+endpoint, plus a timeline in --window second steps to show where latency takes
+off. Results are saved under benchmarks/results/ with the git commit, and
+--compare prints the change against an earlier run.
+
+Edit and suggestion texts have lognormal word counts (--text-words median,
+--text-sigma spread), split into paragraphs. Queries come from the benchmark
+corpus, made unique so the caches don't hide the LLM cost (--repeat-fraction
+re-sends earlier inputs to model cache hits). Virtual clients rotate through
+--clients X-Client-Id values so admission control sees many clients; a server
+started here trusts the header from 127.0.0.1 (ADMISSION_TRUSTED_PROXIES), a
+--url server only does if configured the same way, like behind a real proxy.
+
+Usage:
+    python benchmarks/load_test.py --server app2 --rate 20 --duration 30
+    python benchmarks/load_test.py --server service --ramp 5 80 --duration 60
+    python benchmarks/load_test.py --server service --users 32 --mix edit=1
+    python benchmarks/load_test.py --url http://localhost:5000 --server app2 --rate 10
+    python benchmarks/load_test.py --server app --rate 5 --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT_DIR, "benchmarks")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+os.environ.setdefault("LLM_WARMUP", "false")
+
+from bench_utils import latency_summary, percentile, print_table
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "data", "queries.json")
+
+# Request kind -> path, per server
+ENDPOINTS = {
+    "app2": {"edit": "/api/ai_edit", "suggestions": "/api/ai_suggestions", "process_query": "/api/process_query"},
+    "app": {"news_agent": "/news-agent"},
+    "service": {
+        "edit": "/api/ai_edit", "suggestions": "/api/ai_suggestions",
+        "process_query": "/api/process_query", "news_agent": "/news-agent",
+    },
+}
+HEALTH_PATHS = {"app2": "/health", "app": "/metrics", "service": "/health"}
+DEFAULT_MIX = "edit=0.4,suggestions=0.2,process_query=0.3,news_agent=0.1"
+
+
+# --- Server ---
+
+def serve(name: str, port: int):
+    """Run a server in this process with DuckDuckGo stubbed out (the --serve mode)."""
+    if name in ("app", "service"):
+        from bench_utils import stub_search
+        stub_search(float(os.environ.get("BENCH_SEARCH_LATENCY", 0.3)))
+    if name == "app2":
+        sys.path.append(os.path.join(ROOT_DIR, "workday_hackathon"))
+        from app2 import app
+        app.run(host="127.0.0.1", port=port, threaded=True)
+    else:
+        import importlib
+        import uvicorn
+        uvicorn.run(importlib.import_module(name).app, host="127.0.0.1", port=port, log_level="warning")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(name: str, log_path=None):
+    port = free_port()
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", name, "--port", str(port)],
+        stdout=log, stderr=subprocess.STDOUT, cwd=ROOT_DIR,
+        # The load generator stands in for the proxy that sets X-Client-Id
+        env={**os.environ, "ADMISSION_TRUSTED_PROXIES": os.environ.get("ADMISSION_TRUSTED_PROXIES", "127.0.0.1")},
+    )
+    return process, f"http://127.0.0.1:{port}"
+
+async def wait_ready(client, url: str, path: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url + path)).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"server at {url} not ready after {timeout:.0f}s")
+
+
+# --- Workload ---
+
+def parse_mix(spec: str, server: str) -> dict:
+    """Weights per request kind, kinds the server doesn't have are dropped."""
+    mix = {}
+    for item in spec.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in ENDPOINTS["service"]:
+            raise ValueError(f"Unknown request kind {kind!r}, expected one of {sorted(ENDPOINTS['service'])}")
+        if kind in ENDPOINTS[server]:
+            mix[kind] = float(weight or 1)
+        else:
+            print(f"  {server} has no {kind} endpoint, leaving it out of the mix")
+    if not mix:
+        raise ValueError(f"No request kind in {spec!r} is served by {server}")
+    return mix
+
+
+class Workload:
+    """Draws request kinds and bodies from the mix."""
+
+    def __init__(self, mix: dict, text_words: float, text_sigma: float, repeat_fraction: float, seed: int):
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.text_words = text_words
+        self.text_sigma = text_sigma
+        self.repeat_fraction = repeat_fraction
+        self.rng = random.Random(seed)
+        with open(CORPUS_PATH) as f:
+            self.queries = [item["query"] for item in json.load(f)]
+        self.vocabulary = sorted({w.strip("?,.'").lower() for q in self.queries for w in q.split()})
+        self.sent = {kind: [] for kind in self.kinds}
+        self.count = 0
+
+    def _text(self):
+        words = max(5, min(3000, int(self.rng.lognormvariate(0, self.text_sigma) * self.text_words)))
+        paragraphs, current = [], []
+        for _ in range(words):
+            current.append(self.rng.choice(self.vocabulary))
+            if len(current) >= 40 and self.rng.random() < 0.05:
+                paragraphs.append(" ".join(current).capitalize() + ".")
+                current = []
+        if current:
+            paragraphs.append(" ".join(current).capitalize() + ".")
+        return "\n\n".join(paragraphs)
+
+    def next(self):
+        """(kind, json body) of the next request."""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        self.count += 1
+        previous = self.sent[kind]
+        if previous and self.rng.random() < self.repeat_fraction:
+            return kind, self.rng.choice(previous)
+        if kind in ("edit", "suggestions"):
+            body = {"text": f"{self._text()} (request {self.count})"}
+        else:
+            query = f"{self.rng.choice(self.queries)} (request {self.count})"
+            body = {"query": query} if kind == "news_agent" else {"text": query}
+        previous.append(body)
+        return kind, body
+
+
+# --- Load ---
+
+class Recorder:
+    def __init__(self):
+        self.records = []  # (kind, sent at, latency, status)
+
+    def add(self, kind, sent, latency, status):
+        self.records.append((kind, sent, latency, status))
+
+
+async def send(client, url, path, kind, body, client_id, recorder, start):
+    sent = time.monotonic()
+    try:
+        response = await client.post(url + path, json=body, headers={"X-Client-Id": client_id})
+        status = response.status_code
+    except Exception as e:
+        status = type(e).__name__
+    recorder.add(kind, sent - start, time.monotonic() - sent, status)
+
+def rate_at(elapsed, duration, rate, ramp):
+    if ramp:
+        low, high = ramp
+        return low + (high - low) * min(1.0, elapsed / duration)
+    return rate
+
+async def open_loop(client, url, endpoints, workload, args, recorder):
+    """Poisson arrivals at the fixed or ramping rate, regardless of how fast the server answers."""
+    rng = random.Random(args.seed + 1)
+    tasks = set()
+    start = time.monotonic()
+    next_at = 0.0
+    while next_at < args.duration:
+        delay = start + next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind, body = workload.next()
+        if len(tasks) >= args.max_in_flight:
+            # The client can't keep up, count it rather than silently sending less
+            recorder.add(kind, next_at, 0.0, "client_overflow")
+        else:
+            client_id = f"load-{workload.count % args.clients}"
+            task = asyncio.ensure_future(send(client, url, endpoints[kind], kind, body, client_id, recorder, start))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        next_at += rng.expovariate(rate_at(next_at, args.duration, args.rate, args.ramp))
+    if tasks:
+        await asyncio.wait(tasks)
+    return time.monotonic() - start
+
+async def closed_loop(client, url, endpoints, workload, args, recorder):
+    """args.users virtual users, each sending its next request after the previous answer and a think time."""
+    start = time.monotonic()
+
+    async def user(n):
+        rng = random.Random(args.seed + n)
+        while time.monotonic() - start < args.duration:
+            kind, body = workload.next()
+            await send(client, url, endpoints[kind], kind, body, f"load-{n % args.clients}", recorder, start)
+            if args.think_time:
+                await asyncio.sleep(rng.expovariate(1 / args.think_time))
+
+    await asyncio.gather(*(user(n) for n in range(args.users)))
+    return time.monotonic() - start
+
+
+# --- Report ---
+
+def summarize(recorder, wall, window):
+    rows, timeline = [], []
+    kinds = sorted({r[0] for r in recorder.records})
+    for kind in kinds + ["all"]:
+        records = [r for r in recorder.records if kind == "all" or r[0] == kind]
+        ok = [r[2] for r in records if r[3] == 200]
+        statuses = {}
+        for r in records:
+            statuses[str(r[3])] = statuses.get(str(r[3]), 0) + 1
+        rows.append(latency_summary(kind, ok, wall, len(records) - len(ok), statuses=statuses))
+    for step in range(int(wall // window) + 1):
+        records = [r for r in recorder.records if step * window <= r[1] < (step + 1) * window]
+        if not records:
+            continue
+        ok = [r[2] for r in records if r[3] == 200]
+        timeline.append({
+            "start_s": step * window,
+            "sent_rps": len(records) / window,
+            "ok_rps": len(ok) / window,
+            "error_rate": 1 - len(ok) / len(records),
+            "p50_ms": percentile(ok, 50) * 1000,
+            "p95_ms": percentile(ok, 95) * 1000,
+        })
+    return rows, timeline
+
+def print_timeline(timeline):
+    print(f"{'t (s)':>6} {'sent/s':>8} {'ok/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for t in timeline:
+        print(f"{t['start_s']:>6.0f} {t['sent_rps']:>8.1f} {t['ok_rps']:>8.1f} {t['error_rate']:>6.0%} "
+              f"{t['p50_ms']:>8.1f} {t['p95_ms']:>8.1f}")
+
+def print_comparison(rows, path):
+    with open(path) as f:
+        before = {r["target"]: r for r in json.load(f)["results"]}
+    print(f"\nChange against {path}:")
+    print(f"{'target':<34} {'req/s':>9} {'errors':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in rows:
+        old = before.get(r["target"])
+        if old is None:
+            continue
+        print(f"{r['target']:<34} {r['throughput_rps'] - old['throughput_rps']:>+9.1f} "
+              f"{(r['error_rate'] - old['error_rate']) * 100:>+8.1f}% "
+              + " ".join(f"{r[k] - old[k]:>+9.1f}" for k in ("p50_ms", "p95_ms", "p99_ms")))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args):
+    import httpx
+
+    endpoints = ENDPOINTS[args.server]
+    workload = Workload(parse_mix(args.mix, args.server), args.text_words, args.text_sigma,
+                        args.repeat_fraction, args.seed)
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.server, args.server_log)
+    try:
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            await wait_ready(client, url, HEALTH_PATHS[args.server])
+            # One request per kind first, so chain compilation isn't in the numbers
+            for kind, path in endpoints.items():
+                if kind in workload.kinds:
+                    body = {"query": "warm up"} if kind == "news_agent" else {"text": "warm up"}
+                    await client.post(url + path, json=body)
+            recorder = Recorder()
+            loop = closed_loop if args.users else open_loop
+            wall = await loop(client, url, endpoints, workload, args, recorder)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+    return summarize(recorder, wall, args.window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=sorted(ENDPOINTS), default="service")
+    parser.add_argument("--url", help="target a running server instead of starting one")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--rate", type=float, default=10.0, help="requests/second, open loop")
+    load.add_argument("--ramp", type=float, nargs=2, metavar=("FROM", "TO"), help="ramp the rate over the run")
+    load.add_argument("--users", type=int, help="closed loop with this many virtual users")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's requests")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"kind=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--text-words", type=float, default=120, help="median words in edit/suggestion texts")
+    parser.add_argument("--text-sigma", type=float, default=0.8, help="lognormal spread of text lengths")
+    parser.add_argument("--repeat-fraction", type=float, default=0.0, help="share of requests re-sending an earlier input")
+    parser.add_argument("--clients", type=int, default=64, help="distinct X-Client-Id values")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--window", type=float, default=5.0, help="timeline step in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-log", help="write the server's output here")
+    parser.add_argument("--save", default=None, help="results file (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    if args.ramp:
+        args.rate = None
+
+    shape = f"users={args.users}" if args.users else f"ramp={args.ramp[0]:g}->{args.ramp[1]:g}/s" if args.ramp else f"rate={args.rate:g}/s"
+    print(f"server={args.server} {shape} duration={args.duration:g}s backend={os.environ['LLM_BACKEND']} "
+          f"latency={os.environ.get('FAKE_LLM_LATENCY', 'fixed:0.2')}")
+    rows, timeline = asyncio.run(run(args))
+
+    print()
+    print_timeline(timeline)
+    print()
+    print_table(rows)
+    if args.compare:
+        print_comparison(rows, args.compare)
+
+    if not args.no_save:
+        commit = git_commit()
+        path = args.save or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        config = {k: v for k, v in vars(args).items() if k not in ("serve", "port", "save", "no_save", "compare")}
+        with open(path, "w") as f:
+            json.dump({
+                "commit": commit,
+                "config": config,
+                "env": {k: v for k, v in os.environ.items()
+                        if k.startswith(("LLM_", "FAKE_LLM_", "ADMISSION_", "GROQ_", "BENCH_"))},
+                "results": rows,
+                "timeline": timeline,
+            }, f, indent=2)
+        print(f"\nSaved results to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Offline latency benchmark suite for the pipelines and HTTP endpoints.
+
+Uses the local stand-in LLM (LLM_BACKEND=fake by default, or replay with a
+recording made with LLM_BACKEND=record), so no Groq key is needed. Every
+target is driven with a fixed number of requests at a fixed concurrency and
+reports throughput and p50/p95/p99 latency.
+
+DuckDuckGo is replaced by a stub with BENCH_SEARCH_LATENCY seconds of latency.
+Inputs are made unique per request so the response cache and in-flight
+coalescing don't hide the LLM cost; pass --allow-cache to measure with them.
+
+Usage:
+    python benchmarks/run_suite.py
+    FAKE_LLM_LATENCY=lognormal:0.3:0.6 python benchmarks/run_suite.py --concurrency 32 --requests 500
+    LLM_BACKEND=replay LLM_RECORD_PATH=session.jsonl python benchmarks/run_suite.py --targets app2.ai_edit
+    python benchmarks/run_suite.py --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT_DIR, "benchmarks")
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "workday_hackathon"))
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("GROQ_API_KEY", "benchmark-dummy-key")
+os.environ.setdefault("LLM_WARMUP", "false")
+# These measure the endpoints, not admission control: every request comes from one
+# address and would be rate limited past ADMISSION_CLIENT_BURST
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+from bench_utils import latency_summary, print_table, stub_search
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "data", "queries.json")
+
+
+def load_inputs(n, unique):
+    with open(CORPUS_PATH) as f:
+        corpus = [item["query"] for item in json.load(f)]
+    return [f"{corpus[i % len(corpus)]}" + (f" (request {i})" if unique else "") for i in range(n)]
+
+
+# --- Targets: name -> function(text) run on a thread pool ---
+
+def pipeline_targets():
+    def main_process_query():
+        import main
+        return lambda text: main.process_query.invoke({"input_text": text})
+
+    def main2_fn(name):
+        def load():
+            import main2
+            return getattr(main2, name)
+        return load
+
+    def mainV3_is_searchable():
+        import mainV3
+        return mainV3.is_searchable
+
+    def mainV3_summarize():
+        import mainV3
+        return lambda text: mainV3.summarize.invoke(text)
+
+    return {
+        "main.process_query": main_process_query,
+        "main2.process_query": main2_fn("process_query"),
+        "main2.run_ai_edit": main2_fn("run_ai_edit"),
+        "main2.run_ai_suggestions": main2_fn("run_ai_suggestions"),
+        "mainV3.is_searchable": mainV3_is_searchable,
+        "mainV3.summarize": mainV3_summarize,
+    }
+
+
+def flask_target(path):
+    def load():
+        from app2 import app
+        def call(text):
+            with app.test_client() as client:
+                response = client.post(path, json={"text": text})
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}")
+        return call
+    return load
+
+
+def endpoint_targets():
+    return {
+        "app2.ai_edit": flask_target("/api/ai_edit"),
+        "app2.ai_suggestions": flask_target("/api/ai_suggestions"),
+        "app2.process_query": flask_target("/api/process_query"),
+    }
+
+
+def run_threaded(name, fn, inputs, concurrency):
+    latencies, errors = [], 0
+
+    def one(text):
+        start = time.perf_counter()
+        fn(text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(one, text) for text in inputs]:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"  {name}: first error: {e}")
+    return latency_summary(name, latencies, time.perf_counter() - start, errors, concurrency=concurrency)
+
+
+def run_news_agent(inputs, concurrency):
+    """app.py /news-agent, driven in-process over ASGI with asyncio."""
+    import httpx
+    from app import app
+    stub_search(float(os.environ.get("BENCH_SEARCH_LATENCY", 0.3)))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def one(text):
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post("/news-agent", json={"query": text})
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - start)
+                    except Exception as e:
+                        errors += 1
+                        if errors == 1:
+                            print(f"  app.news_agent: first error: {e}")
+            start = time.perf_counter()
+            await asyncio.gather(*(one(text) for text in inputs))
+        return latency_summary("app.news_agent", latencies, time.perf_counter() - start, errors, concurrency=concurrency)
+
+    return asyncio.run(run())
+
+
+def main():
+    targets = {**pipeline_targets(), **endpoint_targets(), "app.news_agent": None}
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", choices=sorted(targets), default=sorted(targets))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--allow-cache", action="store_true", help="repeat inputs so caches and coalescing apply")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    print(f"backend={os.environ['LLM_BACKEND']} latency={os.environ.get('FAKE_LLM_LATENCY', 'fixed:0.2')} "
+          f"requests={args.requests} concurrency={args.concurrency}")
+    inputs = load_inputs(args.requests, unique=not args.allow_cache)
+    rows = []
+    for name in args.targets:
+        try:
+            if name == "app.news_agent":
+                rows.append(run_news_agent(inputs, args.concurrency))
+            else:
+                rows.append(run_threaded(name, targets[name](), inputs, args.concurrency))
+        except ImportError as e:
+            print(f"  skipping {name}: {e}")
+
+    print()
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"env": {k: v for k, v in os.environ.items() if k.startswith(("LLM_", "FAKE_LLM_", "ADMISSION_"))},
+                       "results": rows}, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
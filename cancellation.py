@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import threading
+import time
+import uuid
+
+import metrics
+
+# --- Cancellation of superseded and abandoned requests ---
+# Every LLM request gets a cancel token, carried in a contextvar like the
+# deadline (deadlines.py). A token is cancelled when:
+#   - a newer request for the same route arrives from the same session
+#     (X-Session-Id header): the overlay re-submitted, the old answer is stale
+#   - the client disconnects (closed tab, aborted fetch)
+#   - the client asks for it by request id (POST /api/cancel)
+# What stops then:
+#   - async handlers: the task is cancelled, which aborts the awaited Groq call
+#   - streams: the next token raises RequestCancelled (cancellation_callback_handler),
+#     which closes the Groq response so it stops generating
+#   - sync calls: chain calls that haven't started yet fail at once, a call
+#     already waiting on Groq can't be interrupted and its answer is dropped
+# Requests without X-Session-Id are never superseded, since clients behind one
+# address would otherwise cancel each other.
+
+
+class RequestCancelled(Exception):
+    """The request was cancelled, reason is superseded, disconnected or client."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"request cancelled ({reason})")
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self, request_id: str, route: str, session=None):
+        self.request_id = request_id
+        self.route = route
+        self.session = session
+        self.started = time.monotonic()
+        self.reason = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str):
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        metrics.requests_cancelled.inc(route=self.route, reason=reason)
+        metrics.cancelled_work_seconds.inc(time.monotonic() - self.started, route=self.route)
+        print(f"Cancelled request {self.request_id} on {self.route} ({reason})")
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Run callback() on cancellation, right away if already cancelled."""
+        with self._lock:
+            if self.reason is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self.reason is not None:
+            raise RequestCancelled(self.reason)
+
+
+_token = contextvars.ContextVar("cancel_token", default=None)
+
+def current_token():
+    return _token.get()
+
+def cancelled() -> bool:
+    token = _token.get()
+    return token is not None and token.cancelled
+
+def check():
+    """Raise RequestCancelled if the current request has been cancelled."""
+    token = _token.get()
+    if token is not None:
+        token.check()
+
+
+class RequestRegistry:
+    """In-flight requests by id and by (session, route), for supersede and cancel-by-id."""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_session = {}
+        self._lock = threading.Lock()
+
+    def start(self, request_id: str, route: str, session=None) -> CancelToken:
+        """Register a request and make its token current. Cancels the session's previous one."""
+        token = CancelToken(request_id, route, session)
+        with self._lock:
+            previous = self._by_session.get((session, route)) if session else None
+            if session:
+                self._by_session[(session, route)] = token
+            self._by_id[request_id] = token
+        if previous is not None:
+            previous.cancel("superseded")
+        _token.set(token)
+        return token
+
+    def finish(self, token: CancelToken):
+        with self._lock:
+            if self._by_id.get(token.request_id) is token:
+                del self._by_id[token.request_id]
+            if token.session and self._by_session.get((token.session, token.route)) is token:
+                del self._by_session[(token.session, token.route)]
+
+    def cancel(self, request_id: str, reason: str = "client") -> bool:
+        with self._lock:
+            token = self._by_id.get(request_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._by_id), "sessions": len(self._by_session)}
+
+
+registry = RequestRegistry()
+
+def new_request_id(header_value=None) -> str:
+    """The client's X-Request-Id if it sent one, else a fresh id."""
+    return header_value or uuid.uuid4().hex
+
+
+async def run_cancellable(request, route: str, awaitable, poll_interval: float = 0.5):
+    """
+    Await a request's work as a cancellable task: superseded, cancelled by id, or
+    cancelled when the client disconnects (request.is_disconnected(), Starlette).
+    Raises RequestCancelled in those cases.
+    """
+    token = registry.start(
+        request.state.request_id, route, request.headers.get("x-session-id"))
+    task = asyncio.ensure_future(awaitable)  # inherits the token through the context
+    loop = asyncio.get_running_loop()
+    token.add_callback(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                break
+            if await request.is_disconnected():
+                token.cancel("disconnected")
+        if task.cancelled() and token.cancelled:
+            raise RequestCancelled(token.reason)
+        return task.result()
+    finally:
+        task.cancel()
+        registry.finish(token)
+
+
+_callback_handler = None
+
+def cancellation_callback_handler():
+    """LangChain callback that stops chain calls, and streams token by token, once the request is cancelled."""
+    global _callback_handler
+    if _callback_handler is not None:
+        return _callback_handler
+
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class CancellationHandler(BaseCallbackHandler):
+        raise_error = True  # let RequestCancelled propagate out of invoke / stream
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self._check("start")
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self._check("start")
+
+        def on_llm_new_token(self, token, **kwargs):
+            self._check("stream")
+
+        def _check(self, where):
+            if cancelled():
+                metrics.llm_calls_cancelled.inc(where=where)
+                check()
+
+    _callback_handler = CancellationHandler()
+    return _callback_handler
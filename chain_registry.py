@@ -0,0 +1,118 @@
+import os
+import threading
+
+from deadlines import LLM_CALL_TIMEOUT, deadline_callback_handler
+from cancellation import cancellation_callback_handler
+from metrics import llm_callback_handler
+
+# --- Chain registry ---
+# Prompts are registered once at import time and compiled into
+# `prompt | client | parser` on first use. Every chain for the same model
+# shares one client, so one HTTP connection pool per model.
+# Nothing from langchain is imported until the first chain is compiled, so
+# modules can register their prompts without paying that import cost.
+# Every client reports call latency and token counts to metrics.py, labelled
+# with the chain name.
+# Chains registered with a route pick their model per call from model_router.py,
+# one compiled chain per (name, model).
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+_clients = {}
+_specs = {}
+_chains = {}
+_lock = threading.Lock()
+
+def create_groq_client(model: str):
+    """
+    Build the Groq chat client for a model. All our calls are deterministic (temperature=0).
+    Requests go through the model's rate-limit scheduler (scheduler.py), which
+    also does the retries, bounded by the request deadline (deadlines.py).
+    """
+    from langchain_groq import ChatGroq
+    from scheduler import scheduled_http_clients
+    http_client, http_async_client = scheduled_http_clients(model)
+    return ChatGroq(
+        model=model,
+        temperature=0,
+        max_retries=0,
+        timeout=LLM_CALL_TIMEOUT,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+def create_client(model: str):
+    """
+    Build the chat client for a model. LLM_BACKEND picks the implementation:
+    groq (default), or fake / record / replay from fake_llm.py for offline runs.
+    """
+    backend = os.environ.get("LLM_BACKEND", "groq")
+    if backend == "groq":
+        return create_groq_client(model)
+    from fake_llm import create_backend_client
+    return create_backend_client(backend, model, lambda: create_groq_client(model))
+
+def get_client(model: str = DEFAULT_MODEL):
+    """Shared client for a model, created on first use."""
+    client = _clients.get(model)
+    if client is None:
+        with _lock:
+            client = _clients.get(model)
+            if client is None:
+                client = create_client(model)
+                client.callbacks = [llm_callback_handler(), deadline_callback_handler(), cancellation_callback_handler()]
+                _clients[model] = client
+    return client
+
+def register_chain(name: str, prompt, model: str = DEFAULT_MODEL, parse: bool = True, route: str = None):
+    """
+    Register a prompt under a name. The prompt is a prompt template object or a
+    template string (compiled with PromptTemplate.from_template on first use).
+    parse=False keeps the raw chat message output.
+    With a route the model is chosen per call by model_router and model is ignored.
+    """
+    with _lock:
+        _specs[name] = (prompt, model, parse, route)
+        for key in [k for k in _chains if k[0] == name]:
+            del _chains[key]
+
+def chain_model(name: str, text: str = None) -> str:
+    """Model a call to this chain with this input text would use."""
+    _, model, _, route = _specs[name]
+    if route is None:
+        return model
+    from model_router import model_for
+    return model_for(route, text)
+
+def get_chain(name: str, text: str = None):
+    """
+    Compiled chain for a registered name, built once per model and reused.
+    Pass the input text for routed chains so complex input can be escalated.
+    """
+    model = chain_model(name, text)
+    chain = _chains.get((name, model))
+    if chain is None:
+        prompt, _, parse, route = _specs[name]
+        if isinstance(prompt, str):
+            from langchain_core.prompts import PromptTemplate
+            prompt = PromptTemplate.from_template(prompt)
+        chain = prompt | get_client(model)
+        if parse:
+            from langchain_core.output_parsers import StrOutputParser
+            chain = chain | StrOutputParser()
+        chain = chain.with_config(metadata={"chain": name, "route": route or ""})
+        _chains[(name, model)] = chain
+    return chain
+
+def compile_all():
+    """Compile every registered chain now, e.g. to warm a worker up in the background."""
+    for name in list(_specs):
+        get_chain(name)
+
+def is_loaded() -> bool:
+    """True once at least one client has been created."""
+    return bool(_clients)
+
+def registered_chains() -> dict:
+    """name -> model for every registered chain (the ordinary tier for routed chains)."""
+    return {name: chain_model(name) for name in _specs}
@@ -0,0 +1,126 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+# --- Per-request deadlines ---
+# The HTTP layer (app.py, app2.py) starts a deadline for every request. It is
+# carried in a contextvar, so every chain call made while handling the request
+# sees it:
+#   - chain calls made after it has passed fail at once (deadline_callback_handler)
+#   - each Groq HTTP call gets a timeout of at most the remaining budget, and is
+#     only retried while there is budget left (scheduler.py)
+# Outside a request, calls still get LLM_CALL_TIMEOUT instead of waiting forever.
+
+LLM_CALL_TIMEOUT = float(os.environ.get("LLM_CALL_TIMEOUT", 30))
+# Upper bound for deadlines requested by clients with X-Request-Timeout
+MAX_REQUEST_TIMEOUT = float(os.environ.get("MAX_REQUEST_TIMEOUT", 120))
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out."""
+
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+def start_deadline(seconds: float):
+    """Set the deadline for the current request, seconds from now. Returns a reset token."""
+    return _deadline.set(time.monotonic() + seconds)
+
+@contextmanager
+def deadline(seconds: float):
+    """Deadline for a block of work. Nested deadlines can only shorten the outer one."""
+    until = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(until if outer is None else min(outer, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    """Seconds left before the current deadline, or None without one."""
+    until = _deadline.get()
+    return None if until is None else until - time.monotonic()
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+def check():
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    if expired():
+        raise DeadlineExceeded("request deadline exceeded")
+
+def caused_by_deadline(e: BaseException) -> bool:
+    """
+    Whether e is DeadlineExceeded or was raised because of one. The Groq SDK wraps
+    errors from the transport (scheduler.py) in APIConnectionError, while the
+    deadline itself may not have passed yet (the rate-limit wait would outlast it).
+    """
+    seen = set()
+    while e is not None and id(e) not in seen:
+        if isinstance(e, DeadlineExceeded):
+            return True
+        seen.add(id(e))
+        e = e.__cause__ or e.__context__
+    return False
+
+def raise_if_deadline(e: BaseException):
+    """Re-raise an error caused by the deadline as DeadlineExceeded."""
+    if caused_by_deadline(e):
+        raise DeadlineExceeded("request deadline exceeded") from e
+
+def call_timeout(default: float = LLM_CALL_TIMEOUT) -> float:
+    """Timeout for one upstream call: the default, capped at the remaining budget."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return min(default, left)
+
+def request_timeout(header_value, default: float) -> float:
+    """
+    Deadline for an HTTP request from its X-Request-Timeout header, else the default.
+    Clients can ask for up to MAX_REQUEST_TIMEOUT, or the default if that is longer.
+    """
+    maximum = max(MAX_REQUEST_TIMEOUT, default)
+    try:
+        return max(0.001, min(float(header_value), maximum)) if header_value else default
+    except ValueError:
+        return default
+
+async def within_deadline(awaitable):
+    """Await something, cancelling it with DeadlineExceeded when the deadline passes."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(left, 0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("request deadline exceeded") from None
+
+
+_callback_handler = None
+
+def deadline_callback_handler():
+    """LangChain callback that stops chain calls starting after the deadline has passed."""
+    global _callback_handler
+    if _callback_handler is not None:
+        return _callback_handler
+
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class DeadlineHandler(BaseCallbackHandler):
+        raise_error = True  # let DeadlineExceeded propagate out of invoke
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            check()
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            check()
+
+    _callback_handler = DeadlineHandler()
+    return _callback_handler
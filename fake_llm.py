@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# --- Local stand-in LLM backends ---
+# Selected with LLM_BACKEND (see chain_registry.create_client):
+#   fake    canned deterministic answers with a configurable latency distribution
+#   record  call Groq and append every prompt/response pair to LLM_RECORD_PATH
+#   replay  answer from LLM_RECORD_PATH, falling back to canned answers for misses
+# This lets us benchmark app.py, app2.py and the pipelines without a Groq key.
+
+RECORD_PATH = os.environ.get("LLM_RECORD_PATH", "llm_recording.jsonl")
+
+
+def parse_latency(spec: str):
+    """
+    Latency distribution from a spec string, returns a function rng -> seconds.
+      fixed:0.3            always 0.3s
+      uniform:0.1:0.5      uniform between 0.1s and 0.5s
+      normal:0.3:0.05      normal with mean 0.3s, std 0.05s (clipped at 0)
+      lognormal:0.3:0.5    lognormal with median 0.3s and sigma 0.5 (long tail)
+    """
+    kind, *args = spec.split(":")
+    values = [float(a) for a in args]
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution {spec!r}")
+
+
+def messages_key(model: str, messages) -> str:
+    """Stable key for a prompt, used by record and replay."""
+    raw = json.dumps([model, [[m.type, m.content] for m in messages]])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _stable_choice(text: str, options):
+    return options[int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % len(options)]
+
+_QUOTED_RE = re.compile(r'"([^"]{1,500})"')
+
+def canned_response(prompt: str) -> str:
+    """Deterministic answer shaped like what each of our prompts expects."""
+    quoted = _QUOTED_RE.search(prompt)
+    subject = quoted.group(1) if quoted else prompt[-200:]
+    if "Final Answer" in prompt and "Action" in prompt:
+        return _react_step(prompt)
+    if '"simple": true or false' in prompt:
+        simple = _stable_choice(subject, [True, False])
+        queries = [subject] if simple else [f"{subject} part {i}" for i in (1, 2)]
+        return json.dumps({"simple": simple, "queries": queries})
+    if "yes' or 'no'" in prompt or "yes/no" in prompt or "'yes' if" in prompt:
+        return _stable_choice(subject, ["yes", "no"])
+    if "list of strings" in prompt or "Python syntax" in prompt:
+        return json.dumps([f"{subject} part {i}" for i in (1, 2, 3)])
+    words = prompt.split()
+    return "This is a canned response. " + " ".join(words[-40:])
+
+
+# The trajectory the mainV3 agent usually takes for a news question
+_REACT_TOOLS = ["Process Query", "Search", "Summarize"]
+_QUESTION_RE = re.compile(r"^Question: (.*)$", re.M)
+
+def _react_step(prompt: str) -> str:
+    """Next ReAct step for the agent prompt: one tool per step, then the final answer."""
+    questions = _QUESTION_RE.findall(prompt)
+    question = questions[-1] if questions else prompt[-80:]
+    # The format instructions contain one "Observation:" line, every finished step adds one
+    step = max(0, len(re.findall(r"^Observation:", prompt, re.M)) - 1)
+    if step < len(_REACT_TOOLS):
+        return f"Thought: I should use {_REACT_TOOLS[step]}\nAction: {_REACT_TOOLS[step]}\nAction Input: {question}"
+    return f"Thought: I now know the final answer\nFinal Answer: Summary of {question[:80]}"
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps for a sampled latency and returns canned answers."""
+
+    model: str = "fake"
+    latency: str = "fixed:0.2"
+    token_delay: float = 0.0
+    seed: Optional[int] = None
+    responses: dict = {}  # exact prompt text -> response, checked before canned answers
+
+    _rng: Any = None
+    _sample: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._sample = parse_latency(self.latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt_text(self, messages) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _answer(self, messages) -> str:
+        prompt = self._prompt_text(messages)
+        return self.responses.get(prompt) or canned_response(prompt)
+
+    def _message(self, messages, content) -> AIMessage:
+        input_tokens = len(self._prompt_text(messages).split())
+        output_tokens = len(content.split())
+        return AIMessage(
+            content=content,
+            response_metadata={"model_name": self.model},
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._sample(self._rng))
+        content = self._answer(messages)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._sample(self._rng))
+        content = self._answer(messages)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._sample(self._rng))
+        for token in re.findall(r"\S+\s*", self._answer(messages)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._sample(self._rng))
+        for token in re.findall(r"\S+\s*", self._answer(messages)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class RecordingChatModel(BaseChatModel):
+    """Wraps a real chat model and appends every prompt/response pair to a JSONL file."""
+
+    inner: Any
+    model: str
+    path: str = RECORD_PATH
+
+    _lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat"
+
+    def _record(self, messages, message):
+        entry = {
+            "key": messages_key(self.model, messages),
+            "model": self.model,
+            "prompt": [[m.type, m.content] for m in messages],
+            "response": message.content,
+        }
+        with self._lock, open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self.inner.invoke(messages, stop=stop, **kwargs)
+        self._record(messages, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        self._record(messages, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def load_recording(path: str = RECORD_PATH) -> dict:
+    """key -> response from a recording file (later entries win)."""
+    recorded = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recorded[entry["key"]] = entry["response"]
+    return recorded
+
+
+class ReplayChatModel(FakeChatModel):
+    """Answers recorded prompts from a recording file, canned answers otherwise."""
+
+    recorded: dict = {}
+    replay_hits: int = 0
+    replay_misses: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-chat"
+
+    def _answer(self, messages) -> str:
+        response = self.recorded.get(messages_key(self.model, messages))
+        if response is None:
+            self.replay_misses += 1
+            return super()._answer(messages)
+        self.replay_hits += 1
+        return response
+
+
+_recordings = {}
+
+def create_backend_client(backend: str, model: str, real_factory):
+    """Build the chat client for LLM_BACKEND. real_factory() builds the Groq client."""
+    latency = os.environ.get("FAKE_LLM_LATENCY", "fixed:0.2")
+    token_delay = float(os.environ.get("FAKE_LLM_TOKEN_DELAY", 0))
+    seed = os.environ.get("FAKE_LLM_SEED")
+    seed = int(seed) if seed is not None else None
+    if backend == "fake":
+        return FakeChatModel(model=model, latency=latency, token_delay=token_delay, seed=seed)
+    if backend == "record":
+        return RecordingChatModel(inner=real_factory(), model=model, path=RECORD_PATH)
+    if backend == "replay":
+        if RECORD_PATH not in _recordings:
+            _recordings[RECORD_PATH] = load_recording(RECORD_PATH)
+        return ReplayChatModel(
+            model=model, latency=latency, token_delay=token_delay, seed=seed,
+            recorded=_recordings[RECORD_PATH],
+        )
+    raise ValueError(f"Unknown LLM_BACKEND {backend!r}, expected groq, fake, record or replay")
@@ -0,0 +1,62 @@
+import ast
+import json
+import re
+
+# --- Fused classification + split ---
+# One LLM call returns both the simple/complex decision and the sub-query list,
+# instead of is_simple followed by split_into_simple_queries.
+
+FUSED_TEMPLATE = """Given the input query: "{text}"
+Decide if this query is conceptually simple (asking about one specific thing) or complex (asking multiple things, comparing, or requiring breakdown).
+If it is simple, "queries" contains only the original query.
+If it is complex, break it down into simple, self-contained search engine queries, each focusing on a single aspect.
+Reply ONLY with a JSON object in exactly this format, with no other text:
+{{"simple": true or false, "queries": ["query 1", "query 2"]}}
+
+Query: {text}
+JSON:"""
+
+_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+def _strip_code_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else text.lstrip("`")
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+def parse_fused_response(response: str):
+    """
+    Parse the fused reply into (is_simple, queries).
+    Returns None if the reply is not in the expected format, so the caller can
+    fall back to the two-step path.
+    """
+    match = _OBJECT_RE.search(_strip_code_fences(response))
+    if match is None:
+        return None
+    raw = match.group(0)
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        try:
+            # Models sometimes answer with Python literals (True/False, single quotes)
+            data = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return None
+    if not isinstance(data, dict):
+        return None
+
+    simple = data.get("simple")
+    if isinstance(simple, str):
+        simple = {"true": True, "yes": True, "false": False, "no": False}.get(simple.strip().lower())
+    if not isinstance(simple, bool):
+        return None
+
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return None
+    queries = [q.strip() for q in queries if q.strip()]
+    if not simple and not queries:
+        return None
+    return simple, queries
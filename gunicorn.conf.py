@@ -0,0 +1,81 @@
+"""
+Production serving for app2 (Flask editor API), app.py (FastAPI /news-agent)
+and service.py (both on one event loop).
+
+    gunicorn -c gunicorn.conf.py                           # app2 on :5000
+    SERVE_APP=news_agent gunicorn -c gunicorn.conf.py      # app.py on :8000
+    SERVE_APP=service gunicorn -c gunicorn.conf.py         # service.py on :5000
+
+- preload_app: the app is imported once in the master and the workers are
+  forked from it, so workers start fast and share the imported code pages.
+  Nothing in the master starts threads: the LLM warm-up runs in each worker
+  after fork (post_fork below).
+- workers: WEB_CONCURRENCY, default one per core. app2 workers are threaded
+  (GUNICORN_THREADS each) since requests mostly wait on Groq.
+- The LLM response cache has a SQLite tier (LLM_CACHE_DB, on by default here)
+  shared by every worker, so an answer computed by one worker is a hit in the
+  others and survives restarts.
+- The Groq rate limits are split evenly between workers (GROQ_WORKERS, see scheduler.py).
+- Graceful restarts: `kill -HUP <master>` replaces workers one at a time after
+  their in-flight requests finish (up to graceful_timeout). Workers are also
+  recycled every max_requests. With preload_app, new code is picked up by
+  starting a new master (`kill -USR2`, then `kill -QUIT` the old one).
+"""
+import multiprocessing
+import os
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVE_APP = os.environ.get("SERVE_APP", "app2")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+preload_app = True
+
+if SERVE_APP == "app2":
+    wsgi_app = "app2:app"
+    chdir = os.path.join(ROOT_DIR, "workday_hackathon")
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", 8))
+    bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+elif SERVE_APP == "news_agent":
+    wsgi_app = "app:app"
+    chdir = ROOT_DIR
+    worker_class = "uvicorn.workers.UvicornWorker"
+    bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+elif SERVE_APP == "service":
+    wsgi_app = "service:app"
+    chdir = ROOT_DIR
+    worker_class = "uvicorn.workers.UvicornWorker"
+    bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+else:
+    raise ValueError(f"Unknown SERVE_APP {SERVE_APP!r}, expected app2, news_agent or service")
+
+# Longer than the largest request deadline (deadlines.MAX_REQUEST_TIMEOUT, main2.BATCH_REQUEST_TIMEOUT)
+timeout = int(max(float(os.environ.get("MAX_REQUEST_TIMEOUT", 120)),
+                  float(os.environ.get("BATCH_REQUEST_TIMEOUT", 600)))) + 30
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+
+# Settings read by the app when it is preloaded below
+os.environ.setdefault("LLM_CACHE_DB", os.path.join(ROOT_DIR, "llm_cache.sqlite3"))
+os.environ.setdefault("GROQ_WORKERS", str(workers))
+_warm_up = os.environ.get("LLM_WARMUP", "true").lower() == "true"
+os.environ["LLM_WARMUP"] = "false"  # no warm-up thread in the master, see post_fork
+
+
+def post_fork(server, worker):
+    if not _warm_up:
+        return
+    if SERVE_APP == "app2":
+        import app2
+        app2.start_warm_up()
+    elif SERVE_APP == "news_agent":
+        import app
+        app.warm_up_news_agent()
+    elif SERVE_APP == "service":
+        import threading
+        import app
+        import main2
+        threading.Thread(target=main2.warm_up, name="llm-warmup", daemon=True).start()
+        app.warm_up_news_agent()
@@ -0,0 +1,132 @@
+import asyncio
+import collections
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from deadlines import remaining
+
+# --- Hedged requests for short LLM calls ---
+# A yes/no classification normally takes a few hundred ms, but the slowest few
+# percent take seconds and set our p99. With LLM_HEDGE=true, a classification
+# still running after the p95 of its recent latencies gets a duplicate call,
+# and whichever answer comes first is used. That costs ~5% extra calls (both
+# go through the rate-limit scheduler) and cuts the tail.
+# Hedging starts once HEDGE_MIN_SAMPLES latencies have been seen, and is skipped
+# when the request deadline wouldn't leave time for the duplicate.
+
+HEDGE_ENABLED = os.environ.get("LLM_HEDGE", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+
+class Hedger:
+    """Tracks one call site's recent latencies and hedges calls slower than the percentile."""
+
+    def __init__(self, name: str, window: int = 200):
+        self.name = name
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging, None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            values = sorted(self._latencies)
+        index = min(len(values) - 1, int(HEDGE_PERCENTILE / 100 * len(values)))
+        return max(HEDGE_MIN_DELAY, values[index])
+
+    def _hedge_delay(self):
+        if not HEDGE_ENABLED:
+            return None
+        delay = self.delay()
+        left = remaining()
+        if delay is None or (left is not None and left <= delay):
+            return None
+        return delay
+
+    def _timed(self, fn):
+        start = time.monotonic()
+        result = fn()
+        self.observe(time.monotonic() - start)
+        return result
+
+    def call(self, fn):
+        """fn(), with a duplicate fn() started if the first is slower than the hedge delay."""
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._timed(fn)
+        executor = _get_executor()
+        # Each attempt runs in its own copy of the caller's context (deadline, trace)
+        first = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = executor.submit(contextvars.copy_context().run, self._timed, fn)
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        metrics.hedges.inc(name=self.name, outcome="won" if winner is second else "lost")
+        if winner.exception() is not None and pending:
+            # The other attempt may still succeed
+            return pending.pop().result()
+        # The slower attempt can't be interrupted, it finishes in the background
+        return winner.result()
+
+    async def acall(self, coro_fn):
+        """Async version of call, coro_fn() returns an awaitable. The slower attempt is cancelled."""
+        delay = self._hedge_delay()
+        if delay is None:
+            start = time.monotonic()
+            result = await coro_fn()
+            self.observe(time.monotonic() - start)
+            return result
+
+        async def timed():
+            start = time.monotonic()
+            result = await coro_fn()
+            self.observe(time.monotonic() - start)
+            return result
+
+        first = asyncio.ensure_future(timed())
+        done, _ = await asyncio.wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = asyncio.ensure_future(timed())
+        try:
+            done, pending = await asyncio.wait([first, second], return_when=asyncio.FIRST_COMPLETED)
+            winner = done.pop()
+            metrics.hedges.inc(name=self.name, outcome="won" if winner is second else "lost")
+            if winner.exception() is not None and pending:
+                return await pending.pop()
+            return winner.result()
+        finally:
+            for task in (first, second):
+                task.cancel()
+
+
+_executor = None
+_hedgers = {}
+_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+    return _executor
+
+def hedger_for(name: str) -> Hedger:
+    with _lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger(name)
+        return _hedgers[name]
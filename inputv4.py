@@ -4,6 +4,10 @@ import ast # For safely evaluating the string list from the LLM
 from langchain.prompts import PromptTemplate
 from langchain_core.tools import tool
 from langchain_core.output_parsers import StrOutputParser
+from fused_query import FUSED_TEMPLATE, parse_fused_response
+
+# "fused" classifies and splits in one LLM call, "two_step" uses is_simple + split_into_simple_queries
+PROCESS_QUERY_MODE = os.environ.get("PROCESS_QUERY_MODE", "fused")
 
 # --- API Key Setup (Runs only if needed, output hidden by getpass) ---
 if "GROQ_API_KEY" not in os.environ:
@@ -103,6 +107,28 @@ Simple Queries List:"""
         return [input_text] # Fallback to original query if error occurs
 
 
+def classify_and_split(input_text: str):
+    """
+    Classifies and splits the query in a single LLM call.
+    Returns None if the response could not be parsed, so the caller can fall back
+    to the two-step path. (Internal Logic, No Direct Output)
+    """
+    prompt = PromptTemplate(input_variables=["text"], template=FUSED_TEMPLATE)
+    chain = prompt | llm | string_parser
+    try:
+        parsed = parse_fused_response(chain.invoke({"text": input_text}))
+    except Exception as e:
+        print(f"Warning: Error during fused classify/split LLM call: {e}. Falling back to two-step.")
+        return None
+    if parsed is None:
+        print("Warning: Could not parse fused classify/split response. Falling back to two-step.")
+        return None
+    simple, queries = parsed
+    if simple:
+        return {"is_simple": True, "queries": [input_text]}
+    return {"is_simple": False, "queries": queries}
+
+
 # --- Tool Definition (Internal Logic, No Direct Output) ---
 @tool
 def process_query(input_text: str) -> dict:
@@ -111,6 +137,12 @@ def process_query(input_text: str) -> dict:
       # Handle empty input - return value will be handled by summary logic
       return {"is_simple": True, "queries": []} # Treat empty as simple
 
+    if PROCESS_QUERY_MODE == "fused":
+        result = classify_and_split(input_text)
+        if result is not None:
+            return result
+        # Otherwise fall through to the two-step path below
+
     if is_simple(input_text):
         # Classified as simple
         return {"is_simple": True, "queries": [input_text]} # Return original query even if simple
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# --- Response cache for deterministic (temperature=0) LLM calls ---
+# Tier 1: in-process LRU with TTL and a size limit (entries and bytes)
+# Tier 2: optional SQLite file so cached answers survive restarts and are
+#         shared by every worker process (WAL mode, one connection per thread)
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different resubmits share a key."""
+    return " ".join(text.split())
+
+def make_key(operation: str, text: str, prompt_version: str, model: str) -> str:
+    """Cache key from operation + normalized text + prompt version + model name."""
+    raw = json.dumps([operation, prompt_version, model, normalize_text(text)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and size-based eviction."""
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value, size = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self._bytes -= size
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (expires_at, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+class SQLiteStore:
+    """On-disk key/value store with TTL, one connection per thread."""
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn().commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection must not be used across fork, forked workers open their own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn().commit()
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        conn.commit()
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite store, with hit/miss counters."""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except sqlite3.Error as e:
+                print(f"Warning: cache disk read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self._disk_set(key, value)
+
+    def _disk_set(self, key, value):
+        try:
+            self.disk.set(key, value)
+        except sqlite3.Error as e:
+            print(f"Warning: cache disk write failed: {e}")
+
+    # Async versions for the event loop (service.py): the memory tier is used
+    # inline, SQLite can wait seconds on its lock so it runs in a thread
+    async def aget(self, key):
+        if self.disk is None:
+            return self.get(key)
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size_bytes,
+            "evictions": self.memory.evictions,
+            "disk_enabled": self.disk is not None,
+        }
+
+
+def cache_from_env() -> TieredCache:
+    """
+    Build a TieredCache from environment variables:
+      LLM_CACHE_TTL          seconds an entry stays valid (default 3600)
+      LLM_CACHE_MAX_ENTRIES  in-memory entry limit (default 1024)
+      LLM_CACHE_MAX_BYTES    in-memory size limit (default 16MB)
+      LLM_CACHE_DB           SQLite file path, disk tier is off when unset
+    """
+    ttl = float(os.environ.get("LLM_CACHE_TTL", 3600))
+    memory = LRUCache(
+        max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 1024)),
+        max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+        ttl=ttl,
+    )
+    disk = None
+    db_path = os.environ.get("LLM_CACHE_DB")
+    if db_path:
+        try:
+            disk = SQLiteStore(db_path, ttl=ttl)
+        except sqlite3.Error as e:
+            print(f"Warning: could not open cache database {db_path}: {e}. Using memory cache only.")
+    return TieredCache(memory, disk)
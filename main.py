@@ -3,10 +3,20 @@ import os
 import ast # For safely evaluating the string list from the LLM
 from langchain.prompts import PromptTemplate
 from langchain_core.tools import tool
-from langchain_core.output_parsers import StrOutputParser
+from fused_query import FUSED_TEMPLATE, parse_fused_response
+from query_classifier import classifier_from_env
+from semantic_cache import remember_split, reuse_split, semantic_cache_from_env
+from chain_registry import get_chain, get_client, register_chain
+from model_router import model_for
+from hedging import hedger_for
+from metrics import stage
+
+# "fused" classifies and splits in one LLM call, "two_step" uses is_simple + split_into_simple_queries
+PROCESS_QUERY_MODE = os.environ.get("PROCESS_QUERY_MODE", "fused")
 
 # --- API Key Setup (Runs only if needed, output hidden by getpass) ---
-if "GROQ_API_KEY" not in os.environ:
+# Not needed for the offline fake/replay backends (LLM_BACKEND, see fake_llm.py)
+if "GROQ_API_KEY" not in os.environ and os.environ.get("LLM_BACKEND", "groq") in ("groq", "record"):
     try:
         print("Groq API key not found in environment variables.")
         os.environ["GROQ_API_KEY"] = getpass.getpass("Enter your Groq API key: ")
@@ -17,14 +27,8 @@ if "GROQ_API_KEY" not in os.environ:
 
 # --- LLM Initialization ---
 try:
-    from langchain_groq import ChatGroq
-    llm = ChatGroq(
-        model="llama-3.1-8b-instant",
-        temperature=0,
-        # max_tokens=1024, # Optional: set a reasonable limit
-        timeout=None,
-        max_retries=2,
-    )
+    # Shared pooled client for the small model tier (see chain_registry.py, model_router.py)
+    llm = get_client(model_for("classify"))
 except ImportError:
     print("Error: langchain-groq is not installed.")
     print("Please install it: pip install langchain-groq")
@@ -36,22 +40,53 @@ except Exception as e:
 
 # --- Helper Functions (Internal Logic, No Direct Output) ---
 
-string_parser = StrOutputParser()
-
-def is_simple(input_text: str) -> bool:
-    """Determines if the input text represents a simple query using an LLM."""
-    prompt = PromptTemplate(
-        input_variables=["text"],
-        template="""Given the input query: "{text}"
+# Prompts are compiled into chains once by the registry and reused on every call
+IS_SIMPLE_PROMPT = PromptTemplate(
+    input_variables=["text"],
+    template="""Given the input query: "{text}"
 Determine if this query is conceptually simple (asking about one specific thing) or complex (asking multiple things, comparing, or requiring breakdown).
 Reply ONLY with the word 'yes' if it is simple, or 'no' if it is complex.
 
 Query: {text}
 Is it simple (yes/no)?"""
-    )
-    chain = prompt | llm | string_parser
+)
+
+SPLIT_PROMPT = PromptTemplate(
+    input_variables=["complex_query"],
+    template="""Given the following complex query: "{complex_query}"
+Break it down into a list of simple, self-contained search engine queries. Each query should focus on a single aspect.
+Format your response ONLY as a Python-style list of strings. Example: ["query 1", "query 2", "query 3"]
+
+Complex Query: {complex_query}
+Simple Queries List:"""
+)
+
+FUSED_PROMPT = PromptTemplate(input_variables=["text"], template=FUSED_TEMPLATE)
+
+register_chain("main.is_simple", IS_SIMPLE_PROMPT, route="classify")
+register_chain("main.split", SPLIT_PROMPT, route="split")
+register_chain("main.fused", FUSED_PROMPT, route="fused")
+
+# Local fast path, answers confidently-classified queries without an LLM call
+simple_classifier = classifier_from_env("simple")
+
+# Decisions of earlier queries, reused for paraphrases of them (see semantic_cache.py)
+decision_cache = semantic_cache_from_env("main.process_query")
+
+def is_simple(input_text: str) -> bool:
+    """Determines if the input text represents a simple query, locally if confident, else using an LLM."""
+    local = simple_classifier.classify(input_text)
+    if local is not None:
+        return local
+    return llm_is_simple(input_text)
+
+def llm_is_simple(input_text: str) -> bool:
+    """Determines if the input text represents a simple query using an LLM."""
+    chain = get_chain("main.is_simple")
     try:
-        response = chain.invoke({"text": input_text}).strip().lower()
+        with stage("classification"):
+            response = hedger_for("main.is_simple").call(lambda: chain.invoke({"text": input_text}))
+        response = response.strip().lower()
         # Internal logic check, no print here for final output
         return response == "yes"
     except Exception as e:
@@ -63,18 +98,10 @@ def split_into_simple_queries(input_text: str) -> list[str]:
     Splits a complex query into multiple simpler queries using an LLM.
     (Internal Logic, No Direct Output)
     """
-    prompt = PromptTemplate(
-        input_variables=["complex_query"],
-        template="""Given the following complex query: "{complex_query}"
-Break it down into a list of simple, self-contained search engine queries. Each query should focus on a single aspect.
-Format your response ONLY as a Python-style list of strings. Example: ["query 1", "query 2", "query 3"]
-
-Complex Query: {complex_query}
-Simple Queries List:"""
-    )
-    chain = prompt | llm | string_parser
+    chain = get_chain("main.split", input_text)
     try:
-        response_str = chain.invoke({"complex_query": input_text}).strip()
+        with stage("split"):
+            response_str = chain.invoke({"complex_query": input_text}).strip()
         # Internal logic to parse, no print here for final output
         try:
              # Basic cleanup: remove potential markdown code fences
@@ -103,6 +130,28 @@ Simple Queries List:"""
         return [input_text] # Fallback to original query if error occurs
 
 
+def classify_and_split(input_text: str):
+    """
+    Classifies and splits the query in a single LLM call.
+    Returns None if the response could not be parsed, so the caller can fall back
+    to the two-step path. (Internal Logic, No Direct Output)
+    """
+    chain = get_chain("main.fused", input_text)
+    try:
+        with stage("classify_split"):
+            parsed = parse_fused_response(chain.invoke({"text": input_text}))
+    except Exception as e:
+        print(f"Warning: Error during fused classify/split LLM call: {e}. Falling back to two-step.")
+        return None
+    if parsed is None:
+        print("Warning: Could not parse fused classify/split response. Falling back to two-step.")
+        return None
+    simple, queries = parsed
+    if simple:
+        return {"is_simple": True, "queries": [input_text]}
+    return {"is_simple": False, "queries": queries}
+
+
 # --- Tool Definition (Internal Logic, No Direct Output) ---
 @tool
 def process_query(input_text: str) -> dict:
@@ -111,7 +160,30 @@ def process_query(input_text: str) -> dict:
       # Handle empty input - return value will be handled by summary logic
       return {"is_simple": True, "queries": []} # Treat empty as simple
 
-    if is_simple(input_text):
+    with stage("semantic_cache"):
+        cached = decision_cache.get(input_text)
+    if cached is not None:
+        return reuse_split(input_text, cached)
+    result = _process_query(input_text)
+    remember_split(decision_cache, input_text, result)
+    return result
+
+def _process_query(input_text: str) -> dict:
+    with stage("classification_local"):
+        local = simple_classifier.classify(input_text)
+    if local is True:
+        return {"is_simple": True, "queries": [input_text]}
+    if local is False:
+        # Already known to be complex, only the split needs the LLM
+        return {"is_simple": False, "queries": split_into_simple_queries(input_text)}
+
+    if PROCESS_QUERY_MODE == "fused":
+        result = classify_and_split(input_text)
+        if result is not None:
+            return result
+        # Otherwise fall through to the two-step path below
+
+    if llm_is_simple(input_text):
         # Classified as simple
         return {"is_simple": True, "queries": [input_text]} # Return original query even if simple
     else:
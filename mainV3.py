@@ -1,48 +1,92 @@
-import os
-import getpass
 from langchain_community.tools import DuckDuckGoSearchRun
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
+from langchain.prompts import PromptTemplate, ChatPromptTemplate
 from langchain_core.tools import tool
-from langchain.chat_models import init_chat_model
 from langchain.agents import initialize_agent, Tool, AgentType
-from langchain.agents import AgentExecutor
-from langchain_groq import ChatGroq
 from dotenv import load_dotenv
-from langchain_core.runnables import RunnableSequence
+from query_classifier import classifier_from_env
+from semantic_cache import semantic_cache_from_env
+from search_fanout import fan_out_search, afan_out_search, merge_results
+from search_cache import search_cache_from_env
+from map_reduce import map_reduce_summarize, amap_reduce_summarize
+from chain_registry import get_chain, get_client, register_chain
+from model_router import model_for
+from hedging import hedger_for
+from metrics import stage
 
 load_dotenv()
 
-# Initialize LangChain LLM model
-llm = init_chat_model("llama3-8b-8192", model_provider="groq")
+# Initialize LangChain LLM model (shared pooled client, see chain_registry.py and model_router.py)
+llm = get_client(model_for("agent"))
 
 # DuckDuckGo Search initialization
 ddg = DuckDuckGoSearchRun()
 
+# Short-TTL cache of search results shared by every request (see search_cache.py)
+search_cache = search_cache_from_env()
+
+# Local fast path, answers confidently-classified queries without an LLM call
+searchable_classifier = classifier_from_env("searchable")
+
+# LLM searchable decisions, reused for paraphrases of earlier queries (see semantic_cache.py)
+searchable_cache = semantic_cache_from_env("mainV3.searchable")
+
+# Prompt used to decide if a query needs live search results
+SEARCHABLE_PROMPT = PromptTemplate(
+    input_variables=["text"],
+    template="""
+    Determine if the following input requires real-time information from a search engine:
+    
+    Examples:
+    - "What is the capital of France?" -> Not Searchable
+    - "Who is the current president of the United States?" -> Searchable
+    - "Explain quantum mechanics." -> Not Searchable
+    - "What happened yesterday in the stock market of the USA?" -> Searchable
+    - "Tell me about the history of the Roman Empire." -> Not Searchable
+    - "What are the latest updates on AI regulation?" -> Searchable
+    
+    Given the input: "{text}", reply with 'yes' if it requires a search engine or 'no' if it does not.
+    """
+)
+
+register_chain("mainV3.searchable", SEARCHABLE_PROMPT, route="classify")
+
 # Define the is_searchable function within LangChain structure
 def is_searchable(input_text: str) -> bool:
     """Determine whether the input requires a search engine."""
     print("Checking if the input requires a search engine...")
-    prompt = PromptTemplate(
-        input_variables=["text"],
-        template="""
-        Determine if the following input requires real-time information from a search engine:
-        
-        Examples:
-        - "What is the capital of France?" -> Not Searchable
-        - "Who is the current president of the United States?" -> Searchable
-        - "Explain quantum mechanics." -> Not Searchable
-        - "What happened yesterday in the stock market of the USA?" -> Searchable
-        - "Tell me about the history of the Roman Empire." -> Not Searchable
-        - "What are the latest updates on AI regulation?" -> Searchable
-        
-        Given the input: "{text}", reply with 'yes' if it requires a search engine or 'no' if it does not.
-        """
-    )  
-    chain = prompt | llm
-    response = chain.invoke({"text": input_text})
-    result = response.content.strip().lower()    
+    local = searchable_classifier.classify(input_text)
+    if local is not None:
+        print(f"Searchable result (local): {local}")
+        return local
+    cached = searchable_cache.get(input_text)
+    if cached is not None:
+        print(f"Searchable result (cached): {cached}")
+        return cached
+    chain = get_chain("mainV3.searchable")
+    with stage("classification"):
+        result = hedger_for("mainV3.searchable").call(lambda: chain.invoke({"text": input_text}))
+    result = result.strip().lower()
+    print(f"Searchable result: {result}")
+    searchable_cache.set(input_text, result == "yes")
+    return result == "yes"
+
+# Async version of is_searchable, awaits the LLM instead of blocking a thread
+async def ais_searchable(input_text: str) -> bool:
+    """Determine whether the input requires a search engine (async)."""
+    local = searchable_classifier.classify(input_text)
+    if local is not None:
+        print(f"Searchable result (local): {local}")
+        return local
+    cached = searchable_cache.get(input_text)
+    if cached is not None:
+        print(f"Searchable result (cached): {cached}")
+        return cached
+    chain = get_chain("mainV3.searchable")
+    with stage("classification"):
+        result = await hedger_for("mainV3.searchable").acall(lambda: chain.ainvoke({"text": input_text}))
+    result = result.strip().lower()
     print(f"Searchable result: {result}")
+    searchable_cache.set(input_text, result == "yes")
     return result == "yes"
 
 # Define a LangChain tool for processing the query
@@ -54,43 +98,113 @@ def process_query(input_text: str):
     else:
         return {"requires_search": False, "query": [input_text]}
 
+# Async version of process_query for the async agent
+async def aprocess_query(input_text: str):
+    """Determines if a query requires a search engine and processes accordingly (async)."""
+    if await ais_searchable(input_text):
+        return {"requires_search": True, "query": [input_text]}
+    else:
+        return {"requires_search": False, "query": [input_text]}
+
+
+
+# Summary prompt, compiled once. Long inputs are routed to the larger model
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful news summariser. Summarize the user text in a concise manner."),
+    ("human", "{text}"),
+])
+
+register_chain("mainV3.summarize", SUMMARY_PROMPT, route="summarize")
+
+def summarize_once(text: str) -> str:
+    return get_chain("mainV3.summarize", text).invoke({"text": text})
 
+async def asummarize_once(text: str) -> str:
+    return await get_chain("mainV3.summarize", text).ainvoke({"text": text})
 
 # Define the summarize tool that uses ChatGroq to summarize text
+# Long inputs are summarized in parallel chunks and reduced (see map_reduce.py)
 @tool
 def summarize(text: str) -> str:
     """Summarize the given text using Groq-powered LLM."""
-    if "GROQ_API_KEY" not in os.environ:
-        os.environ["GROQ_API_KEY"] = getpass.getpass("Enter your Groq API key: ")
+    with stage("summarize"):
+        return map_reduce_summarize(text, summarize_once)
 
-    GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+# Async version of summarize for the async agent
+async def asummarize(text: str) -> str:
+    """Summarize the given text using Groq-powered LLM (async)."""
+    with stage("summarize"):
+        return await amap_reduce_summarize(text, asummarize_once)
 
-    llm = ChatGroq(
-        model="llama-3.1-8b-instant",
-        temperature=0,
-        max_tokens=None,
-        timeout=None,
-        max_retries=2,
-    )
+# DuckDuckGo search through the result cache
+def search(query: str) -> str:
+    """Search DuckDuckGo for the given query."""
+    return search_cache.get(query, ddg.run)
+
+# Async DuckDuckGo search, the request runs without holding a thread
+async def asearch(query: str) -> str:
+    """Search DuckDuckGo for the given query (async)."""
+    return await search_cache.aget(query, ddg.ainvoke)
+
+# Split a query into its parts (main.py process_query), loaded on first use
+def split_parts(input_text: str) -> list[str]:
+    from main import process_query as split_process_query
+    return split_process_query.invoke({"input_text": input_text})["queries"]
+
+async def asplit_parts(input_text: str) -> list[str]:
+    from main import process_query as split_process_query
+    return (await split_process_query.ainvoke({"input_text": input_text}))["queries"]
+
+# Search every sub-query at once and merge the results
+# A 5-part comparison costs one search latency instead of five
+def search_all(queries: list[str]) -> str:
+    with stage("search"):
+        return merge_results(fan_out_search(queries, search))
 
-    # Example long text to summarize
-    messages = [
-        ("system", "You are a helpful news summariser. Summarize the user text in a concise manner."),
-        ("human", text),
-    ]
-    ai_msg = llm.invoke(messages)
-    return ai_msg.content
+async def asearch_all(queries: list[str]) -> str:
+    with stage("search"):
+        return merge_results(await afan_out_search(queries, asearch))
+
+# Split, search all parts concurrently, then summarize the merged results
+def research(input_text: str) -> str:
+    """Answer a multi-part question by searching all of its parts at once."""
+    merged = search_all(split_parts(input_text))
+    if not merged:
+        return "No search results."
+    return summarize.invoke(merged)
+
+async def aresearch(input_text: str) -> str:
+    """Answer a multi-part question by searching all of its parts at once (async)."""
+    merged = await asearch_all(await asplit_parts(input_text))
+    if not merged:
+        return "No search results."
+    return await asummarize(merged)
 
 # Define the tools that the agent can use
+# Each tool has a sync func for run_agent and a coroutine for arun_agent
 tools = [
     Tool(
         name="Process Query",
         func=process_query,
+        coroutine=aprocess_query,
         description="Determine if the input requires a search engine and process it."
     ),
+    Tool(
+        name="Search",
+        func=search,
+        coroutine=asearch,
+        description="Search the web with DuckDuckGo for real-time information."
+    ),
+    Tool(
+        name="Research",
+        func=research,
+        coroutine=aresearch,
+        description="Split a multi-part question, search all parts at once and summarize the results."
+    ),
     Tool(
         name="Summarize",
         func=summarize,
+        coroutine=asummarize,
         description="Summarize the final result using Groq-powered LLM."
     )
 ]
@@ -105,9 +219,49 @@ agent = initialize_agent(
 
 # Function to run the agent
 def run_agent(user_input):
-    result = agent.run(user_input)
+    with stage("agent"):
+        result = agent.run(user_input)
     return result
 
+# Async function to run the agent, used by the FastAPI endpoint
+# Every LLM and search call is awaited so many requests can share one event loop
+async def arun_agent(user_input):
+    with stage("agent"):
+        result = await agent.ainvoke({"input": user_input})
+    return result["output"]
+
+# --- Pipeline mode ---
+# Fixed classify -> optional search -> summarize, with no ReAct loop deciding
+# which tool to call. Costs at most two LLM calls (none for classification
+# when the local classifier is confident) against four or more for the agent.
+ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "You are a helpful news assistant. Answer the user's question concisely."),
+    ("human", "{text}"),
+])
+
+register_chain("mainV3.answer", ANSWER_PROMPT, route="agent")
+
+def _pipeline_summary_input(user_input: str, results: str) -> str:
+    return f"Question: {user_input}\n\nSearch results:\n{results}"
+
+def run_pipeline(user_input):
+    """Answer with the fixed pipeline instead of the agent."""
+    with stage("pipeline"):
+        if not is_searchable(user_input):
+            with stage("answer"):
+                return get_chain("mainV3.answer").invoke({"text": user_input})
+        results = search_all([user_input])
+        return summarize.invoke(_pipeline_summary_input(user_input, results))
+
+async def arun_pipeline(user_input):
+    """Async version of run_pipeline, used by the FastAPI endpoint."""
+    with stage("pipeline"):
+        if not await ais_searchable(user_input):
+            with stage("answer"):
+                return await get_chain("mainV3.answer").ainvoke({"text": user_input})
+        results = await asearch_all([user_input])
+        return await asummarize(_pipeline_summary_input(user_input, results))
+
 # Main function to demonstrate the agent
 if __name__ == "__main__":
     user_input = "What is the capital of Ireland?"
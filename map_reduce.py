@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Chunked map-reduce summarization ---
+# Inputs above SUMMARIZE_THRESHOLD_TOKENS are split on paragraph, line and
+# sentence boundaries into chunks of at most SUMMARIZE_CHUNK_TOKENS, every
+# chunk is summarized concurrently, and the joined summaries are reduced the
+# same way until they fit in one call. Each level runs in parallel, so latency
+# grows with the number of levels (log of the input size), not the input size.
+
+CHUNK_TOKENS = int(os.environ.get("SUMMARIZE_CHUNK_TOKENS", 1500))
+THRESHOLD_TOKENS = int(os.environ.get("SUMMARIZE_THRESHOLD_TOKENS", 3000))
+MAX_CONCURRENCY = int(os.environ.get("SUMMARIZE_MAX_CONCURRENCY", 8))
+# Reduce levels before the last level's output is summarized as is
+MAX_LEVELS = 4
+
+# Split points from coarsest to finest
+_SEPARATORS = [re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+")]
+
+def estimate_tokens(text: str) -> int:
+    """About 4 characters per token for English text."""
+    return len(text) // 4 + 1
+
+def split_chunks(text: str, max_tokens: int = CHUNK_TOKENS) -> list[str]:
+    """Greedily pack the text into chunks under max_tokens, splitting at the coarsest boundary that fits."""
+    return _pack(text, max_tokens, 0)
+
+def _pack(text, max_tokens, level):
+    if estimate_tokens(text) <= max_tokens:
+        return [text] if text.strip() else []
+    if level >= len(_SEPARATORS):
+        size = max_tokens * 4
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    pieces = [p for p in _SEPARATORS[level].split(text) if p.strip()]
+    joiner = "\n\n" if level == 0 else "\n" if level == 1 else " "
+    chunks, current = [], ""
+    for piece in pieces:
+        if estimate_tokens(piece) > max_tokens:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(_pack(piece, max_tokens, level + 1))
+        elif current and estimate_tokens(current + joiner + piece) > max_tokens:
+            chunks.append(current)
+            current = piece
+        else:
+            current = current + joiner + piece if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="summarize")
+    return _executor
+
+def map_reduce_summarize(text: str, summarize_fn, chunk_tokens: int = CHUNK_TOKENS,
+                         threshold_tokens: int = THRESHOLD_TOKENS) -> str:
+    """summarize_fn(text) directly for short text, chunked map-reduce above threshold_tokens."""
+    for _ in range(MAX_LEVELS):
+        if estimate_tokens(text) <= threshold_tokens:
+            break
+        chunks = split_chunks(text, chunk_tokens)
+        print(f"Summarizing {len(chunks)} chunks in parallel...")
+        # Each chunk runs in a copy of the caller's context, so it keeps the request deadline
+        futures = [_get_executor().submit(contextvars.copy_context().run, summarize_fn, c) for c in chunks]
+        text = "\n\n".join(f.result() for f in futures)
+    return summarize_fn(text)
+
+async def amap_reduce_summarize(text: str, asummarize_fn, chunk_tokens: int = CHUNK_TOKENS,
+                                threshold_tokens: int = THRESHOLD_TOKENS,
+                                max_concurrency: int = MAX_CONCURRENCY) -> str:
+    """Async version of map_reduce_summarize, asummarize_fn(text) returns an awaitable."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def one(chunk):
+        async with semaphore:
+            return await asummarize_fn(chunk)
+
+    for _ in range(MAX_LEVELS):
+        if estimate_tokens(text) <= threshold_tokens:
+            break
+        chunks = split_chunks(text, chunk_tokens)
+        print(f"Summarizing {len(chunks)} chunks in parallel...")
+        text = "\n\n".join(await asyncio.gather(*(one(c) for c in chunks)))
+    return await asummarize_fn(text)
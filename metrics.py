@@ -0,0 +1,289 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Latency tracing and Prometheus metrics ---
+# stage("classification") times one step of a request. Each span is added to a
+# latency histogram and, while a request trace is active, to that trace (sent
+# back as a Server-Timing header). LLM calls are measured by a LangChain
+# callback attached to every client in chain_registry. render() produces the
+# Prometheus text format for the /metrics endpoints.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _label_text(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+_registry = []
+
+def counter(name, documentation, labelnames=()):
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+def gauge(name, documentation, labelnames=()):
+    metric = Gauge(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Metric definitions ---
+http_request_duration = histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ("app", "route", "method", "status"))
+stage_duration = histogram(
+    "stage_duration_seconds", "Latency of one pipeline stage.", ("stage",))
+stage_errors = counter(
+    "stage_errors_total", "Pipeline stages that raised.", ("stage",))
+llm_call_duration = histogram(
+    "llm_call_duration_seconds", "Latency of one LLM call, including client retries.", ("model", "chain"))
+llm_calls = counter(
+    "llm_calls_total", "LLM calls by outcome.", ("model", "chain", "outcome"))
+llm_prompt_tokens = histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call.", ("model", "chain"), TOKEN_BUCKETS)
+llm_completion_tokens = histogram(
+    "llm_completion_tokens", "Completion tokens per LLM call.", ("model", "chain"), TOKEN_BUCKETS)
+llm_retries = counter(
+    "llm_retries_total", "Groq requests retried by the scheduler.", ())
+route_call_duration = histogram(
+    "llm_route_call_duration_seconds", "Latency of one LLM call by model route.", ("route", "model"))
+route_cost = counter(
+    "llm_route_cost_usd_total", "Estimated LLM spend by model route.", ("route", "model"))
+deadline_exceeded = counter(
+    "deadline_exceeded_total", "Work abandoned because the request deadline passed.", ("where",))
+hedges = counter(
+    "llm_hedges_total", "Duplicate calls fired after the hedge delay, and how many of them won.", ("name", "outcome"))
+scheduler_wait = histogram(
+    "scheduler_wait_seconds", "Time a Groq request waited in the scheduler.", ("model",))
+scheduler_throttled = counter(
+    "scheduler_throttled_total", "Groq responses that made the scheduler back off.", ("model", "reason"))
+scheduler_concurrency_limit = gauge(
+    "scheduler_concurrency_limit", "Current adaptive concurrency limit.", ("model",))
+scheduler_in_flight = gauge(
+    "scheduler_in_flight", "Groq requests currently in flight.", ("model",))
+admission_wait = histogram(
+    "admission_wait_seconds", "Time a request waited in its admission lane.", ("lane",))
+admission_rejected = counter(
+    "admission_rejected_total", "Requests turned away by admission control.", ("lane", "reason"))
+admission_queued = gauge(
+    "admission_queued", "Requests waiting in each admission lane.", ("lane",))
+admission_in_flight = gauge(
+    "admission_in_flight", "Requests being served per admission lane.", ("lane",))
+requests_cancelled = counter(
+    "requests_cancelled_total", "Requests cancelled before finishing.", ("route", "reason"))
+cancelled_work_seconds = counter(
+    "cancelled_work_seconds_total", "Time already spent on requests when they were cancelled.", ("route",))
+llm_calls_cancelled = counter(
+    "llm_calls_cancelled_total", "LLM calls stopped by cancellation, before starting or mid-stream.", ("where",))
+
+
+# --- Request traces and stage spans ---
+_trace = contextvars.ContextVar("trace", default=None)
+
+def start_trace():
+    """Begin collecting spans for the current request. Returns the span list."""
+    spans = []
+    _trace.set(spans)
+    return spans
+
+def current_trace():
+    return _trace.get()
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage into stage_duration_seconds and the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage=name)
+        spans = _trace.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+def server_timing(spans) -> str:
+    """Server-Timing header value for a list of (stage, seconds) spans."""
+    totals = {}
+    for name, elapsed in spans:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in totals.items())
+
+
+# --- LLM call instrumentation ---
+_llm_handler = None
+
+def llm_callback_handler():
+    """
+    Shared LangChain callback handler recording LLM call latency, token counts and
+    failures. Chains pass their registry name in metadata["chain"] and their
+    model route in metadata["route"] (see model_router.py).
+    """
+    global _llm_handler
+    if _llm_handler is not None:
+        return _llm_handler
+
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetricsHandler(BaseCallbackHandler):
+        def __init__(self):
+            self._runs = {}
+
+        def _start(self, run_id, serialized, metadata):
+            kwargs = (serialized or {}).get("kwargs", {})
+            model = kwargs.get("model_name") or kwargs.get("model") or (metadata or {}).get("ls_model_name", "")
+            chain = (metadata or {}).get("chain", "")
+            route = (metadata or {}).get("route", "")
+            self._runs[run_id] = (time.perf_counter(), model, chain, route)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            self._start(run_id, serialized, metadata)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+            self._start(run_id, serialized, metadata)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            started = self._runs.pop(run_id, None)
+            if started is None:
+                return
+            start, model, chain, route = started
+            elapsed = time.perf_counter() - start
+            llm_call_duration.observe(elapsed, model=model, chain=chain)
+            llm_calls.inc(model=model, chain=chain, outcome="ok")
+            prompt_tokens, completion_tokens = _token_usage(response)
+            if prompt_tokens is not None:
+                llm_prompt_tokens.observe(prompt_tokens, model=model, chain=chain)
+            if completion_tokens is not None:
+                llm_completion_tokens.observe(completion_tokens, model=model, chain=chain)
+            if route:
+                import model_router
+                model_router.record(route, model, elapsed, prompt_tokens, completion_tokens)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            started = self._runs.pop(run_id, None)
+            if started is None:
+                return
+            start, model, chain, _ = started
+            llm_call_duration.observe(time.perf_counter() - start, model=model, chain=chain)
+            llm_calls.inc(model=model, chain=chain, outcome="error")
+
+    _llm_handler = LLMMetricsHandler()
+    return _llm_handler
+
+def _token_usage(response):
+    """(prompt, completion) token counts from an LLMResult, None where unknown."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            meta = getattr(message, "usage_metadata", None)
+            if meta:
+                return meta.get("input_tokens"), meta.get("output_tokens")
+    return None, None
@@ -0,0 +1,110 @@
+import os
+import threading
+
+import metrics
+from query_classifier import WORD_RE, CONJUNCTIONS, COMPARISON_WORDS
+
+# --- Complexity-based model routing ---
+# Every chain is registered with a route (chain_registry.register_chain) instead
+# of a model. A route names a kind of call and maps to a model tier:
+# yes/no classification and simple queries go to the small, fast model, and
+# only complex splits and long summaries go to the large one.
+# This is the only place that names models. Per-route latency, token and cost
+# totals are recorded from the LLM callback in metrics.py.
+
+MODEL_TIERS = {
+    "small": os.environ.get("MODEL_SMALL", "llama-3.1-8b-instant"),
+    "large": os.environ.get("MODEL_LARGE", "llama-3.3-70b-versatile"),
+}
+
+# route -> (tier for ordinary input, tier for complex input)
+ROUTES = {
+    "classify": ("small", "small"),
+    "split": ("small", "large"),
+    "fused": ("small", "large"),
+    "summarize": ("small", "large"),
+    "agent": ("small", "small"),
+    "edit": ("small", "small"),
+    "suggestions": ("small", "small"),
+}
+
+# MODEL_ROUTES="summarize=small:small,edit=small:large" overrides single routes
+for _override in filter(None, os.environ.get("MODEL_ROUTES", "").split(",")):
+    _route, _, _tiers = _override.partition("=")
+    _normal, _, _complex = _tiers.partition(":")
+    ROUTES[_route.strip()] = (_normal.strip(), (_complex or _normal).strip())
+
+# A query is complex with this many parts (conjunctions, commas, extra
+# questions, comparisons) or this many words
+COMPLEX_QUERY_PARTS = int(os.environ.get("ROUTER_COMPLEX_PARTS", 3))
+COMPLEX_QUERY_WORDS = int(os.environ.get("ROUTER_COMPLEX_WORDS", 30))
+# Text routes (summarize, edit, suggestions) escalate above this many characters
+LONG_TEXT_CHARS = int(os.environ.get("ROUTER_LONG_TEXT_CHARS", 6000))
+
+# USD per million (input, output) tokens, Groq list prices
+MODEL_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama3-8b-8192": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama3-70b-8192": (0.59, 0.79),
+}
+
+QUERY_ROUTES = {"classify", "split", "fused"}
+
+
+def query_parts(text: str) -> int:
+    """Rough count of the separate things a query asks for, beyond the first."""
+    words = WORD_RE.findall(text.lower())
+    parts = sum(1 for w in words if w in CONJUNCTIONS)
+    parts += text.count(",") + max(0, text.count("?") - 1)
+    if set(words) & COMPARISON_WORDS:
+        parts += 1
+    return parts
+
+def is_complex(route: str, text: str) -> bool:
+    if route in QUERY_ROUTES:
+        return query_parts(text) >= COMPLEX_QUERY_PARTS or len(text.split()) >= COMPLEX_QUERY_WORDS
+    return len(text) > LONG_TEXT_CHARS
+
+def model_for(route: str, text: str = None) -> str:
+    """Model for a call on this route. Without text, the route's ordinary tier."""
+    normal, complex_ = ROUTES[route]
+    tier = complex_ if text is not None and normal != complex_ and is_complex(route, text) else normal
+    return MODEL_TIERS.get(tier, tier)  # a tier may also be a literal model name
+
+def cost_usd(model: str, prompt_tokens, completion_tokens) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1_000_000
+
+
+# --- Per-route accounting ---
+_totals = {}  # (route, model) -> [calls, seconds, prompt tokens, completion tokens, cost]
+_lock = threading.Lock()
+
+def record(route: str, model: str, seconds: float, prompt_tokens=None, completion_tokens=None):
+    """Called once per finished LLM call on a route."""
+    cost = cost_usd(model, prompt_tokens, completion_tokens)
+    metrics.route_call_duration.observe(seconds, route=route, model=model)
+    metrics.route_cost.inc(cost, route=route, model=model)
+    with _lock:
+        totals = _totals.setdefault((route, model), [0, 0.0, 0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += prompt_tokens or 0
+        totals[3] += completion_tokens or 0
+        totals[4] += cost
+
+def route_stats() -> list[dict]:
+    with _lock:
+        return [
+            {
+                "route": route,
+                "model": model,
+                "calls": calls,
+                "avg_latency": round(seconds / calls, 4),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost, 6),
+            }
+            for (route, model), (calls, seconds, prompt_tokens, completion_tokens, cost) in sorted(_totals.items())
+        ]
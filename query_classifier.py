@@ -0,0 +1,180 @@
+import json
+import math
+import os
+import re
+
+# --- Local fast-path query classifier ---
+# Cheap lexical rules plus a small logistic model answer confidently-classified
+# queries locally, so only ambiguous ones pay for an LLM round trip.
+#   task "simple":     is the query conceptually simple? (is_simple / check_if_simple)
+#   task "searchable": does the query need live search results? (is_searchable)
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+
+CONJUNCTIONS = {"and", "or", "plus", "also", "versus", "vs", "then", "while"}
+COMPARISON_WORDS = {"compare", "comparison", "comparing", "difference", "differences", "versus", "vs", "better", "pros", "cons"}
+QUESTION_WORDS = {"what", "who", "when", "where", "why", "how", "which"}
+LIST_WORDS = {"list", "each", "both", "all", "headlines"}
+TEMPORAL_WORDS = {
+    "latest", "current", "currently", "today", "todays", "today's", "yesterday", "tonight",
+    "recent", "recently", "breaking", "upcoming",
+}
+# Often about recent events, but not always: "last night" vs "the last Roman emperor",
+# "news this week" vs "how many days are in a week". Left to the model, not the rules.
+RECENCY_HINT_WORDS = {"now", "news", "week", "week's", "weekend", "last"}
+LIVE_DATA_WORDS = {"price", "prices", "score", "scores", "weather", "stock", "stocks", "market", "won", "election", "results"}
+TIMELESS_WORDS = {"history", "explain", "define", "definition", "meaning", "theory", "describe", "capital", "invented", "wrote"}
+
+FEATURES = [
+    "words", "conjunctions", "question_marks", "commas", "comparison", "question_words",
+    "list_words", "temporal", "live_data", "timeless", "year", "recency_hints",
+]
+
+def extract_features(text: str) -> list[float]:
+    """Lexical feature vector for a query, in FEATURES order."""
+    lowered = text.lower()
+    words = WORD_RE.findall(lowered)
+    word_set = set(words)
+    return [
+        min(len(words), 40) / 10.0,
+        float(sum(1 for w in words if w in CONJUNCTIONS)),
+        float(text.count("?")),
+        float(text.count(",")),
+        1.0 if word_set & COMPARISON_WORDS else 0.0,
+        float(sum(1 for w in words if w in QUESTION_WORDS)),
+        1.0 if word_set & LIST_WORDS else 0.0,
+        float(len(word_set & TEMPORAL_WORDS)),
+        1.0 if word_set & LIVE_DATA_WORDS else 0.0,
+        1.0 if word_set & TIMELESS_WORDS else 0.0,
+        1.0 if YEAR_RE.search(lowered) else 0.0,
+        float(len(word_set & RECENCY_HINT_WORDS)),
+    ]
+
+
+class LogisticModel:
+    """Tiny logistic regression over the lexical features."""
+
+    def __init__(self, weights, bias=0.0):
+        self.weights = list(weights)
+        self.bias = bias
+
+    def predict_proba(self, x) -> float:
+        z = self.bias + sum(w * v for w, v in zip(self.weights, x))
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+    @classmethod
+    def fit(cls, X, y, epochs=2000, lr=0.1, l2=0.01):
+        """Batch gradient descent, fine for a labelled set of a few dozen to a few thousand queries."""
+        weights = [0.0] * len(X[0])
+        bias = 0.0
+        n = len(X)
+        for _ in range(epochs):
+            grad_w = [0.0] * len(weights)
+            grad_b = 0.0
+            model = cls(weights, bias)
+            for x, target in zip(X, y):
+                error = model.predict_proba(x) - (1.0 if target else 0.0)
+                grad_b += error
+                for i, v in enumerate(x):
+                    grad_w[i] += error * v
+            weights = [w - lr * (g / n + l2 * w) for w, g in zip(weights, grad_w)]
+            bias -= lr * grad_b / n
+        return cls(weights, bias)
+
+    def to_dict(self) -> dict:
+        return {"features": FEATURES, "weights": self.weights, "bias": self.bias}
+
+
+# Trained on benchmarks/data/queries.json with benchmarks/eval_classifier.py --train
+DEFAULT_MODELS = {
+    "simple": {
+        "weights": [-0.6538, -3.3842, 1.0547, -0.6695, -0.6707, -0.5346, -0.7034, 0.3077, -0.2462, -0.1577, -0.0228, -0.3206],
+        "bias": 2.7065,
+    },
+    "searchable": {
+        "weights": [0.8233, -0.0378, -0.5212, 0.0716, -0.1476, -0.6859, -0.1656, 2.6133, 2.1253, -1.7604, 1.0154, 1.6545],
+        "bias": -0.9073,
+    },
+}
+
+WEIGHTS_PATH = os.environ.get(
+    "LOCAL_CLASSIFIER_WEIGHTS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "classifier_weights.json"),
+)
+
+def load_model(task: str) -> LogisticModel:
+    """Load trained weights from WEIGHTS_PATH if present, else the built-in defaults."""
+    params = DEFAULT_MODELS[task]
+    if os.path.exists(WEIGHTS_PATH):
+        try:
+            with open(WEIGHTS_PATH) as f:
+                saved = json.load(f).get(task)
+            if saved and saved.get("features") == FEATURES:
+                params = saved
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not load classifier weights from {WEIGHTS_PATH}: {e}")
+    return LogisticModel(params["weights"], params["bias"])
+
+
+def _simple_rules(f):
+    words, conjunctions, question_marks, commas, comparison = f[0] * 10, f[1], f[2], f[3], f[4]
+    if question_marks >= 2:
+        return False, 0.97
+    if comparison:
+        return False, 0.95
+    if words <= 6 and conjunctions == 0 and commas == 0:
+        return True, 0.95
+    return None
+
+def _searchable_rules(f):
+    temporal, live_data, timeless = f[7], f[8], f[9]
+    if temporal >= 1 and not timeless:
+        return True, 0.96
+    if timeless and not temporal and not live_data:
+        return False, 0.93
+    return None
+
+RULES = {"simple": _simple_rules, "searchable": _searchable_rules}
+
+
+class QueryClassifier:
+    """
+    classify(text) returns True/False when the local decision is at least
+    `threshold` confident, or None to tell the caller to ask the LLM.
+    """
+
+    def __init__(self, task: str, threshold: float = 0.9, model: LogisticModel = None):
+        self.task = task
+        self.threshold = threshold
+        self.model = model or load_model(task)
+        self.local_decisions = 0
+        self.escalations = 0
+
+    def predict(self, text: str):
+        """(label, confidence) from the rules if one fires, otherwise from the model."""
+        f = extract_features(text)
+        ruled = RULES[self.task](f)
+        if ruled is not None:
+            return ruled
+        p = self.model.predict_proba(f)
+        return p >= 0.5, max(p, 1.0 - p)
+
+    def classify(self, text: str):
+        label, confidence = self.predict(text)
+        if confidence >= self.threshold:
+            self.local_decisions += 1
+            return label
+        self.escalations += 1
+        return None
+
+    def stats(self) -> dict:
+        return {"local_decisions": self.local_decisions, "escalations": self.escalations, "threshold": self.threshold}
+
+
+def classifier_from_env(task: str) -> QueryClassifier:
+    """
+    LOCAL_CLASSIFIER_THRESHOLD sets the confidence needed to skip the LLM
+    (default 0.9). Any value above 1 turns the fast path off.
+    """
+    return QueryClassifier(task, threshold=float(os.environ.get("LOCAL_CLASSIFIER_THRESHOLD", 0.9)))
@@ -0,0 +1,474 @@
+import asyncio
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+
+import metrics
+from deadlines import DeadlineExceeded, call_timeout, remaining
+
+# --- Rate-limit-aware scheduler for Groq calls ---
+# Every Groq request from every chain goes through one Scheduler per model,
+# installed as the transport of the client's httpx connection pool (see
+# chain_registry.create_groq_client). So invoke, stream, batch, sync and async
+# calls, and the SDK's own retries, are all gated by the same:
+#   - token buckets for requests/minute and tokens/minute
+#   - adaptive concurrency limit: additive increase while latency is healthy,
+#     multiplicative decrease on 429s and latency spikes (AIMD)
+#   - a shared pause honouring retry-after, so one 429 holds back every caller
+#     instead of each retrying blindly
+# Retries (429, 5xx, connection errors) happen here rather than in the Groq SDK,
+# so they go back through the scheduler and stop when the request's deadline
+# (deadlines.py) can't cover another attempt. Each attempt's timeout is capped
+# at the remaining budget.
+
+# Groq limits are per account, each of GROQ_WORKERS server processes gets an equal share
+GROQ_WORKERS = max(1, int(os.environ.get("GROQ_WORKERS", 1)))
+GROQ_RPM = float(os.environ.get("GROQ_RPM", 30)) / GROQ_WORKERS
+GROQ_TPM = float(os.environ.get("GROQ_TPM", 6000)) / GROQ_WORKERS
+GROQ_INITIAL_CONCURRENCY = float(os.environ.get("GROQ_INITIAL_CONCURRENCY", 4))
+GROQ_MAX_CONCURRENCY = float(os.environ.get("GROQ_MAX_CONCURRENCY", 32))
+# A response slower than this multiple of the average latency counts as congestion
+LATENCY_TOLERANCE = float(os.environ.get("GROQ_LATENCY_TOLERANCE", 2.5))
+# Completion tokens assumed for a request that doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills at rate_per_minute up to one minute's worth. reserve() may go into debt."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take amount now and return how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+    def clamp(self, remaining: float):
+        """Lower the level to what the server says is left."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+
+
+class Scheduler:
+    def __init__(self, model: str, rpm=GROQ_RPM, tpm=GROQ_TPM,
+                 initial_concurrency=GROQ_INITIAL_CONCURRENCY, max_concurrency=GROQ_MAX_CONCURRENCY):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.baseline_latency = None
+        self.last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()  # threading.Event or (loop, asyncio.Future)
+        metrics.scheduler_concurrency_limit.set(self.limit, model=model)
+
+    # --- concurrency slots ---
+    def _try_take_slot(self) -> bool:
+        if self.in_flight < max(1, int(self.limit)):
+            self.in_flight += 1
+            metrics.scheduler_in_flight.set(self.in_flight, model=self.model)
+            return True
+        return False
+
+    def _wake_waiters(self):
+        # Called with the lock held: hand free slots to waiters in FIFO order
+        while self._waiters and self.in_flight < max(1, int(self.limit)):
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                self.in_flight += 1
+                waiter.set()
+            else:
+                loop, future = waiter
+                if future.done():
+                    continue
+                self.in_flight += 1
+                loop.call_soon_threadsafe(_resolve, future, self)
+        metrics.scheduler_in_flight.set(self.in_flight, model=self.model)
+
+    def _release_slot(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    # --- admission ---
+    def _admission_delay(self, estimated_tokens: float) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        delay = max(wait, self.paused_until - time.monotonic())
+        left = remaining()
+        if left is not None and delay >= left:
+            # Waiting would use up the whole budget, fail now and hand the quota back
+            self._refund(estimated_tokens)
+            metrics.deadline_exceeded.inc(where="scheduler")
+            raise DeadlineExceeded(f"rate limit wait of {delay:.1f}s exceeds the request deadline")
+        return delay
+
+    def _refund(self, estimated_tokens: float):
+        # For a request that reserved its quota but gave up before being sent
+        self.requests.refund(1)
+        self.tokens.refund(estimated_tokens)
+
+    def _give_up_waiting(self, estimated_tokens: float):
+        self._refund(estimated_tokens)
+        metrics.deadline_exceeded.inc(where="scheduler")
+        return DeadlineExceeded("request deadline exceeded while queued for a Groq slot")
+
+    def acquire(self, estimated_tokens: float):
+        start = time.monotonic()
+        delay = self._admission_delay(estimated_tokens)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            if self._try_take_slot():
+                event = None
+            else:
+                event = threading.Event()
+                self._waiters.append(event)
+        if event is not None:
+            left = remaining()
+            if not event.wait(timeout=None if left is None else max(left, 0)):
+                with self._lock:
+                    if event.is_set():
+                        # The slot arrived just as we gave up, pass it on
+                        self.in_flight -= 1
+                        self._wake_waiters()
+                    else:
+                        self._waiters.remove(event)
+                raise self._give_up_waiting(estimated_tokens)
+        self._after_pause_sync()
+        metrics.scheduler_wait.observe(time.monotonic() - start, model=self.model)
+        return time.monotonic()
+
+    async def aacquire(self, estimated_tokens: float):
+        start = time.monotonic()
+        delay = self._admission_delay(estimated_tokens)
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._refund(estimated_tokens)
+                raise
+        with self._lock:
+            if self._try_take_slot():
+                future = None
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+        if future is not None:
+            left = remaining()
+            try:
+                await asyncio.wait_for(future, None if left is None else max(left, 0))
+            except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+                with self._lock:
+                    # If the slot was already handed to us, give it back
+                    if future.done() and not future.cancelled():
+                        self.in_flight -= 1
+                        self._wake_waiters()
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._give_up_waiting(estimated_tokens) from None
+                self._refund(estimated_tokens)
+                raise
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        metrics.scheduler_wait.observe(time.monotonic() - start, model=self.model)
+        return time.monotonic()
+
+    def _after_pause_sync(self):
+        # A 429 may have arrived while this request was queued
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+
+    # --- feedback ---
+    def release(self, started: float, status: int, headers, estimated_tokens: float, actual_tokens=None):
+        latency = time.monotonic() - started
+        with self._lock:
+            if status == 429:
+                retry_after = _retry_after_seconds(headers)
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                self._decrease("rate_limited")
+            elif status < 400:
+                if self.baseline_latency is not None and latency > self.baseline_latency * LATENCY_TOLERANCE:
+                    self._decrease("latency")
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+                # Slow moving average so the baseline follows real load, not one outlier
+                if self.baseline_latency is None:
+                    self.baseline_latency = latency
+                else:
+                    self.baseline_latency += (latency - self.baseline_latency) * 0.1
+            metrics.scheduler_concurrency_limit.set(round(self.limit, 2), model=self.model)
+
+        if actual_tokens is not None and actual_tokens < estimated_tokens:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+        _sync_buckets_from_headers(self, headers)
+        self._release_slot()
+
+    def _decrease(self, reason):
+        # Called with the lock held. At most one decrease per observed latency
+        # window, so a burst of 429s from the same wave halves the limit once.
+        now = time.monotonic()
+        window = self.baseline_latency or 1.0
+        metrics.scheduler_throttled.inc(model=self.model, reason=reason)
+        if now - self.last_decrease < window:
+            return
+        self.last_decrease = now
+        self.limit = max(1.0, self.limit * 0.5 if reason == "rate_limited" else self.limit * 0.9)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "concurrency_limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "paused_for": round(max(0.0, self.paused_until - time.monotonic()), 2),
+            "baseline_latency": self.baseline_latency,
+        }
+
+
+def _resolve(future, scheduler):
+    if future.done():
+        # Waiter was cancelled after we counted a slot for it
+        scheduler._release_slot()
+    else:
+        future.set_result(None)
+
+def _retry_after_seconds(headers) -> float:
+    value = headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else 1.0
+    except ValueError:
+        return 1.0
+
+def _sync_buckets_from_headers(scheduler, headers):
+    """Groq reports what is left of the quota, trust it over our estimate."""
+    for header, bucket in (("x-ratelimit-remaining-requests", scheduler.requests),
+                           ("x-ratelimit-remaining-tokens", scheduler.tokens)):
+        value = headers.get(header)
+        if value is not None:
+            try:
+                bucket.clamp(float(value))
+            except ValueError:
+                pass
+
+def estimate_tokens(request: httpx.Request) -> float:
+    """Prompt tokens (about 4 characters each) plus the completion budget."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return DEFAULT_COMPLETION_TOKENS
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    return prompt_chars / 4 + (body.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+def _usage_tokens(response: httpx.Response):
+    if "application/json" not in response.headers.get("content-type", ""):
+        return None
+    try:
+        return response.json().get("usage", {}).get("total_tokens")
+    except ValueError:
+        return None
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Holds the scheduler slot until a (possibly streamed) response body is closed."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+def _apply_call_timeout(request):
+    """Cap this attempt's httpx timeouts at the remaining request budget."""
+    limit = call_timeout()
+    timeouts = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        key: limit if timeouts.get(key) is None else min(timeouts[key], limit)
+        for key in ("connect", "read", "write", "pool")
+    }
+
+def _backoff(attempt: int) -> float:
+    return min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.75, 1.0)
+
+def _should_retry(attempt: int, wait: float) -> bool:
+    """Retry while attempts are left and the deadline still covers the wait plus a bit of work."""
+    if attempt >= LLM_MAX_RETRIES:
+        return False
+    left = remaining()
+    return left is None or left > wait + 0.1
+
+
+class SchedulingTransport(httpx.BaseTransport):
+    def __init__(self, scheduler: Scheduler, transport=None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        estimated = estimate_tokens(request)
+        attempt = 0
+        while True:
+            _apply_call_timeout(request)
+            started = self.scheduler.acquire(estimated)
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                self.scheduler.release(started, 599, {}, estimated)
+                delay = _backoff(attempt)
+                if not _should_retry(attempt, delay):
+                    raise
+            except BaseException:
+                self.scheduler.release(started, 599, {}, estimated)
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                response.read()
+                self.scheduler.release(started, response.status_code, response.headers, estimated)
+                # After a 429 the scheduler itself holds the next attempt until retry-after
+                delay = 0.0 if response.status_code == 429 else _backoff(attempt)
+                wait = _retry_after_seconds(response.headers) if response.status_code == 429 else delay
+                if not _should_retry(attempt, wait):
+                    return response
+            metrics.llm_retries.inc()
+            time.sleep(delay)
+            attempt += 1
+
+        if "text/event-stream" in response.headers.get("content-type", ""):
+            on_close = lambda: self.scheduler.release(started, response.status_code, response.headers, estimated)
+            response.stream = _ReleasingStream(response.stream, on_close)
+            return response
+        response.read()
+        self.scheduler.release(started, response.status_code, response.headers, estimated, _usage_tokens(response))
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncSchedulingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, scheduler: Scheduler, transport=None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        estimated = estimate_tokens(request)
+        attempt = 0
+        while True:
+            _apply_call_timeout(request)
+            started = await self.scheduler.aacquire(estimated)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                self.scheduler.release(started, 599, {}, estimated)
+                delay = _backoff(attempt)
+                if not _should_retry(attempt, delay):
+                    raise
+            except BaseException:
+                self.scheduler.release(started, 599, {}, estimated)
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                await response.aread()
+                self.scheduler.release(started, response.status_code, response.headers, estimated)
+                delay = 0.0 if response.status_code == 429 else _backoff(attempt)
+                wait = _retry_after_seconds(response.headers) if response.status_code == 429 else delay
+                if not _should_retry(attempt, wait):
+                    return response
+            metrics.llm_retries.inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if "text/event-stream" in response.headers.get("content-type", ""):
+            on_close = lambda: self.scheduler.release(started, response.status_code, response.headers, estimated)
+            response.stream = _AsyncReleasingStream(response.stream, on_close)
+            return response
+        await response.aread()
+        self.scheduler.release(started, response.status_code, response.headers, estimated, _usage_tokens(response))
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def scheduler_for(model: str) -> Scheduler:
+    """One scheduler per model, Groq's limits are per model."""
+    with _schedulers_lock:
+        if model not in _schedulers:
+            _schedulers[model] = Scheduler(model)
+        return _schedulers[model]
+
+def scheduled_http_clients(model: str):
+    """(httpx.Client, httpx.AsyncClient) whose requests go through the model's scheduler."""
+    scheduler = scheduler_for(model)
+    return (
+        httpx.Client(transport=SchedulingTransport(scheduler)),
+        httpx.AsyncClient(transport=AsyncSchedulingTransport(scheduler)),
+    )
+
+def scheduler_stats() -> list:
+    with _schedulers_lock:
+        return [s.stats() for s in _schedulers.values()]
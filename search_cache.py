@@ -0,0 +1,194 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from search_fanout import query_words
+from single_flight import SingleFlight
+
+# --- TTL cache for web search results ---
+# News queries from different users overlap heavily within minutes, and a
+# DuckDuckGo search is the slowest hop after the LLM. Results are cached under
+# a normalized query (case, whitespace, punctuation and stopwords ignored) for
+# a short TTL. Word order is kept: "Iran attack Israel" is another search than
+# "Israel attack Iran".
+# After the TTL an entry is stale but still served for SEARCH_CACHE_STALE
+# seconds while one background refresh replaces it, so hot queries never wait
+# on a search. Only misses block, and concurrent misses share one search.
+
+def normalize_query(query: str) -> str:
+    return " ".join(query_words(query))
+
+
+class SearchCache:
+    """LRU of query -> (fetched_at, result) with fresh and stale windows."""
+
+    def __init__(self, ttl=300, stale_ttl=1800, max_entries=512):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._executor = None
+        self._tasks = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    # --- storage ---
+    def _lookup(self, key):
+        """(result, is_fresh), or None when missing or past the stale window."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            fetched_at, result = entry
+            age = time.time() - fetched_at
+            if age > self.ttl + self.stale_ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return result, age <= self.ttl
+
+    def _store(self, key, result):
+        with self._lock:
+            self._data[key] = (time.time(), result)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _claim_refresh(self, key) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    # --- sync ---
+    def get(self, query: str, search_fn) -> str:
+        """Cached search_fn(query). Exceptions from search_fn are raised, not cached."""
+        if self.ttl <= 0:
+            return search_fn(query)
+        key = normalize_query(query)
+        found = self._lookup(key)
+        if found is not None:
+            result, fresh = found
+            if fresh:
+                self._count("hits")
+            else:
+                self._count("stale_hits")
+                self._refresh_in_background(key, query, search_fn)
+            return result
+        self._count("misses")
+        return self._flight.do(key, lambda: self._fetch(key, query, search_fn))
+
+    def _fetch(self, key, query, search_fn):
+        result = search_fn(query)
+        self._store(key, result)
+        return result
+
+    def _refresh_in_background(self, key, query, search_fn):
+        if not self._claim_refresh(key):
+            return
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-refresh")
+
+        def refresh():
+            try:
+                self._fetch(key, query, search_fn)
+            except Exception as e:
+                self._count("refresh_errors")
+                print(f"Warning: search refresh failed for {query!r}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    # --- async ---
+    async def aget(self, query: str, asearch_fn) -> str:
+        """Async version of get, asearch_fn(query) returns an awaitable."""
+        if self.ttl <= 0:
+            return await asearch_fn(query)
+        key = normalize_query(query)
+        found = self._lookup(key)
+        if found is not None:
+            result, fresh = found
+            if fresh:
+                self._count("hits")
+            else:
+                self._count("stale_hits")
+                self._arefresh_in_background(key, query, asearch_fn)
+            return result
+        self._count("misses")
+        return await self._flight.ado(key, lambda: self._afetch(key, query, asearch_fn))
+
+    async def _afetch(self, key, query, asearch_fn):
+        result = await asearch_fn(query)
+        self._store(key, result)
+        return result
+
+    def _arefresh_in_background(self, key, query, asearch_fn):
+        if not self._claim_refresh(key):
+            return
+
+        async def refresh():
+            try:
+                await self._afetch(key, query, asearch_fn)
+            except Exception as e:
+                self._count("refresh_errors")
+                print(f"Warning: search refresh failed for {query!r}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        # Keep a reference so the task isn't garbage collected mid-refresh
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "entries": len(self._data),
+            "evictions": self.evictions,
+        }
+
+
+def search_cache_from_env() -> SearchCache:
+    """
+    Build a SearchCache from environment variables:
+      SEARCH_CACHE_TTL          seconds a result is fresh (default 300, 0 disables the cache)
+      SEARCH_CACHE_STALE        seconds a stale result is still served while refreshing (default 1800)
+      SEARCH_CACHE_MAX_ENTRIES  entry limit (default 512)
+    """
+    return SearchCache(
+        ttl=float(os.environ.get("SEARCH_CACHE_TTL", 300)),
+        stale_ttl=float(os.environ.get("SEARCH_CACHE_STALE", 1800)),
+        max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 512)),
+    )
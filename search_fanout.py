@@ -0,0 +1,106 @@
+import asyncio
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# --- Parallel fan-out of sub-queries to a search tool ---
+# A split query gives several sub-queries. They are deduped, searched
+# concurrently with a per-search timeout, and merged into one text for summarize.
+
+FANOUT_WORKERS = int(os.environ.get("SEARCH_FANOUT_WORKERS", 5))
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", 10))
+
+# Near-duplicate threshold on the Jaccard similarity of normalized word sets
+DEDUPE_SIMILARITY = 0.8
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "and", "or", "is", "are", "was", "were",
+    "what", "whats", "who", "how", "about", "me", "tell", "please", "with", "at", "by", "do", "does",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def query_words(query: str) -> list[str]:
+    """Lowercased content words in order, ignoring punctuation and stopwords."""
+    words = _WORD_RE.findall(query.lower())
+    return [w for w in words if w not in STOPWORDS] or words
+
+def query_terms(query: str) -> frozenset:
+    """query_words, ignoring order as well."""
+    return frozenset(query_words(query))
+
+def dedupe_queries(queries: list[str], threshold: float = DEDUPE_SIMILARITY) -> list[str]:
+    """Drop empty and near-identical sub-queries, keeping the first of each group in order."""
+    kept, kept_terms = [], []
+    for query in queries:
+        if not query or not query.strip():
+            continue
+        terms = query_terms(query)
+        duplicate = False
+        for other in kept_terms:
+            union = terms | other
+            if union and len(terms & other) / len(union) >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(query.strip())
+            kept_terms.append(terms)
+    return kept
+
+def merge_results(results: list[tuple[str, str]]) -> str:
+    """Merge (query, result) pairs into one block of text for summarize."""
+    sections = []
+    for query, result in results:
+        sections.append(f"Results for: {query}\n{result.strip()}")
+    return "\n\n".join(sections)
+
+
+_executor = None
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="search")
+    return _executor
+
+def fan_out_search(queries, search_fn, timeout: float = SEARCH_TIMEOUT) -> list[tuple[str, str]]:
+    """
+    Run search_fn over the deduped queries on a bounded thread pool.
+    Searches that fail or exceed the timeout are reported in place of their results.
+    """
+    queries = dedupe_queries(queries)
+    if not queries:
+        return []
+    executor = _get_executor()
+    futures = [executor.submit(search_fn, q) for q in queries]
+    start = time.monotonic()
+    results = []
+    for i, (query, future) in enumerate(zip(queries, futures)):
+        # Searches run in waves of FANOUT_WORKERS, each wave gets its own timeout
+        deadline = start + timeout * (i // FANOUT_WORKERS + 1)
+        try:
+            results.append((query, future.result(timeout=max(0.0, deadline - time.monotonic()))))
+        except FutureTimeout:
+            future.cancel()
+            results.append((query, f"(no results: search timed out after {timeout:g}s)"))
+        except Exception as e:
+            results.append((query, f"(no results: search failed: {e})"))
+    return results
+
+async def afan_out_search(queries, asearch_fn, timeout: float = SEARCH_TIMEOUT,
+                          max_concurrency: int = FANOUT_WORKERS) -> list[tuple[str, str]]:
+    """Async version of fan_out_search, bounded by a semaphore with an exact per-search timeout."""
+    queries = dedupe_queries(queries)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def one(query):
+        async with semaphore:
+            try:
+                return query, await asyncio.wait_for(asearch_fn(query), timeout)
+            except asyncio.TimeoutError:
+                return query, f"(no results: search timed out after {timeout:g}s)"
+            except Exception as e:
+                return query, f"(no results: search failed: {e})"
+
+    return list(await asyncio.gather(*(one(q) for q in queries)))
@@ -0,0 +1,266 @@
+import os
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+# --- Near-duplicate cache for query decisions ---
+# Users ask the same question in many ways: other case or punctuation, words in
+# another order, a typo, an extra "please". The exact-key caches miss all of
+# these, so process_query decisions (simple/complex + split, searchable) are also
+# kept here, indexed by meaning-ish rather than by exact text:
+#   - each query becomes a hashed bag of words and character trigrams, so word
+#     order doesn't matter and small edits only change a few features
+#   - random-hyperplane LSH tables find candidates in ~constant time, then the
+#     best candidate's cosine similarity has to reach the threshold
+#   - and every word of one query must appear in the other, up to a typo, so
+#     "capital of France" never answers "capital of Germany" however similar
+#     the rest is, nor "2023" answer "2024"
+#   - and with the same pairs of neighbouring words, within clauses split at
+#     "and", "or", ... (clauses may come in any order), so "did Iran
+#     attack Israel" never answers "did Israel attack Iran", whose split has
+#     the roles swapped
+# CPU only, no model download. See benchmarks/eval_semantic_cache.py for hit
+# rate against accuracy at each threshold.
+
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE", "true").lower() == "true"
+DIMENSIONS = 2048
+TABLES = 8
+BITS = 10
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# Words that carry no meaning for the decision
+STOP_WORDS = {
+    "a", "an", "the", "please", "me", "tell", "can", "you", "could", "i", "want", "to", "know",
+    "hey", "hi", "quick", "question",
+}
+# Words between clauses whose order doesn't change the meaning. Not commas, users leave them out.
+CLAUSE_BREAKS = {"and", "or", "plus", "vs", "versus"}
+# Shortest word that may differ by a typo (one inserted, deleted or changed letter)
+TYPO_MIN_LENGTH = 4
+
+
+def _hash(feature: str) -> int:
+    return zlib.crc32(feature.encode("utf-8"))
+
+def _words(text):
+    return [w for w in WORD_RE.findall(text.lower().replace("'", "")) if w not in STOP_WORDS]
+
+def content_words(text: str) -> frozenset:
+    return frozenset(_words(text))
+
+def word_pairs(text: str) -> frozenset:
+    """Adjacent content words, in order, within each clause."""
+    pairs = set()
+    previous = None
+    for word in _words(text):
+        if word in CLAUSE_BREAKS:
+            previous = None
+            continue
+        if previous is not None:
+            pairs.add((previous, word))
+        previous = word
+    return frozenset(pairs)
+
+def vectorize(text: str) -> dict:
+    """Unit-length sparse vector {dimension: weight} of hashed words and character trigrams."""
+    words = _words(text)
+    vector = {}
+    for word in words:
+        features = [f"w:{word}"] + [f"c:{t}" for t in _trigrams(word)]
+        for feature in features:
+            h = _hash(feature)
+            index = h % DIMENSIONS
+            # The sign bit keeps hash collisions from always adding up
+            vector[index] = vector.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0) * (2.0 if feature[0] == "w" else 1.0)
+    norm = sum(v * v for v in vector.values()) ** 0.5
+    return {i: v / norm for i, v in vector.items() if v} if norm else {}
+
+def _trigrams(word):
+    padded = f"<{word}>"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(i, 0.0) for i, v in a.items())
+
+def _one_edit(a, b) -> bool:
+    # Numbers have to match exactly, "2023" is not a typo of "2024"
+    if abs(len(a) - len(b)) > 1 or max(len(a), len(b)) < TYPO_MIN_LENGTH or not (a.isalpha() and b.isalpha()):
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    # Skip the one differing letter in the longer word, or in both if the lengths match
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+def _covered(words, others) -> bool:
+    """Every word is in others, or one typo away from a word in others."""
+    return all(any(_one_edit(word, o) for o in others - words) for word in words - others)
+
+def same_words(a: frozenset, b: frozenset) -> bool:
+    return _covered(a, b) and _covered(b, a)
+
+def _same_pair(a, b) -> bool:
+    return all(x == y or _one_edit(x, y) for x, y in zip(a, b))
+
+def same_order(a: frozenset, b: frozenset) -> bool:
+    """The same word pairs (word_pairs) on both sides, up to a typo."""
+    return (all(any(_same_pair(p, o) for o in b - a) for p in a - b)
+            and all(any(_same_pair(p, o) for o in a - b) for p in b - a))
+
+
+class SemanticCache:
+    """Maps queries to values, get() also answers for near-duplicates of stored queries."""
+
+    def __init__(self, name: str, threshold: float = 0.85, max_entries: int = 4096, seed: int = 0):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        # One random hyperplane per bit per table, entries are +-1 so a plane is a bit mask
+        self._planes = [[[rng.random() < 0.5 for _ in range(DIMENSIONS)] for _ in range(BITS)] for _ in range(TABLES)]
+        self._tables = [{} for _ in range(TABLES)]  # bucket -> set of entry ids
+        self._entries = OrderedDict()  # id -> (vector, words, pairs, buckets, value, key)
+        self._ids = {}  # normalized text -> id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _buckets(self, vector):
+        buckets = []
+        for planes in self._planes:
+            signature = 0
+            for plane in planes:
+                dot = sum(v if plane[i] else -v for i, v in vector.items())
+                signature = signature << 1 | (dot >= 0)
+            buckets.append(signature)
+        return buckets
+
+    def lookup(self, text: str):
+        """(value, similarity) of the most similar stored query above the threshold, or None."""
+        vector = vectorize(text)
+        if not vector:
+            return None
+        words, pairs = content_words(text), word_pairs(text)
+        buckets = self._buckets(vector)
+        with self._lock:
+            candidates = set()
+            for table, bucket in zip(self._tables, buckets):
+                candidates |= table.get(bucket, set())
+            best, best_id = None, None
+            for entry_id in candidates:
+                stored, stored_words, stored_pairs, _, value, _ = self._entries[entry_id]
+                similarity = cosine(vector, stored)
+                if similarity < self.threshold or (best is not None and similarity <= best[1]):
+                    continue
+                if same_words(words, stored_words) and same_order(pairs, stored_pairs):
+                    best, best_id = (value, similarity), entry_id
+            if best_id is not None:
+                self._entries.move_to_end(best_id)
+            return best
+
+    def get(self, text: str):
+        found = self.lookup(text)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return found[0]
+
+    def set(self, text: str, value):
+        vector = vectorize(text)
+        if not vector:
+            return
+        key = " ".join(WORD_RE.findall(text.lower().replace("'", "")))
+        buckets = self._buckets(vector)
+        with self._lock:
+            if key in self._ids:
+                self._remove(self._ids[key])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (vector, content_words(text), word_pairs(text), buckets, value, key)
+            self._ids[key] = entry_id
+            for table, bucket in zip(self._tables, buckets):
+                table.setdefault(bucket, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        # Called with the lock held
+        _, _, _, buckets, _, key = self._entries.pop(entry_id)
+        for table, bucket in zip(self._tables, buckets):
+            ids = table[bucket]
+            ids.discard(entry_id)
+            if not ids:
+                del table[bucket]
+        del self._ids[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+            for table in self._tables:
+                table.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+class _Disabled:
+    """Stand-in when SEMANTIC_CACHE=false."""
+
+    def get(self, text):
+        return None
+
+    def set(self, text, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"enabled": False}
+
+
+def semantic_cache_from_env(name: str):
+    """SEMANTIC_CACHE_THRESHOLD (default 0.85) and SEMANTIC_CACHE_MAX_ENTRIES (4096), SEMANTIC_CACHE=false turns it off."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return _Disabled()
+    return SemanticCache(
+        name,
+        threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.85)),
+        max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 4096)),
+    )
+
+
+# --- process_query decisions ---
+# A cached split is reused as is, but a simple query is answered with the
+# caller's own wording.
+def reuse_split(query: str, cached: dict) -> dict:
+    if cached["is_simple"]:
+        return {"is_simple": True, "queries": [query]}
+    return {"is_simple": False, "queries": list(cached["queries"])}
+
+def remember_split(cache, query: str, result: dict):
+    # A "split" into just the query itself is what the error fallbacks return, don't keep it
+    if not result["is_simple"] and result["queries"] == [query]:
+        return
+    cache.set(query, {"is_simple": result["is_simple"], "queries": list(result["queries"])})
@@ -0,0 +1,329 @@
+"""
+One ASGI service for the news agent and the editor overlay API.
+
+    uvicorn service:app --port 5000
+    SERVE_APP=service gunicorn -c gunicorn.conf.py
+
+Serves /news-agent (app.py) and every route of workday_hackathon/app2.py on one
+event loop. LLM calls are awaited through the async Groq client, so an in-flight
+call is a coroutine instead of a blocked thread, and all routes share the same
+clients, rate-limit schedulers, response cache, search cache and single-flight
+tables. app.py and app2.py still work on their own.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT_DIR, "workday_hackathon"))
+
+import main2
+import metrics
+from admission import admission_controller
+from cancellation import RequestCancelled, cancelled, registry, run_cancellable
+from app import add_request_tracing, news_agent_ready, router as news_router, warm_up_news_agent
+from deadlines import caused_by_deadline, expired, within_deadline
+from metrics import stage
+
+# Default time budgets, X-Request-Timeout overrides them per request.
+# Batches get BATCH_REQUEST_TIMEOUT (main2.py).
+API_REQUEST_TIMEOUT = float(os.environ.get("API_REQUEST_TIMEOUT", 30))
+NEWS_REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 60))
+
+def timeout_for(path: str) -> float:
+    if path == "/api/batch":
+        return main2.BATCH_REQUEST_TIMEOUT
+    return API_REQUEST_TIMEOUT if path.startswith("/api/") else NEWS_REQUEST_TIMEOUT
+
+
+# --- LLM Warm-up ---
+# Same as app2: the chains and the news agent load in the background so /health answers at once
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.environ.get("LLM_WARMUP", "true").lower() == "true":
+        threading.Thread(target=main2.warm_up, name="llm-warmup", daemon=True).start()
+        warm_up_news_agent()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["*"],
+)
+
+# Admission lane per route, see admission.py
+LANES_BY_PATH = {
+    "/api/ai_edit": "edit",
+    "/api/ai_edit/stream": "edit",
+    "/api/ai_suggestions": "suggestions",
+    "/api/ai_suggestions/stream": "suggestions",
+    "/api/process_query": "process_query",
+    "/api/batch": "batch",
+    "/news-agent": "news_agent",
+}
+
+add_request_tracing(app, "service", timeout_for, LANES_BY_PATH.get)
+
+# /news-agent, /metrics, /search-cache-stats, /admission-stats
+app.include_router(news_router)
+
+
+def error(message: str, status: int) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status)
+
+def error_response(route, e):
+    """500 for a failed request, 504 if it failed because its deadline passed, 499 if it was cancelled."""
+    if caused_by_deadline(e) or expired():
+        print(f"Deadline exceeded for {route}")
+        metrics.deadline_exceeded.inc(where="http")
+        return error("Request deadline exceeded", 504)
+    if isinstance(e, RequestCancelled) or cancelled():
+        return error("Request cancelled", 499)
+    print(f"Error processing {route}: {e}")
+    return error(f"An internal error occurred: {str(e)}", 500)
+
+async def read_json(request: Request):
+    """The JSON object body, or None if the request isn't JSON."""
+    if "application/json" not in request.headers.get("content-type", ""):
+        return None
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# --- Editor API Routes (async versions of app2's) ---
+def wants_incremental(data):
+    """The request's 'incremental' flag (paragraph-level ai_edit), AI_EDIT_INCREMENTAL if unset."""
+    return bool(data.get("incremental", main2.AI_EDIT_INCREMENTAL))
+
+async def run_text_route(request: Request, route: str, label: str, run, incremental_run=None):
+    with stage("parse"):
+        data = await read_json(request)
+        if data is None:
+            return error("Request must be JSON", 400)
+        text = data.get("text")
+    if text is None:
+        return error("Missing 'text' field in JSON payload", 400)
+    if not isinstance(text, str):
+        return error("'text' field must be a string", 400)
+    if incremental_run is not None and wants_incremental(data):
+        run = incremental_run
+
+    print(f"Received for {label} (first 50 chars): '{text[:50]}...'")
+    try:
+        response_text = await run_cancellable(request, route, within_deadline(run(text))) or ""
+        print(f"Sending {label} response (first 50 chars): '{response_text[:50]}...'")
+        with stage("serialization"):
+            return JSONResponse({"response": response_text})
+    except Exception as e:
+        return error_response(route, e)
+
+@app.post("/api/ai_edit")
+async def ai_edit(request: Request):
+    """Improve text clarity and grammar."""
+    return await run_text_route(request, "/api/ai_edit", "edit", main2.arun_ai_edit, main2.arun_ai_edit_incremental)
+
+@app.post("/api/ai_suggestions")
+async def ai_suggestions(request: Request):
+    """Suggest improvements or alternatives for text."""
+    return await run_text_route(request, "/api/ai_suggestions", "suggestions", main2.arun_ai_suggestions)
+
+@app.post("/api/process_query")
+async def handle_process_query(request: Request):
+    """Classify a query and split it into simple sub-queries."""
+    with stage("parse"):
+        data = await read_json(request)
+        if data is None:
+            return error("Request must be JSON", 400)
+        text = data.get("text")
+    if text is None:
+        return error("Missing 'text' field in JSON payload", 400)
+    if not isinstance(text, str):
+        return error("'text' field must be a string", 400)
+
+    print(f"Received for processing (first 50 chars): '{text[:50]}...'")
+    try:
+        result = await run_cancellable(request, "/api/process_query", within_deadline(main2.aprocess_query(text)))
+        with stage("serialization"):
+            return JSONResponse(result)
+    except Exception as e:
+        return error_response("/api/process_query", e)
+
+@app.post("/api/batch")
+async def batch(request: Request):
+    """Run many ai_edit / ai_suggestions / process_query items in one request, see app2."""
+    data = await read_json(request)
+    if data is None:
+        return error("Request must be JSON", 400)
+    items = data.get("items")
+    if not isinstance(items, list):
+        return error("Missing or non-list 'items' field in JSON payload", 400)
+    if len(items) > main2.BATCH_MAX_ITEMS:
+        return error(f"Too many items, the limit is {main2.BATCH_MAX_ITEMS} per batch", 413)
+
+    max_concurrency = data.get("max_concurrency", main2.BATCH_MAX_CONCURRENCY)
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        return error("'max_concurrency' must be a positive integer", 400)
+    max_concurrency = min(max_concurrency, main2.BATCH_MAX_CONCURRENCY)
+
+    print(f"Received batch of {len(items)} items (max_concurrency={max_concurrency})")
+    try:
+        results = await run_cancellable(request, "/api/batch", within_deadline(main2.arun_batch(items, max_concurrency)))
+        errors = sum(1 for r in results if "error" in r)
+        print(f"Finished batch: {len(results) - errors} ok, {errors} errors")
+        return JSONResponse({"results": results})
+    except Exception as e:
+        return error_response("/api/batch", e)
+
+
+# --- Streaming Routes (Server-Sent Events) ---
+def sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Event. Data is JSON so newlines in tokens survive."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_response(request, route, astream_fn, text, label):
+    """Forward chunks from astream_fn as SSE 'token' events, then a 'done' or 'error' event."""
+    async def generate():
+        # Superseding stops the stream at its next token (cancellation_callback_handler)
+        token = registry.start(request.state.request_id, route, request.headers.get("x-session-id"))
+        total = 0
+        try:
+            async for chunk in astream_fn(text):
+                total += len(chunk)
+                yield sse_event({"token": chunk})
+            print(f"Finished streaming {label} response ({total} chars)")
+            yield sse_event({}, event="done")
+        except asyncio.CancelledError:
+            # Starlette cancels the stream when the client disconnects
+            token.cancel("disconnected")
+            raise
+        except Exception as e:
+            print(f"Error streaming {label}: {e}")
+            if caused_by_deadline(e) or expired():
+                message = "Request deadline exceeded"
+            elif cancelled():
+                message = "Request cancelled"
+            else:
+                message = f"An internal error occurred: {str(e)}"
+            yield sse_event({"error": message}, event="error")
+        finally:
+            registry.finish(token)
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def stream_route(request: Request, route: str, astream_fn, label, incremental_fn=None):
+    data = await read_json(request)
+    if data is None:
+        return error("Request must be JSON", 400)
+    text = data.get("text")
+    if text is None:
+        return error("Missing 'text' field in JSON payload", 400)
+    if not isinstance(text, str):
+        return error("'text' field must be a string", 400)
+    if incremental_fn is not None and wants_incremental(data):
+        astream_fn = incremental_fn
+    print(f"Streaming {label} for (first 50 chars): '{text[:50]}...'")
+    return stream_response(request, route, astream_fn, text, label)
+
+@app.post("/api/ai_edit/stream")
+async def ai_edit_stream(request: Request):
+    """Streaming version of /api/ai_edit."""
+    return await stream_route(request, "/api/ai_edit/stream", main2.astream_ai_edit, "edit",
+                              main2.astream_ai_edit_incremental)
+
+@app.post("/api/ai_suggestions/stream")
+async def ai_suggestions_stream(request: Request):
+    """Streaming version of /api/ai_suggestions."""
+    return await stream_route(request, "/api/ai_suggestions/stream", main2.astream_ai_suggestions, "suggestions")
+
+
+@app.post("/api/cancel")
+async def cancel_request(request: Request):
+    """Cancel an in-flight request by the id it was sent with (X-Request-Id)."""
+    data = await read_json(request)
+    if data is None:
+        return error("Request must be JSON", 400)
+    request_id = data.get("request_id")
+    if not isinstance(request_id, str):
+        return error("Missing or non-string 'request_id' field in JSON payload", 400)
+    return {"cancelled": registry.cancel(request_id)}
+
+
+# --- Debug and Stats Routes ---
+@app.get("/debug")
+async def debug_get(request: Request):
+    """Echo back the query arguments."""
+    return {"message": "Debug endpoint working", "method": "GET", "args": dict(request.query_params)}
+
+@app.post("/debug")
+async def debug_post(request: Request):
+    """Echo back the JSON body and headers."""
+    return {
+        "message": "Debug endpoint working",
+        "method": "POST",
+        "json": await read_json(request),
+        "headers": dict(request.headers),
+    }
+
+@app.get("/api/cache_stats")
+def cache_stats():
+    return main2.response_cache.stats()
+
+@app.get("/api/semantic_cache_stats")
+def semantic_cache_stats():
+    return main2.decision_cache.stats()
+
+@app.get("/api/coalescing_stats")
+def coalescing_stats():
+    return main2.inflight.stats()
+
+@app.get("/api/scheduler_stats")
+def scheduler_stats():
+    if not main2.llm_ready():
+        return []
+    import scheduler
+    return scheduler.scheduler_stats()
+
+@app.get("/api/admission_stats")
+def admission_stats():
+    return admission_controller().stats()
+
+@app.get("/api/route_stats")
+def route_stats():
+    import model_router
+    return model_router.route_stats()
+
+@app.get("/health")
+def health_check():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def readiness_check():
+    if main2.llm_ready() and news_agent_ready():
+        return {"status": "ready"}
+    return JSONResponse({"status": "loading"}, status_code=503)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 5000))
+    print(f"Starting unified service on port {port}")
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+
+from cancellation import RequestCancelled
+from deadlines import DeadlineExceeded, caused_by_deadline, remaining
+
+# --- Single-flight request coalescing ---
+# Concurrent callers with the same key share one upstream call: the first
+# caller (the leader) runs it, the others wait and receive the same result or
+# exception. Unlike the response cache this needs no warm entry, it only
+# collapses calls that overlap in time. If the leader's own request is
+# cancelled (cancellation.py) or runs out of time (deadlines.py), the followers
+# don't inherit that: those with budget left retry and one of them becomes the
+# new leader. A follower waits at most until its own deadline.
+
+def _leader_only(error) -> bool:
+    """Whether the leader's call failed for a reason of its own request, not shared by this caller."""
+    if isinstance(error, RequestCancelled):
+        return True
+    if caused_by_deadline(error):
+        left = remaining()
+        return left is None or left > 0
+    return False
+
+def _follower_timeout():
+    return DeadlineExceeded("request deadline exceeded while waiting for a coalesced call")
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() once for all threads calling with the same key at the same time."""
+        while True:
+            call, leader = self._join(key)
+            if leader:
+                return self._lead(key, call, fn)
+            left = remaining()
+            if not call.event.wait(None if left is None else max(left, 0)):
+                raise _follower_timeout()
+            if call.error is not None and _leader_only(call.error):
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+        return call, leader
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key, coro_fn):
+        """
+        Async version of do. coro_fn() returns an awaitable. Calls are only shared
+        between callers on the same event loop, a future can't be awaited from another.
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, key)
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                if future is None:
+                    future = self._async_calls[key] = loop.create_future()
+                    self.upstream_calls += 1
+                    break
+                self.coalesced += 1
+            try:
+                return await self._follow(future)
+            except asyncio.CancelledError:
+                # Retry when it was the leader that was cancelled, not this caller
+                if asyncio.current_task().cancelling() or not future.cancelled():
+                    raise
+            except Exception as e:
+                # Retry when the leader's request failed on its own deadline or cancellation
+                if not (future.done() and not future.cancelled() and future.exception() is e and _leader_only(e)):
+                    raise
+
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved in case there were no followers
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    @staticmethod
+    async def _follow(future):
+        # shield so a cancelled follower does not cancel the shared call
+        left = remaining()
+        if left is None:
+            return await asyncio.shield(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), max(left, 0))
+        except asyncio.TimeoutError:
+            if future.done():
+                raise
+            raise _follower_timeout() from None
+
+    def stats(self) -> dict:
+        calls = self.upstream_calls + self.coalesced
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._async_calls),
+            "coalesce_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import LANES, AdmissionController, ClientBuckets, Rejected
+from deadlines import deadline
+
+
+def controller(max_concurrency=1, queue_size=8, rate=6000, burst=100):
+    return AdmissionController(
+        max_concurrency=max_concurrency,
+        queue_sizes={lane: queue_size for lane in LANES},
+        client_buckets=ClientBuckets(rate, burst),
+    )
+
+
+def wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "timed out"
+        time.sleep(0.005)
+
+
+def test_freed_slot_goes_to_the_most_important_lane():
+    c = controller()
+    first = c.admit("batch", "client")
+    order = []
+
+    def wait_in(lane):
+        ticket = c.admit(lane, "client")
+        order.append(lane)
+        ticket.release()
+
+    threads = []
+    for lane in ("batch", "news_agent", "edit"):
+        threads.append(threading.Thread(target=wait_in, args=(lane,)))
+        threads[-1].start()
+        wait_until(lambda: len(c._queues[lane]) == 1)
+    first.release()
+    for thread in threads:
+        thread.join()
+    assert order == ["edit", "news_agent", "batch"]
+    assert sum(c.in_flight.values()) == 0
+
+
+def test_full_queue_is_rejected():
+    c = controller(queue_size=0)
+    ticket = c.admit("edit", "client")
+    with pytest.raises(Rejected) as e:
+        c.admit("edit", "client")
+    assert (e.value.status, e.value.reason) == (503, "queue_full")
+    assert e.value.retry_after >= 1
+    ticket.release()
+
+
+def test_queue_full_does_not_spend_the_client_rate():
+    # Regression: every 503 used to take a token, so retries turned into 429s
+    c = controller(queue_size=0, rate=60, burst=2)
+    ticket = c.admit("edit", "client")
+    for _ in range(5):
+        with pytest.raises(Rejected) as e:
+            c.admit("edit", "client")
+        assert e.value.reason == "queue_full"
+    ticket.release()
+    c.admit("edit", "client").release()
+
+
+def test_client_over_its_rate_gets_429():
+    c = controller(max_concurrency=10, rate=60, burst=1)
+    c.admit("edit", "a").release()
+    with pytest.raises(Rejected) as e:
+        c.admit("edit", "a")
+    assert e.value.status == 429
+    c.admit("edit", "b").release()
+
+
+def test_expected_wait_longer_than_deadline_is_rejected_at_once():
+    c = controller()
+    c.service_time["edit"] = 10.0
+    ticket = c.admit("edit", "client")
+    start = time.monotonic()
+    with deadline(1):
+        with pytest.raises(Rejected) as e:
+            c.admit("edit", "client")
+    assert (e.value.status, e.value.reason) == (503, "deadline")
+    assert time.monotonic() - start < 0.5
+    ticket.release()
+
+
+def test_waiter_that_times_out_leaves_the_queue():
+    c = controller()
+    c.service_time["edit"] = 0.1
+    ticket = c.admit("edit", "client")
+    with deadline(0.2):
+        with pytest.raises(Rejected) as e:
+            c.admit("edit", "client")
+    assert e.value.reason == "deadline"
+    assert not c._queues["edit"]
+    ticket.release()
+    assert sum(c.in_flight.values()) == 0
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    c = controller()
+
+    async def main():
+        ticket = await c.aadmit("edit", "client")
+        waiter = asyncio.create_task(c.aadmit("edit", "client"))
+        await asyncio.sleep(0.01)
+        assert len(c._queues["edit"]) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not c._queues["edit"]
+        ticket.release()
+        (await c.aadmit("edit", "client")).release()
+
+    asyncio.run(main())
+    assert sum(c.in_flight.values()) == 0
+
+
+def test_ticket_release_is_idempotent():
+    c = controller(max_concurrency=2)
+    ticket = c.admit("edit", "client")
+    ticket.release()
+    ticket.release()
+    assert c.in_flight["edit"] == 0
@@ -0,0 +1,34 @@
+import pytest
+
+from fused_query import parse_fused_response
+
+
+@pytest.mark.parametrize("response, expected", [
+    ('{"simple": true, "queries": ["weather in Paris"]}', (True, ["weather in Paris"])),
+    ('{"simple": false, "queries": ["GDP of France", " GDP of Spain ", ""]}',
+     (False, ["GDP of France", "GDP of Spain"])),
+    # Code fences and text around the object
+    ('```json\n{"simple": true, "queries": ["q"]}\n```', (True, ["q"])),
+    ('Sure! Here it is: {"simple": true, "queries": ["q"]} Hope that helps.', (True, ["q"])),
+    # Python literals instead of JSON
+    ("{'simple': False, 'queries': ['a', 'b']}", (False, ["a", "b"])),
+    # The decision as a word
+    ('{"simple": "yes", "queries": ["q"]}', (True, ["q"])),
+    ('{"simple": "False", "queries": ["a", "b"]}', (False, ["a", "b"])),
+])
+def test_parses(response, expected):
+    assert parse_fused_response(response) == expected
+
+
+@pytest.mark.parametrize("response", [
+    "The query is simple.",
+    '{"simple": true, "queries": ["q"]',
+    '{"simple": "maybe", "queries": ["q"]}',
+    '{"simple": true}',
+    '{"simple": true, "queries": "q"}',
+    '{"simple": true, "queries": [1, 2]}',
+    '{"simple": false, "queries": []}',
+    '["not", "an", "object"]',
+])
+def test_unparsable_reply_falls_back(response):
+    assert parse_fused_response(response) is None
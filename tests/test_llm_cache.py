@@ -0,0 +1,85 @@
+import asyncio
+
+from llm_cache import LRUCache, SQLiteStore, TieredCache, make_key
+
+
+def test_key_ignores_whitespace_but_not_model():
+    key = make_key("ai_edit", "some  text\n", "v1", "model-a")
+    assert key == make_key("ai_edit", "some text", "v1", "model-a")
+    assert key != make_key("ai_edit", "some text", "v1", "model-b")
+
+
+def test_memory_entries_expire():
+    cache = LRUCache(ttl=3600)
+    cache.set("fresh", "value")
+    cache.set("stale", "value", ttl=-1)
+    assert cache.get("fresh") == "value"
+    assert cache.get("stale") is None
+    assert len(cache) == 1
+
+
+def test_memory_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.evictions == 1
+
+
+def test_memory_size_limit():
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "12345")
+    assert cache.size_bytes <= 10
+    cache.set("too_big", "x" * 11)
+    assert cache.get("too_big") is None
+
+
+def test_disk_entries_expire(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"), ttl=3600)
+    store.set("fresh", "value")
+    store.set("stale", "value", ttl=-1)
+    assert store.get("fresh") == "value"
+    assert store.get("stale") is None
+
+
+def test_disk_hit_is_copied_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(LRUCache(), SQLiteStore(path)).set("k", "v")
+
+    # A new process (or worker) only shares the disk tier
+    cache = TieredCache(LRUCache(), SQLiteStore(path))
+    assert cache.get("k") == "v"
+    assert cache.get("k") == "v"
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_disk_errors_fall_back_to_memory(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.sqlite3"))
+    cache = TieredCache(LRUCache(), store)
+    store._conn().execute("DROP TABLE cache")
+
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    assert cache.get("missing") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_async_lookups_count_like_sync(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(LRUCache(), SQLiteStore(path)).set("on_disk", "v")
+    cache = TieredCache(LRUCache(), SQLiteStore(path))
+
+    async def main():
+        await cache.aset("in_memory", "v")
+        return [await cache.aget(k) for k in ("in_memory", "on_disk", "missing")]
+
+    assert asyncio.run(main()) == ["v", "v", None]
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
@@ -0,0 +1,83 @@
+import pytest
+
+from semantic_cache import SemanticCache, cosine, remember_split, reuse_split, vectorize
+
+STORED = "What is the capital of France?"
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache("test", threshold=0.85)
+    cache.set(STORED, "france")
+    return cache
+
+
+@pytest.mark.parametrize("query", [
+    STORED,
+    "what is the capital of france",
+    "WHAT IS THE CAPITAL OF FRANCE!!",
+    "please, what is the capital of France?",
+    "What is the capitall of France?",
+])
+def test_paraphrase_hits(cache, query):
+    assert cache.get(query) == "france"
+
+
+@pytest.mark.parametrize("query", [
+    "What is the capital of Germany?",
+    "What is the population of France?",
+    "What was the capital of France in 1789?",
+])
+def test_other_question_misses(cache, query):
+    assert cache.get(query) is None
+
+
+def test_numbers_must_match():
+    cache = SemanticCache("test")
+    cache.set("Who won the 2023 world cup final?", "2023")
+    assert cache.get("Who won the 2024 world cup final?") is None
+
+
+def test_swapped_roles_miss():
+    cache = SemanticCache("test")
+    cache.set("Did Iran attack Israel?", "iran first")
+    assert cache.get("Did Israel attack Iran?") is None
+
+
+def test_clauses_may_come_in_any_order():
+    cache = SemanticCache("test")
+    cache.set("weather in Paris and population of Tokyo", "split")
+    assert cache.get("population of Tokyo and weather in Paris") == "split"
+
+
+def test_threshold_decides_near_hits():
+    # A typo in a short word leaves the query just under the default threshold
+    query = "What is the capital of Frnce?"
+    similarity = cosine(vectorize(STORED), vectorize(query))
+    assert 0.8 < similarity < 0.85
+
+    for threshold, expected in ((0.8, "france"), (0.85, None)):
+        cache = SemanticCache("test", threshold=threshold)
+        cache.set(STORED, "france")
+        assert cache.get(query) == expected
+
+
+def test_stats_and_eviction():
+    cache = SemanticCache("test", max_entries=1)
+    cache.set("capital of France", "france")
+    cache.set("capital of Germany", "germany")
+    assert cache.get("capital of France") is None
+    assert cache.get("capital of Germany") == "germany"
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_split_reuse():
+    cache = SemanticCache("test")
+    remember_split(cache, STORED, {"is_simple": True, "queries": [STORED]})
+    query = "what is the capital of france"
+    assert reuse_split(query, cache.get(query)) == {"is_simple": True, "queries": [query]}
+
+    # The error fallback's "split" into the query itself is not kept
+    remember_split(cache, "GDP of France vs Spain", {"is_simple": False, "queries": ["GDP of France vs Spain"]})
+    assert len(cache) == 1
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cancellation import RequestCancelled
+from deadlines import DeadlineExceeded, check, deadline
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5):
+    stop = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < stop, "timed out"
+        time.sleep(0.005)
+
+
+def run_followers(flight, key, fn, count, seconds=None):
+    """Start count threads calling flight.do(key, fn), return their results or errors."""
+    results = [None] * count
+
+    def follow(i):
+        try:
+            if seconds is None:
+                results[i] = flight.do(key, fn)
+            else:
+                with deadline(seconds):
+                    results[i] = flight.do(key, fn)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=follow, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+# --- sync ---
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "ok"
+
+    threads, results = run_followers(flight, "k", fn, 4)
+    wait_until(lambda: flight.coalesced == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["ok"] * 4
+    assert len(calls) == 1
+    assert flight.stats()["upstream_calls"] == 1
+
+
+def test_leader_failure_reaches_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    threads, results = run_followers(flight, "k", fn, 3)
+    wait_until(lambda: flight.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.upstream_calls == 1
+
+
+def test_followers_retry_when_leader_is_cancelled():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            raise RequestCancelled("superseded")
+        return "ok"
+
+    threads, results = run_followers(flight, "k", fn, 3)
+    wait_until(lambda: flight.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert sum(isinstance(r, RequestCancelled) for r in results) == 1
+    assert results.count("ok") == 2
+
+
+def test_follower_with_budget_outlives_leader_deadline():
+    # Regression: a 30s follower used to fail with the leader's DeadlineExceeded
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.2)
+        check()
+        return "ok"
+
+    leader, leader_result = run_followers(flight, "k", fn, 1, seconds=0.05)
+    wait_until(lambda: flight.upstream_calls == 1)
+    followers, follower_results = run_followers(flight, "k", fn, 1, seconds=30)
+    for thread in leader + followers:
+        thread.join()
+    assert isinstance(leader_result[0], DeadlineExceeded)
+    assert follower_results == ["ok"]
+
+
+def test_follower_waits_no_longer_than_its_own_deadline():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, leader_result = run_followers(flight, "k", lambda: release.wait(5) and "ok", 1)
+    wait_until(lambda: flight.upstream_calls == 1)
+
+    start = time.monotonic()
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            flight.do("k", lambda: "never called")
+    assert time.monotonic() - start < 1
+    release.set()
+    leader[0].join()
+    assert leader_result == ["ok"]
+
+
+# --- async ---
+def test_async_follower_with_budget_outlives_leader_deadline():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.2)
+        check()
+        return "ok"
+
+    async def call(seconds):
+        with deadline(seconds):
+            return await flight.ado("k", work)
+
+    async def main():
+        leader = asyncio.create_task(call(0.05))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(call(30))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader_result, follower_result = asyncio.run(main())
+    assert isinstance(leader_result, DeadlineExceeded)
+    assert follower_result == "ok"
+
+
+def test_async_follower_waits_no_longer_than_its_own_deadline():
+    flight = SingleFlight()
+
+    async def main():
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "ok"
+
+        leader = asyncio.create_task(flight.ado("k", work))
+        await asyncio.sleep(0)
+        start = time.monotonic()
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceeded):
+                await flight.ado("k", work)
+        assert time.monotonic() - start < 1
+        release.set()
+        return await leader
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_async_followers_retry_when_leader_task_is_cancelled():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    async def main():
+        leader = asyncio.create_task(flight.ado("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.ado("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "ok"
+    assert len(calls) == 2
+    assert flight.stats()["in_flight"] == 0
@@ -1,16 +1,21 @@
 import os
-from flask import Flask, request, jsonify
+import json
+import threading
+import time
+from functools import wraps
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 # --- Import AI functions from main2.py ---
 try:
     print("Importing functions from main2...")
-    from main2 import run_ai_edit, run_ai_suggestions
+    from main2 import (
+        run_ai_edit, run_ai_suggestions, stream_ai_edit, stream_ai_suggestions,
+        run_ai_edit_incremental, stream_ai_edit_incremental, AI_EDIT_INCREMENTAL,
+        run_batch, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS, BATCH_REQUEST_TIMEOUT, process_query,
+        response_cache, inflight, decision_cache, warm_up, llm_ready,
+    )
     print("Functions imported successfully.")
-except SystemExit as e:
-    # Catch SystemExit if main2.py exited early
-    print(f"CRITICAL: Exiting Flask app because main2.py failed to initialize. Error: {e}")
-    exit(1)
 except ImportError as e:
     print(f"CRITICAL: Failed to import from main2.py. Is it in the same directory? Error: {e}")
     exit(1)
@@ -18,20 +23,137 @@ except Exception as e:
     print(f"CRITICAL: Unexpected error importing main2.py: {e}")
     exit(1)
 
+# Shared helpers from the repository root (put on sys.path by main2)
+import metrics
+from metrics import stage
+from deadlines import caused_by_deadline, expired, request_timeout, start_deadline
+from admission import Rejected, admission_controller, client_id
+from cancellation import RequestCancelled, cancelled, current_token, new_request_id, registry
+
 # --- Flask App Setup ---
 app = Flask(__name__)
 
+# --- LLM Warm-up ---
+# main2 loads the LLM stack lazily, so the server (and /health) comes up right
+# away and the chains are compiled in the background. Set LLM_WARMUP=false to
+# load on the first request instead. Under gunicorn (gunicorn.conf.py) the
+# warm-up runs in each worker after fork instead of at import.
+def _warm_up_in_background():
+    try:
+        warm_up()
+        print("LLM stack loaded.")
+    except Exception as e:
+        print(f"WARNING: LLM warm-up failed, will retry on first request. Error: {e}")
+
+def start_warm_up():
+    threading.Thread(target=_warm_up_in_background, name="llm-warmup", daemon=True).start()
+
+if os.environ.get("LLM_WARMUP", "true").lower() == "true":
+    start_warm_up()
+
+# Time budget per request, clients may ask for another one with X-Request-Timeout.
+# Batches get BATCH_REQUEST_TIMEOUT (main2.py).
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 30))
+
+# --- Request Tracing ---
+# Every request gets a trace and a deadline. Stage spans recorded while handling
+# it are sent back in a Server-Timing header, and the total goes to /metrics.
+@app.before_request
+def start_request_trace():
+    g.request_start = time.perf_counter()
+    g.request_id = new_request_id(request.headers.get("X-Request-Id"))
+    metrics.start_trace()
+    default = BATCH_REQUEST_TIMEOUT if request.path == "/api/batch" else REQUEST_TIMEOUT
+    start_deadline(request_timeout(request.headers.get("X-Request-Timeout"), default))
+
+def error_response(route, e):
+    """500 for a failed request, 504 if it failed because its deadline passed, 499 if it was cancelled."""
+    if caused_by_deadline(e) or expired():
+        print(f"Deadline exceeded for {route}")
+        metrics.deadline_exceeded.inc(where="http")
+        return jsonify({"error": "Request deadline exceeded"}), 504
+    if isinstance(e, RequestCancelled) or cancelled():
+        return jsonify({"error": "Request cancelled"}), 499
+    print(f"Error processing {route}: {e}")
+    return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+
+@app.after_request
+def finish_request_trace(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            app="app2", route=route, method=request.method, status=response.status_code,
+        )
+    spans = metrics.current_trace()
+    if spans:
+        response.headers["Server-Timing"] = metrics.server_timing(spans)
+    if "request_id" in g:
+        response.headers["X-Request-Id"] = g.request_id
+    return response
+
+# --- Cancellation ---
+# LLM routes register a cancel token under their request id. A newer request to
+# the same route with the same X-Session-Id, a client disconnect mid-stream or
+# POST /api/cancel stops the work that is left, see cancellation.py
+def cancellable(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'OPTIONS':
+            g.cancel_token = registry.start(g.request_id, request.url_rule.rule, request.headers.get("X-Session-Id"))
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.teardown_request
+def finish_cancel_token(exc):
+    # Runs after a streamed response has finished too (stream_with_context)
+    token = g.pop("cancel_token", None)
+    if token is not None:
+        registry.finish(token)
+
+# --- Admission Control ---
+# Each LLM route waits for a slot in its lane before doing any work and is
+# turned away with 429/503 + Retry-After when overloaded, see admission.py
+def admitted(lane):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return view(*args, **kwargs)
+            try:
+                ticket = admission_controller().admit(lane, client_id(request.headers, request.remote_addr))
+            except Rejected as e:
+                response = jsonify({"error": f"Server busy ({e.reason}), retry later"})
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response, e.status
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except BaseException:
+                ticket.release()
+                raise
+            if response.is_streamed:
+                # Held until the stream is finished or the client goes away
+                response.call_on_close(ticket.release)
+            else:
+                ticket.release()
+            return response
+        return wrapper
+    return decorator
+
 # Configure CORS more explicitly
 CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5000", "*"],  # Allow all origins for API endpoints
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization", "X-Session-Id", "X-Request-Id"]
     }
 })
 
 # --- API Routes ---
 @app.route('/api/ai_edit', methods=['POST', 'OPTIONS'])
+@admitted("edit")
+@cancellable
 def ai_edit():
     """API endpoint to improve text clarity and grammar."""
     # Handle preflight OPTIONS request
@@ -39,32 +161,39 @@ def ai_edit():
         return '', 204
     
     # Handle POST request
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
-    
-    data = request.get_json()
-    text = data.get('text')
+    with stage("parse"):
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        data = request.get_json()
+        text = data.get('text')
     
     if text is None:
         return jsonify({"error": "Missing 'text' field in JSON payload"}), 400
+    if not isinstance(text, str):
+        return jsonify({"error": "'text' field must be a string"}), 400
     
     print(f"Received for edit (first 50 chars): '{text[:50]}...'")
     
     try:
         # Call the function imported from main2.py
-        response_text = run_ai_edit(text)
+        run = run_ai_edit_incremental if wants_incremental(data) else run_ai_edit
+        response_text = run(text)
         # Ensure we have a string to return
         if response_text is None:
             response_text = ""
         
         print(f"Sending edit response (first 50 chars): '{response_text[:50]}...'")
-        return jsonify({"response": response_text})
+        with stage("serialization"):
+            response = jsonify({"response": response_text})
+        return response
     except Exception as e:
-        print(f"Error processing /api/ai_edit: {e}")
         # Return error as JSON
-        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+        return error_response("/api/ai_edit", e)
 
 @app.route('/api/ai_suggestions', methods=['POST', 'OPTIONS'])
+@admitted("suggestions")
+@cancellable
 def ai_suggestions():
     """API endpoint to suggest improvements or alternatives for text."""
     # Handle preflight OPTIONS request
@@ -72,14 +201,17 @@ def ai_suggestions():
         return '', 204
     
     # Handle POST request
-    if not request.is_json:
-        return jsonify({"error": "Request must be JSON"}), 400
-    
-    data = request.get_json()
-    text = data.get('text')
+    with stage("parse"):
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        data = request.get_json()
+        text = data.get('text')
     
     if text is None:
         return jsonify({"error": "Missing 'text' field in JSON payload"}), 400
+    if not isinstance(text, str):
+        return jsonify({"error": "'text' field must be a string"}), 400
     
     print(f"Received for suggestions (first 50 chars): '{text[:50]}...'")
     
@@ -91,11 +223,175 @@ def ai_suggestions():
             response_text = ""
             
         print(f"Sending suggestions response (first 50 chars): '{response_text[:50]}...'")
-        return jsonify({"response": response_text})
+        with stage("serialization"):
+            response = jsonify({"response": response_text})
+        return response
+    except Exception as e:
+        # Return error as JSON
+        return error_response("/api/ai_suggestions", e)
+
+@app.route('/api/process_query', methods=['POST', 'OPTIONS'])
+@admitted("process_query")
+@cancellable
+def handle_process_query():
+    """API endpoint to classify a query and split it into simple sub-queries."""
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    with stage("parse"):
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        data = request.get_json()
+        text = data.get('text')
+
+    if text is None:
+        return jsonify({"error": "Missing 'text' field in JSON payload"}), 400
+    if not isinstance(text, str):
+        return jsonify({"error": "'text' field must be a string"}), 400
+
+    print(f"Received for processing (first 50 chars): '{text[:50]}...'")
+
+    try:
+        result = process_query(text)
+        with stage("serialization"):
+            response = jsonify(result)
+        return response, 200
     except Exception as e:
-        print(f"Error processing /api/ai_suggestions: {e}")
-        # Return error as JSON 
-        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+        return error_response("/api/process_query", e)
+
+@app.route('/api/batch', methods=['POST', 'OPTIONS'])
+@admitted("batch")
+@cancellable
+def batch():
+    """
+    API endpoint to run many ai_edit / ai_suggestions / process_query items in one request.
+    Body: {"items": [{"op": "ai_edit", "text": "..."}, ...], "max_concurrency": 8}
+    Results are returned in the same order, each with "response" or "error".
+    """
+    # Handle preflight OPTIONS request
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+
+    data = request.get_json()
+    items = data.get('items')
+
+    if not isinstance(items, list):
+        return jsonify({"error": "Missing or non-list 'items' field in JSON payload"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items, the limit is {BATCH_MAX_ITEMS} per batch"}), 413
+
+    max_concurrency = data.get('max_concurrency', BATCH_MAX_CONCURRENCY)
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        return jsonify({"error": "'max_concurrency' must be a positive integer"}), 400
+    max_concurrency = min(max_concurrency, BATCH_MAX_CONCURRENCY)
+
+    print(f"Received batch of {len(items)} items (max_concurrency={max_concurrency})")
+
+    try:
+        results = run_batch(items, max_concurrency)
+        errors = sum(1 for r in results if "error" in r)
+        print(f"Finished batch: {len(results) - errors} ok, {errors} errors")
+        return jsonify({"results": results})
+    except Exception as e:
+        return error_response("/api/batch", e)
+
+# --- Streaming API Routes (Server-Sent Events) ---
+def sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Event. Data is JSON so newlines in tokens survive."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def stream_response(stream_fn, text, label):
+    """Forward chunks from stream_fn as SSE 'token' events, then a 'done' or 'error' event."""
+    def generate():
+        total = 0
+        try:
+            for chunk in stream_fn(text):
+                total += len(chunk)
+                yield sse_event({"token": chunk})
+            print(f"Finished streaming {label} response ({total} chars)")
+            yield sse_event({}, event="done")
+        except GeneratorExit:
+            # The client went away, closing the stream also closes the Groq response
+            token = current_token()
+            if token is not None:
+                token.cancel("disconnected")
+            raise
+        except Exception as e:
+            print(f"Error streaming {label}: {e}")
+            if caused_by_deadline(e) or expired():
+                message = "Request deadline exceeded"
+            elif cancelled():
+                message = "Request cancelled"
+            else:
+                message = f"An internal error occurred: {str(e)}"
+            yield sse_event({"error": message}, event="error")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def wants_incremental(data):
+    """The request's 'incremental' flag (paragraph-level ai_edit), AI_EDIT_INCREMENTAL if unset."""
+    return bool(data.get('incremental', AI_EDIT_INCREMENTAL))
+
+def get_stream_text():
+    """Validate the JSON body for the streaming routes. Returns (text, error_response)."""
+    if not request.is_json:
+        return None, (jsonify({"error": "Request must be JSON"}), 400)
+    text = request.get_json().get('text')
+    if text is None:
+        return None, (jsonify({"error": "Missing 'text' field in JSON payload"}), 400)
+    if not isinstance(text, str):
+        return None, (jsonify({"error": "'text' field must be a string"}), 400)
+    return text, None
+
+@app.route('/api/ai_edit/stream', methods=['POST', 'OPTIONS'])
+@admitted("edit")
+@cancellable
+def ai_edit_stream():
+    """Streaming version of /api/ai_edit, tokens are sent as they are generated."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    text, error = get_stream_text()
+    if error:
+        return error
+    print(f"Streaming edit for (first 50 chars): '{text[:50]}...'")
+    stream_fn = stream_ai_edit_incremental if wants_incremental(request.get_json()) else stream_ai_edit
+    return stream_response(stream_fn, text, "edit")
+
+@app.route('/api/ai_suggestions/stream', methods=['POST', 'OPTIONS'])
+@admitted("suggestions")
+@cancellable
+def ai_suggestions_stream():
+    """Streaming version of /api/ai_suggestions, tokens are sent as they are generated."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    text, error = get_stream_text()
+    if error:
+        return error
+    print(f"Streaming suggestions for (first 50 chars): '{text[:50]}...'")
+    return stream_response(stream_ai_suggestions, text, "suggestions")
+
+# --- Cancel Route ---
+@app.route('/api/cancel', methods=['POST', 'OPTIONS'])
+def cancel_request():
+    """Cancel an in-flight request by the id it was sent with (X-Request-Id)."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 400
+    request_id = request.get_json().get('request_id')
+    if not isinstance(request_id, str):
+        return jsonify({"error": "Missing or non-string 'request_id' field in JSON payload"}), 400
+    return jsonify({"cancelled": registry.cancel(request_id)}), 200
 
 # --- Debug Endpoint ---
 @app.route('/debug', methods=['GET', 'POST'])
@@ -115,15 +411,70 @@ def debug_endpoint():
             "headers": {k: v for k, v in request.headers.items()}
         })
 
+# --- Cache Stats Route ---
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the ai_edit / ai_suggestions response cache."""
+    return jsonify(response_cache.stats()), 200
+
+# --- Semantic Cache Stats Route ---
+@app.route('/api/semantic_cache_stats', methods=['GET'])
+def semantic_cache_stats():
+    """Hits and misses of the near-duplicate process_query decision cache."""
+    return jsonify(decision_cache.stats()), 200
+
+# --- Coalescing Stats Route ---
+@app.route('/api/coalescing_stats', methods=['GET'])
+def coalescing_stats():
+    """How many identical in-flight LLM calls were collapsed into one."""
+    return jsonify(inflight.stats()), 200
+
+# --- Scheduler Stats Route ---
+@app.route('/api/scheduler_stats', methods=['GET'])
+def scheduler_stats():
+    """Concurrency limit, queue depth and rate-limit pause per Groq model."""
+    if not llm_ready():
+        return jsonify([]), 200
+    import scheduler
+    return jsonify(scheduler.scheduler_stats()), 200
+
+# --- Admission Stats Route ---
+@app.route('/api/admission_stats', methods=['GET'])
+def admission_stats():
+    """In-flight and queued requests, service time and expected wait per lane."""
+    return jsonify(admission_controller().stats()), 200
+
+# --- Model Route Stats ---
+@app.route('/api/route_stats', methods=['GET'])
+def route_stats():
+    """Calls, average latency, tokens and estimated cost per model route."""
+    import model_router
+    return jsonify(model_router.route_stats()), 200
+
+# --- Metrics Route ---
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms and LLM call metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 # --- Health Check Route ---
 @app.route('/health', methods=['GET'])
 def health_check():
     """Simple health check endpoint."""
     return jsonify({"status": "ok"}), 200
 
+# --- Readiness Check Route ---
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Ready once the LLM stack is loaded. /health answers before that."""
+    if llm_ready():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "loading"}), 503
+
 # --- Run Flask App ---
+# Development server only, for production use: gunicorn -c gunicorn.conf.py
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
-    debug_mode = os.environ.get("FLASK_DEBUG", "True").lower() == "true"
-    print(f"Starting Flask server on port {port} with debug={debug_mode}")
+    debug_mode = os.environ.get("FLASK_DEBUG", "False").lower() == "true"
+    print(f"Starting Flask development server on port {port} with debug={debug_mode}")
     app.run(debug=debug_mode, port=port, host='0.0.0.0')
\ No newline at end of file
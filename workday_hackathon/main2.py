@@ -1,94 +1,623 @@
 import os
+import re
 import ast
 import sys
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import asyncio
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Shared helpers (response cache, chain registry, ...) live in the repository root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from llm_cache import cache_from_env, make_key
+from fused_query import FUSED_TEMPLATE, parse_fused_response
+from query_classifier import classifier_from_env
+from semantic_cache import remember_split, reuse_split, semantic_cache_from_env
+from chain_registry import chain_model, compile_all, get_chain, get_client, is_loaded, register_chain
+from model_router import model_for
+from single_flight import SingleFlight
+from hedging import hedger_for
+from deadlines import DeadlineExceeded, caused_by_deadline, expired, raise_if_deadline
+from cancellation import RequestCancelled, check as check_cancelled
+from metrics import stage
+
+# A cancelled request or an exceeded deadline ends the request, the error
+# fallbacks below must not turn them into an answer that coalesced callers share
+ABORTED = (RequestCancelled, DeadlineExceeded)
+
+# Models are picked per call by route (see model_router.py), this is the small tier
+MODEL_NAME = model_for("classify")
+
+# Bump these when a prompt changes so old cached answers are not reused
+EDIT_PROMPT_VERSION = "v1"
+SUGGESTIONS_PROMPT_VERSION = "v1"
+
+# Incremental ai_edit: edits long documents paragraph by paragraph
+AI_EDIT_INCREMENTAL = os.environ.get("AI_EDIT_INCREMENTAL", "false").lower() == "true"
+PARAGRAPH_MAX_CONCURRENCY = int(os.environ.get("PARAGRAPH_MAX_CONCURRENCY", 8))
+
+# Batch limits for run_batch / POST /api/batch
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", 8))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 1000))
+# Time budget of a whole /api/batch request. A full batch takes about
+# BATCH_MAX_ITEMS / BATCH_MAX_CONCURRENCY LLM round trips, minutes rather than
+# the seconds of an interactive edit; items still running when it passes fail
+# with "request deadline exceeded". Lower BATCH_MAX_ITEMS along with it.
+BATCH_REQUEST_TIMEOUT = float(os.environ.get("BATCH_REQUEST_TIMEOUT", 600))
+
+# "fused" classifies and splits in one LLM call, "two_step" uses check_if_simple + split_query
+PROCESS_QUERY_MODE = os.environ.get("PROCESS_QUERY_MODE", "fused")
 
 # LLM Setup
+# The client (and the langchain/langchain_groq imports behind it) is created on
+# first use, so importing this module, and app2 with it, stays cheap.
 def init_llm():
     if "GROQ_API_KEY" not in os.environ:
         api_key = "enter key here"  # Replace with your API key or set it in the environment
         if not api_key:
-            print("API Key is required.")
-            sys.exit(1)
+            raise RuntimeError("API Key is required.")
         os.environ["GROQ_API_KEY"] = api_key
         print("Groq API Key set.")
     try:
-        from langchain_groq import ChatGroq
-        return ChatGroq(
-            model="llama-3.1-8b-instant",
-            temperature=0,
-            max_retries=2,
-            api_key=os.environ["GROQ_API_KEY"]
-        )
-    except ImportError:
-        print("Install langchain-groq: pip install langchain-groq")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error initializing LLM: {e}")
-        sys.exit(1)
+        # One pooled client per model, shared with the other modules (see chain_registry.py)
+        return get_client(MODEL_NAME)
+    except ImportError as e:
+        raise RuntimeError("Install langchain-groq: pip install langchain-groq") from e
+
+def get_llm():
+    return init_llm()
+
+def chain_for(name: str, text: str = None):
+    """Registered chain for this input, making sure the API key and client are set up first."""
+    init_llm()
+    return get_chain(name, text)
+
+def warm_up():
+    """Load the LLM stack and compile every chain, so the first request doesn't pay for it."""
+    init_llm()
+    compile_all()
 
-llm = init_llm()
-parser = StrOutputParser()
+def llm_ready() -> bool:
+    return is_loaded()
+
+def __getattr__(name):
+    # Keeps `main2.llm` working without creating the client at import time
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Prompt templates, compiled into chains once by the registry on first use
+CHECK_SIMPLE_PROMPT = """Given the input query: "{text}"
+Is it conceptually simple (one clear question)? Reply only 'yes' or 'no'."""
+
+SPLIT_PROMPT = """Break down this complex query into a list of simple ones: "{complex_query}"
+Return the list in Python syntax: ["..."] only."""
+
+FUSED_PROMPT = FUSED_TEMPLATE
+
+EDIT_PROMPT = "answer here if there are any questions and answer them detailed make it a maximum of 100 words and dont include **:\n\n{text}\n\nImproved:"
+
+SUGGESTIONS_PROMPT = "Suggest a way to complete this goal. break it down into a max of 5 steps, one line for each step is enough. also do not use ** or stuff like that:\n\n{text}\n\nSuggestions:"
+
+register_chain("main2.check_if_simple", CHECK_SIMPLE_PROMPT, route="classify")
+register_chain("main2.split", SPLIT_PROMPT, route="split")
+register_chain("main2.fused", FUSED_PROMPT, route="fused")
+register_chain("main2.ai_edit", EDIT_PROMPT, route="edit")
+register_chain("main2.ai_suggestions", SUGGESTIONS_PROMPT, route="suggestions")
+
+# Responses are deterministic (temperature=0) so identical text can reuse them
+response_cache = cache_from_env()
+
+# Identical requests that arrive at the same time share one upstream call
+inflight = SingleFlight()
+
+# Local fast path, answers confidently-classified queries without an LLM call
+simple_classifier = classifier_from_env("simple")
+
+# process_query decisions, reused for paraphrases of earlier queries (see semantic_cache.py)
+decision_cache = semantic_cache_from_env("main2.process_query")
 
 # Helpers
 def check_if_simple(query: str) -> bool:
-    prompt = PromptTemplate(
-        input_variables=["text"],
-        template="""Given the input query: "{text}"
-Is it conceptually simple (one clear question)? Reply only 'yes' or 'no'."""
-    )
-    chain = prompt | llm | parser
+    local = simple_classifier.classify(query)
+    if local is not None:
+        return local
+    return llm_check_if_simple(query)
+
+def llm_check_if_simple(query: str) -> bool:
+    chain = chain_for("main2.check_if_simple")
     try:
-        return chain.invoke({"text": query}).strip().lower() == "yes"
+        with stage("classification"):
+            response = hedger_for("main2.check_if_simple").call(lambda: chain.invoke({"text": query}))
+        return response.strip().lower() == "yes"
+    except ABORTED:
+        raise
     except Exception as e:
+        raise_if_deadline(e)
         print(f"Error: {e}")
         return False
 
 def split_query(query: str) -> list[str]:
-    prompt = PromptTemplate(
-        input_variables=["complex_query"],
-        template="""Break down this complex query into a list of simple ones: "{complex_query}"
-Return the list in Python syntax: ["..."] only."""
-    )
-    chain = prompt | llm | parser
+    chain = chain_for("main2.split", query)
     try:
-        response = chain.invoke({"complex_query": query}).strip()
-        if response.startswith("```"):
-            response = response.strip("`python \n")
-        return ast.literal_eval(response)
+        with stage("split"):
+            return _parse_split(chain.invoke({"complex_query": query}))
+    except ABORTED:
+        raise
     except Exception as e:
+        raise_if_deadline(e)
         print(f"Could not parse split response: {e}")
         return [query]
 
+def _parse_split(response: str) -> list[str]:
+    response = response.strip()
+    if response.startswith("```"):
+        response = response.strip("`python \n")
+    return ast.literal_eval(response)
+
+def classify_and_split(query: str):
+    """Classify and split in one LLM call. Returns None if the reply can't be parsed."""
+    chain = chain_for("main2.fused", query)
+    try:
+        with stage("classify_split"):
+            parsed = parse_fused_response(chain.invoke({"text": query}))
+    except ABORTED:
+        raise
+    except Exception as e:
+        raise_if_deadline(e)
+        print(f"Error: {e}")
+        return None
+    return _fused_result(query, parsed)
+
+def _fused_result(query: str, parsed):
+    if parsed is None:
+        print("Could not parse fused response, falling back to two-step")
+        return None
+    simple, queries = parsed
+    if simple:
+        return {"is_simple": True, "queries": [query]}
+    return {"is_simple": False, "queries": queries}
+
+def _process_query(query: str) -> dict:
+    with stage("classification_local"):
+        local = simple_classifier.classify(query)
+    if local is True:
+        return {"is_simple": True, "queries": [query]}
+    if local is False:
+        return {"is_simple": False, "queries": split_query(query)}
+    if PROCESS_QUERY_MODE == "fused":
+        result = classify_and_split(query)
+        if result is not None:
+            return result
+    if llm_check_if_simple(query):
+        return {"is_simple": True, "queries": [query]}
+    return {"is_simple": False, "queries": split_query(query)}
+
+def _process_query_key(query: str) -> str:
+    return make_key("process_query", query, PROCESS_QUERY_MODE, chain_model("main2.fused", query))
+
 def process_query(query: str) -> dict:
     if not query.strip():
         return {"is_simple": True, "queries": []}
-    if check_if_simple(query):
-        return {"is_simple": True, "queries": [query]}
-    return {"is_simple": False, "queries": split_query(query)}
+    with stage("semantic_cache"):
+        cached = decision_cache.get(query)
+    if cached is not None:
+        return reuse_split(query, cached)
+    result = inflight.do(_process_query_key(query), lambda: _process_query(query))
+    # A request cancelled after its LLM call finished gets no answer either
+    check_cancelled()
+    remember_split(decision_cache, query, result)
+    # Coalesced callers share the result, give each its own copy
+    return {"is_simple": result["is_simple"], "queries": list(result["queries"])}
 
-def run_ai_edit(text: str) -> str:
-    prompt = PromptTemplate(
-        input_variables=["text"],
-        template="answer here if there are any questions and answer them detailed make it a maximum of 100 words and dont include **:\n\n{text}\n\nImproved:"
-    )
-    chain = prompt | llm | parser
+def _call_cached_chain(op: str, chain_name: str, prompt_version: str, text: str) -> str:
+    """Cache lookup, then one coalesced chain call per distinct input in flight. Raises on failure."""
+    key = make_key(op, text, prompt_version, chain_model(chain_name, text))
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    return _coalesced_chain(op, chain_name, key, text)
+
+def _coalesced_chain(op: str, chain_name: str, key: str, text: str) -> str:
+    """The chain call for a cache miss, shared by concurrent callers with the same key."""
+    def call():
+        with stage(op):
+            result = chain_for(chain_name, text).invoke({"text": text}).strip()
+        response_cache.set(key, result)
+        return result
+
+    return inflight.do(key, call)
+
+def _error_text(e: Exception) -> str:
+    """Failures are answered as "[Error: ...]" text, except timeouts and cancellations."""
+    if expired() or caused_by_deadline(e):
+        raise DeadlineExceeded("request deadline exceeded") from e
+    # A cancelled request gets no answer rather than an error text
+    check_cancelled()
+    return f"[Error: {e}]"
+
+def _run_cached_chain(op: str, chain_name: str, prompt_version: str, text: str) -> str:
     try:
-        return chain.invoke({"text": text}).strip()
+        return _call_cached_chain(op, chain_name, prompt_version, text)
     except Exception as e:
-        return f"[Error: {e}]"
+        return _error_text(e)
+
+def run_ai_edit(text: str) -> str:
+    return _run_cached_chain("ai_edit", "main2.ai_edit", EDIT_PROMPT_VERSION, text)
 
 def run_ai_suggestions(text: str) -> str:
-    prompt = PromptTemplate(
-        input_variables=["text"],
-        template="Suggest a way to complete this goal. break it down into a max of 5 steps, one line for each step is enough. also do not use ** or stuff like that:\n\n{text}\n\nSuggestions:"
-    )
-    chain = prompt | llm | parser
+    return _run_cached_chain("ai_suggestions", "main2.ai_suggestions", SUGGESTIONS_PROMPT_VERSION, text)
+
+# Streaming versions, yield text chunks as the model produces them.
+# Errors are raised (not returned) so the caller can report them out of band.
+def _stream_chain(chain_name: str, key: str, text: str):
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    for chunk in chain_for(chain_name, text).stream({"text": text}):
+        if not parts:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        parts.append(chunk)
+        yield chunk
+    response_cache.set(key, "".join(parts).strip())
+
+def stream_ai_edit(text: str):
+    key = make_key("ai_edit", text, EDIT_PROMPT_VERSION, chain_model("main2.ai_edit", text))
+    return _stream_chain("main2.ai_edit", key, text)
+
+def stream_ai_suggestions(text: str):
+    key = make_key("ai_suggestions", text, SUGGESTIONS_PROMPT_VERSION, chain_model("main2.ai_suggestions", text))
+    return _stream_chain("main2.ai_suggestions", key, text)
+
+# Async versions, used by the ASGI service (service.py): they await the LLM
+# instead of holding a thread per call
+async def allm_check_if_simple(query: str) -> bool:
+    chain = chain_for("main2.check_if_simple")
+    try:
+        with stage("classification"):
+            response = await hedger_for("main2.check_if_simple").acall(lambda: chain.ainvoke({"text": query}))
+        return response.strip().lower() == "yes"
+    except ABORTED:
+        raise
+    except Exception as e:
+        raise_if_deadline(e)
+        print(f"Error: {e}")
+        return False
+
+async def asplit_query(query: str) -> list[str]:
+    chain = chain_for("main2.split", query)
     try:
-        return chain.invoke({"text": text}).strip()
+        with stage("split"):
+            return _parse_split(await chain.ainvoke({"complex_query": query}))
+    except ABORTED:
+        raise
     except Exception as e:
-        return f"[Error: {e}]"
+        raise_if_deadline(e)
+        print(f"Could not parse split response: {e}")
+        return [query]
+
+async def aclassify_and_split(query: str):
+    chain = chain_for("main2.fused", query)
+    try:
+        with stage("classify_split"):
+            parsed = parse_fused_response(await chain.ainvoke({"text": query}))
+    except ABORTED:
+        raise
+    except Exception as e:
+        raise_if_deadline(e)
+        print(f"Error: {e}")
+        return None
+    return _fused_result(query, parsed)
+
+async def _aprocess_query(query: str) -> dict:
+    with stage("classification_local"):
+        local = simple_classifier.classify(query)
+    if local is True:
+        return {"is_simple": True, "queries": [query]}
+    if local is False:
+        return {"is_simple": False, "queries": await asplit_query(query)}
+    if PROCESS_QUERY_MODE == "fused":
+        result = await aclassify_and_split(query)
+        if result is not None:
+            return result
+    if await allm_check_if_simple(query):
+        return {"is_simple": True, "queries": [query]}
+    return {"is_simple": False, "queries": await asplit_query(query)}
+
+async def aprocess_query(query: str) -> dict:
+    if not query.strip():
+        return {"is_simple": True, "queries": []}
+    with stage("semantic_cache"):
+        cached = decision_cache.get(query)
+    if cached is not None:
+        return reuse_split(query, cached)
+    result = await inflight.ado(_process_query_key(query), lambda: _aprocess_query(query))
+    check_cancelled()
+    remember_split(decision_cache, query, result)
+    return {"is_simple": result["is_simple"], "queries": list(result["queries"])}
+
+async def _acall_cached_chain(op: str, chain_name: str, prompt_version: str, text: str) -> str:
+    key = make_key(op, text, prompt_version, chain_model(chain_name, text))
+    cached = await response_cache.aget(key)
+    if cached is not None:
+        return cached
+    return await _acoalesced_chain(op, chain_name, key, text)
+
+async def _acoalesced_chain(op: str, chain_name: str, key: str, text: str) -> str:
+    async def call():
+        with stage(op):
+            result = (await chain_for(chain_name, text).ainvoke({"text": text})).strip()
+        await response_cache.aset(key, result)
+        return result
+
+    return await inflight.ado(key, call)
+
+async def _arun_cached_chain(op: str, chain_name: str, prompt_version: str, text: str) -> str:
+    try:
+        return await _acall_cached_chain(op, chain_name, prompt_version, text)
+    except Exception as e:
+        return _error_text(e)
+
+async def arun_ai_edit(text: str) -> str:
+    return await _arun_cached_chain("ai_edit", "main2.ai_edit", EDIT_PROMPT_VERSION, text)
+
+async def arun_ai_suggestions(text: str) -> str:
+    return await _arun_cached_chain("ai_suggestions", "main2.ai_suggestions", SUGGESTIONS_PROMPT_VERSION, text)
+
+async def _astream_chain(chain_name: str, key: str, text: str):
+    cached = await response_cache.aget(key)
+    if cached is not None:
+        yield cached
+        return
+    parts = []
+    async for chunk in chain_for(chain_name, text).astream({"text": text}):
+        if not parts:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+        parts.append(chunk)
+        yield chunk
+    await response_cache.aset(key, "".join(parts).strip())
+
+def astream_ai_edit(text: str):
+    key = make_key("ai_edit", text, EDIT_PROMPT_VERSION, chain_model("main2.ai_edit", text))
+    return _astream_chain("main2.ai_edit", key, text)
+
+def astream_ai_suggestions(text: str):
+    key = make_key("ai_suggestions", text, SUGGESTIONS_PROMPT_VERSION, chain_model("main2.ai_suggestions", text))
+    return _astream_chain("main2.ai_suggestions", key, text)
+
+# Incremental ai_edit for long documents. The text is split into paragraphs and
+# each one is edited on its own through the response cache, whose key is the
+# paragraph's fingerprint (make_key). After a small change only the changed
+# paragraphs miss the cache, and those run concurrently, so an edit costs about
+# one paragraph's latency instead of the whole document's.
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+def split_paragraphs(text: str) -> list[str]:
+    return [p.strip() for p in PARAGRAPH_RE.split(text) if p.strip()]
+
+def _edit_paragraph_key(paragraph: str) -> str:
+    return make_key("ai_edit", paragraph, EDIT_PROMPT_VERSION, chain_model("main2.ai_edit", paragraph))
+
+_paragraph_executor = None
+
+def _get_paragraph_executor():
+    global _paragraph_executor
+    if _paragraph_executor is None:
+        _paragraph_executor = ThreadPoolExecutor(max_workers=PARAGRAPH_MAX_CONCURRENCY, thread_name_prefix="paragraph")
+    return _paragraph_executor
+
+# Paragraph edits raise on failure, an error text must not end up in the document.
+# They only run for paragraphs _cached_paragraphs already missed, so they skip
+# the cache lookup and go straight to the chain (one miss per changed paragraph).
+def _edit_paragraph(paragraph: str) -> str:
+    return _coalesced_chain("ai_edit", "main2.ai_edit", _edit_paragraph_key(paragraph), paragraph)
+
+async def _aedit_paragraph(paragraph: str) -> str:
+    return await _acoalesced_chain("ai_edit", "main2.ai_edit", _edit_paragraph_key(paragraph), paragraph)
+
+def _cached_paragraphs(paragraphs):
+    """Cached edit per paragraph, None for the changed ones."""
+    cached = [response_cache.get(_edit_paragraph_key(p)) for p in paragraphs]
+    print(f"Incremental edit: {len(paragraphs)} paragraphs, {cached.count(None)} changed")
+    return cached
+
+def stream_ai_edit_incremental(text: str):
+    """
+    Yield the edited paragraphs in order, each as soon as it and the ones before
+    it are done. Raises if a paragraph fails, like stream_ai_edit.
+    """
+    paragraphs = split_paragraphs(text)
+    if len(paragraphs) < 2:
+        yield from stream_ai_edit(text)
+        return
+    futures = []
+    for paragraph, cached in zip(paragraphs, _cached_paragraphs(paragraphs)):
+        if cached is None:
+            # Runs in a copy of the caller's context, so it keeps the request deadline
+            future = _get_paragraph_executor().submit(contextvars.copy_context().run, _edit_paragraph, paragraph)
+        else:
+            future = Future()
+            future.set_result(cached)
+        futures.append(future)
+    try:
+        for i, future in enumerate(futures):
+            yield ("\n\n" if i else "") + future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def run_ai_edit_incremental(text: str) -> str:
+    try:
+        return "".join(stream_ai_edit_incremental(text))
+    except Exception as e:
+        return _error_text(e)
+
+async def astream_ai_edit_incremental(text: str):
+    """Async version of stream_ai_edit_incremental."""
+    paragraphs = split_paragraphs(text)
+    if len(paragraphs) < 2:
+        async for chunk in astream_ai_edit(text):
+            yield chunk
+        return
+    semaphore = asyncio.Semaphore(PARAGRAPH_MAX_CONCURRENCY)
+
+    async def one(paragraph):
+        async with semaphore:
+            return await _aedit_paragraph(paragraph)
+
+    cached = await asyncio.to_thread(_cached_paragraphs, paragraphs)
+    tasks = {i: asyncio.ensure_future(one(p)) for i, (p, c) in enumerate(zip(paragraphs, cached)) if c is None}
+    try:
+        for i, result in enumerate(cached):
+            yield ("\n\n" if i else "") + (await tasks[i] if result is None else result)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+async def arun_ai_edit_incremental(text: str) -> str:
+    try:
+        return "".join([chunk async for chunk in astream_ai_edit_incremental(text)])
+    except Exception as e:
+        return _error_text(e)
+
+# Batch processing, one call handles many items with bounded concurrency
+# operation -> (chain name, prompt version) for the cached text operations
+BATCH_TEXT_OPERATIONS = {
+    "ai_edit": ("main2.ai_edit", EDIT_PROMPT_VERSION),
+    "ai_suggestions": ("main2.ai_suggestions", SUGGESTIONS_PROMPT_VERSION),
+}
+BATCH_OPERATIONS = set(BATCH_TEXT_OPERATIONS) | {"process_query"}
+
+def _group_batch_items(items: list):
+    """Per-item errors for invalid items, and the valid ones grouped as {op: (indices, texts)}."""
+    results = [None] * len(items)
+    groups = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"error": "Item must be an object with 'op' and 'text'"}
+            continue
+        op, text = item.get("op"), item.get("text")
+        if op not in BATCH_OPERATIONS:
+            results[i] = {"error": f"Unknown op {op!r}, expected one of {sorted(BATCH_OPERATIONS)}"}
+        elif not isinstance(text, str):
+            results[i] = {"error": "Missing or non-string 'text' field"}
+        else:
+            indices, texts = groups.setdefault(op, ([], []))
+            indices.append(i)
+            texts.append(text)
+    return results, groups
+
+def _batch_cache_misses(op, indices, texts, results):
+    """Fill in cached responses, return the misses as {model: [(index, key, text)]}."""
+    chain_name, prompt_version = BATCH_TEXT_OPERATIONS[op]
+    misses = {}
+    for i, text in zip(indices, texts):
+        model = chain_model(chain_name, text)
+        key = make_key(op, text, prompt_version, model)
+        cached = response_cache.get(key)
+        if cached is not None:
+            results[i] = {"response": cached}
+        else:
+            misses.setdefault(model, []).append((i, key, text))
+    return misses
+
+def _store_batch_outputs(misses, outputs, results):
+    for (i, key, _), output in zip(misses, outputs):
+        if isinstance(output, Exception):
+            results[i] = {"error": str(output)}
+        else:
+            output = output.strip()
+            response_cache.set(key, output)
+            results[i] = {"response": output}
+
+def _store_batch_answers(indices, outputs, results):
+    for i, output in zip(indices, outputs):
+        if isinstance(output, Exception):
+            results[i] = {"error": str(output)}
+        else:
+            results[i] = {"response": output}
+
+# Async, for service.py. One semaphore bounds the calls of the whole batch, so
+# groups of different ops and models running side by side share max_concurrency.
+async def _abatch_text_operation(op, indices, texts, results, semaphore):
+    chain_name, _ = BATCH_TEXT_OPERATIONS[op]
+
+    async def one(chain, text):
+        async with semaphore:
+            return await chain.ainvoke({"text": text})
+
+    async def group(misses):
+        chain = chain_for(chain_name, misses[0][2])
+        outputs = await asyncio.gather(*(one(chain, text) for _, _, text in misses), return_exceptions=True)
+        await asyncio.to_thread(_store_batch_outputs, misses, outputs, results)
+
+    # Off the event loop, the disk tier of the cache can block
+    misses = await asyncio.to_thread(_batch_cache_misses, op, indices, texts, results)
+    await asyncio.gather(*(group(m) for m in misses.values()))
+
+async def _abatch_process_query(indices, texts, results, semaphore):
+    async def one(text):
+        async with semaphore:
+            return await aprocess_query(text)
+
+    outputs = await asyncio.gather(*(one(text) for text in texts), return_exceptions=True)
+    _store_batch_answers(indices, outputs, results)
+
+async def arun_batch(items: list, max_concurrency: int = BATCH_MAX_CONCURRENCY) -> list[dict]:
+    """
+    Run a list of {"op": ..., "text": ...} items with at most max_concurrency LLM
+    calls in flight. Results come back in input order, either {"response": ...}
+    or {"error": ...}.
+    """
+    results, groups = _group_batch_items(items)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = []
+    for op, (indices, texts) in groups.items():
+        if op == "process_query":
+            tasks.append(_abatch_process_query(indices, texts, results, semaphore))
+        else:
+            tasks.append(_abatch_text_operation(op, indices, texts, results, semaphore))
+    await asyncio.gather(*tasks)
+    return results
+
+# Sync, for the Flask app and scripts. No event loop: the async clients are
+# shared by the whole process and must not be driven from a fresh loop per
+# request. Groups run one after another, each with max_concurrency threads.
+def _batch_process_query(indices, texts, results, max_concurrency):
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch") as executor:
+        # Each item in a copy of the caller's context, so it keeps the request deadline
+        futures = [executor.submit(contextvars.copy_context().run, process_query, text) for text in texts]
+    outputs = []
+    for future in futures:
+        try:
+            outputs.append(future.result())
+        except Exception as e:
+            outputs.append(e)
+    _store_batch_answers(indices, outputs, results)
+
+def run_batch(items: list, max_concurrency: int = BATCH_MAX_CONCURRENCY) -> list[dict]:
+    """Sync version of arun_batch, text operations go through LangChain's chain.batch."""
+    results, groups = _group_batch_items(items)
+    config = {"max_concurrency": max_concurrency}
+    for op, (indices, texts) in groups.items():
+        if op == "process_query":
+            _batch_process_query(indices, texts, results, max_concurrency)
+            continue
+        chain_name, _ = BATCH_TEXT_OPERATIONS[op]
+        for misses in _batch_cache_misses(op, indices, texts, results).values():
+            outputs = chain_for(chain_name, misses[0][2]).batch(
+                [{"text": text} for _, _, text in misses], config=config, return_exceptions=True
+            )
+            _store_batch_outputs(misses, outputs, results)
+    return results
 
 # --- Run basic tests when run directly ---
 if __name__ == "__main__":
@@ -1,11 +1,18 @@
 // src/components/OverlayDetail.js
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 
 const OverlayDetail = ({ type, item, onClose }) => {
   const [aiResult, setAiResult] = useState("");
   const [error, setError] = useState("");
   const [isLoading, setIsLoading] = useState(false);
 
+  // One session per open overlay: a newer AI request replaces the previous one
+  // on the server (X-Session-Id), and closing the overlay aborts the request in
+  // flight so the server stops generating the answer.
+  const sessionId = useRef(`${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
+  const controllerRef = useRef(null);
+  useEffect(() => () => controllerRef.current?.abort(), []);
+
   // Helper function to build a text block from the item details.
   const getItemText = () => {
     if (type === 'note') return item.content;
@@ -14,99 +21,85 @@ const OverlayDetail = ({ type, item, onClose }) => {
     return "";
   };
 
-  const handleAiEdit = async () => {
+  // Reads Server-Sent Events from a streaming endpoint and appends each
+  // token to the result as it arrives, so text shows up while it is generated.
+  // Extra options are sent along with the text in the request body.
+  const streamAiResponse = async (url, label, options = {}) => {
+    controllerRef.current?.abort();
+    const controller = new AbortController();
+    controllerRef.current = controller;
     setIsLoading(true);
     setError("");
-    
+    setAiResult("");
+
     try {
-      const response = await fetch("http://localhost:5000/api/ai_edit", {
+      const response = await fetch(url, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "X-Session-Id": sessionId.current,
         },
-        body: JSON.stringify({ text: getItemText() }),
+        body: JSON.stringify({ text: getItemText(), ...options }),
+        signal: controller.signal,
       });
-      
-      
 
       // First check if the response is ok
       if (!response.ok) {
         throw new Error(`Server responded with status: ${response.status}`);
       }
 
-      // Get response text first to debug
-      const rawText = await response.text();
-      
-      // Try parsing the response as JSON
-      let data;
-      try {
-        data = JSON.parse(rawText);
-      } catch (parseError) {
-        console.error("Failed to parse JSON:", parseError);
-        console.error("Raw response:", rawText);
-        throw new Error(`Invalid JSON response: ${rawText.substring(0, 100)}...`);
-      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let finished = false;
 
-      // Check if data has the expected structure
-      if (!data || typeof data.response === 'undefined') {
-        throw new Error(`Unexpected response format: ${JSON.stringify(data)}`);
-      }
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-      setAiResult(data.response);
-    } catch (error) {
-      console.error("Error calling AI Edit:", error);
-      setError(`Error: ${error.message}`);
-    } finally {
-      setIsLoading(false);
-    }
-  };
+        // Events are separated by a blank line
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
 
-  const handleAiSuggestions = async () => {
-    setIsLoading(true);
-    setError("");
-    
-    try {
-      const response = await fetch("http://localhost:5000/api/ai_suggestions", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ text: getItemText() }),
-      });
-      
+        for (const rawEvent of events) {
+          let eventName = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event: ")) eventName = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          const payload = data ? JSON.parse(data) : {};
 
-      // First check if the response is ok
-      if (!response.ok) {
-        throw new Error(`Server responded with status: ${response.status}`);
+          if (eventName === "error") {
+            throw new Error(payload.error || "Unknown streaming error");
+          }
+          if (eventName === "done") {
+            finished = true;
+            break;
+          }
+          if (typeof payload.token === "string") {
+            setAiResult((previous) => previous + payload.token);
+          }
+        }
       }
-
-      // Get response text first to debug
-      const rawText = await response.text();
-      
-      // Try parsing the response as JSON
-      let data;
-      try {
-        data = JSON.parse(rawText);
-      } catch (parseError) {
-        console.error("Failed to parse JSON:", parseError);
-        console.error("Raw response:", rawText);
-        throw new Error(`Invalid JSON response: ${rawText.substring(0, 100)}...`);
-      }
-
-      // Check if data has the expected structure
-      if (!data || typeof data.response === 'undefined') {
-        throw new Error(`Unexpected response format: ${JSON.stringify(data)}`);
-      }
-
-      setAiResult(data.response);
     } catch (error) {
-      console.error("Error calling AI Suggestions:", error);
+      // Aborted on purpose, a newer request or closing the overlay
+      if (error.name === "AbortError") return;
+      console.error(`Error calling ${label}:`, error);
       setError(`Error: ${error.message}`);
     } finally {
-      setIsLoading(false);
+      if (controllerRef.current === controller) setIsLoading(false);
     }
   };
 
+  // Incremental: only paragraphs changed since the last edit go to the model
+  const handleAiEdit = () =>
+    streamAiResponse("http://localhost:5000/api/ai_edit/stream", "AI Edit", { incremental: true });
+
+  const handleAiSuggestions = () =>
+    streamAiResponse("http://localhost:5000/api/ai_suggestions/stream", "AI Suggestions");
+
   return (
     <div className="overlay">
       <div className="overlay-content">